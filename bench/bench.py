@@ -0,0 +1,197 @@
+#! /usr/bin/env python
+#
+# Benchmarks of the PDU encoding/decoding and of submit_sm round trips
+#
+# usage: bench.py [--quick] [--json results.json] [--only micro,loopback]
+#
+# Every benchmark prints one line; --json also writes all the numbers to
+# a file, so runs of different releases can be compared, e.g.
+#   python bench/bench.py --json before.json
+#   python bench/bench.py --json after.json
+#   python bench/bench.py --compare before.json after.json
+#
+
+import sys, os, time, json, platform, optparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import pdu, codec, gsm, sms, smpp, simulator
+from pySMPP.framer import Framer
+
+TEXT = 'Hello, this is a benchmark message of pySMPP'
+UTEXT = u'\u0417\u0434\u0440\u0430\u0432\u043e, this one is UCS2'
+
+def timeit(func, seconds):
+    """Calls func() repeatedly for about seconds; returns calls/sec."""
+    n = 1
+    while True:
+        start = time.time()
+        for i in xrange(n):
+            func()
+        elapsed = time.time() - start
+        if elapsed >= seconds:
+            return n / elapsed
+        if elapsed < seconds / 10:
+            n *= 10
+        else:
+            n = int(n * seconds / elapsed) + 1
+
+def _sms():
+    m = sms.SMS(TEXT)
+    m.src_addr = '38970000000'
+    m.dest_addr = '38971234567'
+    m.sequence_number = 1
+    return m
+
+def _bodies():
+    """Encoded bodies of the commands benchmarked."""
+    sm = {'source_addr': '38970000000', 'destination_addr': '38971234567',
+          'short_message': TEXT}
+    return [
+        ('bind_transmitter', codec.encode('bind_transmitter',
+            {'system_id': 'user', 'password': 'pass', 'interface_version': 0x34})),
+        ('submit_sm', codec.encode('submit_sm', sm)),
+        ('submit_sm_resp', codec.encode('submit_sm_resp', {'message_id': '1f2e3d'})),
+        ('deliver_sm', codec.encode('deliver_sm', dict(sm, esm_class=4,
+            optional={'receipted_message_id': '1f2e3d', 'message_state': 2}))),
+        ('enquire_link', ''),
+    ]
+
+def micro(seconds):
+    """name -> operations/sec"""
+    results = {}
+    for command, body in _bodies():
+        p = pdu.PDU()
+        p.command_id = pdu.COMMAND_ID[command]
+        p.body = body
+        data = str(p)
+        results['pdu_encode.' + command] = timeit(p.__str__, seconds)
+        results['pdu_decode.' + command] = timeit(lambda: pdu.PDU(data), seconds)
+        if body:
+            fields = codec.decode(command, body)
+            d = dict(fields.items())
+            results['codec_encode.' + command] = timeit(
+                lambda: codec.encode(command, d), seconds)
+            results['codec_decode.' + command] = timeit(
+                lambda: codec.decode(command, body), seconds)
+
+    m = _sms()
+    results['sms_str'] = timeit(m.__str__, seconds)
+    t = sms.SMSTemplate(_sms())
+    results['sms_template.pdu'] = timeit(lambda: str(t.pdu('38971234567')), seconds)
+    m = sms.SMS(TEXT * 8)
+    results['sms_segments.udh'] = timeit(m.segments, seconds)
+
+    septets = gsm.encode(unicode(TEXT))
+    packed = gsm.pack7(septets)
+    results['text.convert8to7bit'] = timeit(lambda: sms.convert8to7bit(TEXT), seconds)
+    results['text.unpack7'] = timeit(lambda: gsm.unpack7(packed), seconds)
+    results['text.encode_auto.gsm'] = timeit(lambda: gsm.encode_auto(unicode(TEXT)), seconds)
+    results['text.encode_auto.ucs2'] = timeit(lambda: gsm.encode_auto(UTEXT), seconds)
+    texts = [unicode(TEXT), UTEXT] * 500
+    results['text.encode_many.1000'] = timeit(lambda: gsm.encode_many(texts), seconds)
+
+    stream = str(_sms()) * 1000
+    def frame():
+        f = Framer()
+        f.feed(stream)
+        for data in f.pdus():
+            pass
+    results['framer.1000_pdus'] = timeit(frame, seconds)
+    return results
+
+def _percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+def loopback(window_size, count, latency=0):
+    """Submits count messages to a local simulator.SMSC; returns msgs/sec
+    and the response latency percentiles in milliseconds."""
+    smsc = simulator.SMSC(latency=latency)
+    smsc.start()
+    try:
+        s = smpp.SMPP(window_size=window_size)
+        s.connect(*smsc.address)
+        s.bind_transmitter('bench', 'bench')
+        m = _sms()
+        times = []
+        now = time.time
+        start = now()
+        for i in xrange(count):
+            # stamped before the call: the latency includes sending, and
+            # the response may be read before submit_sm_async() returns
+            s.submit_sm_async(m, lambda req, sent=now():
+                              times.append(now() - sent))
+        s.drain()
+        elapsed = time.time() - start
+        s.unbind()
+        s.close()
+    finally:
+        smsc.stop()
+    times.sort()
+    return {
+        'msgs_per_sec': count / elapsed,
+        'p50_ms': _percentile(times, 0.50) * 1000,
+        'p99_ms': _percentile(times, 0.99) * 1000,
+    }
+
+def run(quick=False, only=None):
+    seconds = quick and 0.1 or 1.0
+    count = quick and 2000 or 20000
+    results = {}
+    if not only or 'micro' in only:
+        for name, ops in sorted(micro(seconds).items()):
+            results[name] = {'ops_per_sec': ops}
+            print '%-34s %12.0f ops/sec' % (name, ops)
+    if not only or 'loopback' in only:
+        for window in (1, 10, 100, 500):
+            name = 'loopback.window_%d' % window
+            r = loopback(window, count)
+            results[name] = r
+            print '%-34s %12.0f msgs/sec  p50 %.2f ms  p99 %.2f ms' % (
+                name, r['msgs_per_sec'], r['p50_ms'], r['p99_ms'])
+    return results
+
+def compare(old, new):
+    """Prints the change of every number between two --json files."""
+    old = json.load(open(old))['results']
+    new = json.load(open(new))['results']
+    for name in sorted(new):
+        if name not in old:
+            continue
+        for key, value in sorted(new[name].items()):
+            before = old[name].get(key)
+            if before:
+                print '%-34s %-14s %12.2f -> %12.2f  %+6.1f%%' % (
+                    name, key, before, value, (value - before) * 100.0 / before)
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--quick', action='store_true',
+        help='short runs, for a smoke test')
+    parser.add_option('--json', metavar='FILE',
+        help='write the results to FILE')
+    parser.add_option('--only', metavar='GROUPS',
+        help='comma separated: micro, loopback')
+    parser.add_option('--compare', nargs=2, metavar='OLD NEW',
+        help='compare two result files')
+    options, args = parser.parse_args()
+    if options.compare:
+        compare(*options.compare)
+        return
+    only = options.only and options.only.split(',')
+    results = run(options.quick, only)
+    if options.json:
+        out = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'quick': bool(options.quick),
+            'results': results,
+        }
+        f = open(options.json, 'w')
+        json.dump(out, f, indent=1, sort_keys=True)
+        f.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+#! /usr/bin/env python
+#
+# Script to send SMS's through several SMPP binds at once
+# uses asyncore, all binds are driven by a single thread
+
+import sys, asyncore
+from pySMPP import AsyncSMPP, SMS
+
+class Session(AsyncSMPP):
+    def deliver_sm(self, pdu):
+        print pdu.dump()
+        return pdu.response(body="\0")
+
+def submitted(req):
+    if req.error:
+        print "Error:", req.error
+    else:
+        print "Sent, message_id:", req.message_id
+
+sessions = []
+for i in range(10):
+    s = Session(response_timeout=30)
+    s.connect('127.1', 10000)
+    s.bind_transmitter('user','pass')
+    sessions.append(s)
+
+for i in range(100):
+    sessions[i % len(sessions)].submit_sm(SMS("Message %d" % i), submitted)
+
+try:
+    asyncore.loop(20)
+except KeyboardInterrupt:
+    print "\nFinalizing...",
+    for s in sessions:
+        s.unbind()
+    asyncore.loop(5, count=10)
+    print "Done!"
@@ -17,4 +17,6 @@
 
 from pdu import PDU
 from sms import SMS, RingTone
-from smpp import SMPP
+from smpp import SMPP, SMPPError
+from asyncsmpp import AsyncSMPP
+from pool import SessionPool
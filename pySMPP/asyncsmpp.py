@@ -0,0 +1,325 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""This module provides the class AsyncSMPP, an SMPP session driven by
+asyncore. Any number of sessions can share one asyncore loop (and one
+thread); nothing in here blocks.
+
+Example:
+    import asyncore
+    from pySMPP import asyncsmpp
+    sm = asyncsmpp.AsyncSMPP()
+    sm.connect(ip, port)
+    sm.bind_transmitter(user, paswd)
+    sm.submit_sm(sms, callback)
+    sm.enquire_link()
+    asyncore.loop()
+
+Every request returns a smpp.Pending; its callbacks run from the loop
+once the response arrives. Inbound deliver_sm/data_sm go to the
+deliver_sm() and data_sm() methods, override them. They return the
+response PDU, or None if they will send it later with send_pdu().
+
+For more than a few sessions use a reactor.Reactor instead of the
+asyncore loop (see there); process() and Pending.result() then run the
+reactor.
+"""
+import time, errno, heapq
+import socket, asyncore
+import pdu
+from framer import Framer
+from trace import Tracer
+from smpp import COMMAND_ID, STATE, BOUND, SMPPError, Pending
+
+class AsyncSMPP(asyncore.dispatcher):
+    def __init__(self, log=None, map=None, response_timeout=None,
+                 max_pdu_length=pdu.MAX_PDU_LENGTH, tracer=None):
+        asyncore.dispatcher.__init__(self, map=map)
+        self.__map = map
+        if tracer is None:
+            tracer = Tracer(log)
+        self.tracer = tracer
+        self.__sequence = 0
+        self.__pending = {}
+        self.__deadlines = []       # heap of (deadline, sequence, Pending)
+        self.__framer = Framer(max_pdu_length)
+        self.__outbuf = []
+        self.__timer = None
+        self.reactor = None         # set by reactor.Reactor.add()
+        self.dedup = None           # see dedup.Dedup
+        self.__answering = {}       # sequence -> deliver_sm for dedup to remember
+        self.state = STATE["CLOSED"]
+        self.response_timeout = response_timeout
+        self.system_name = None
+
+    def getseq(self):
+        self.__sequence += 1
+        return self.__sequence
+
+    sequence = property(getseq, doc="SMPP pdu sequence number. autoincrements each time it is requested")
+
+    def connect(self, addr, port):
+        if self.state != STATE["CLOSED"]:
+            return
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.__answering = {}
+        asyncore.dispatcher.connect(self, (addr, int(port)))
+        # requests sent before the connect finishes wait in the buffer
+        self.state = STATE["OPEN"]
+
+    def bind_receiver(self, user, pasw, callback=None):
+        return self.__bind(pdu.BIND_RX(user, pasw), STATE['BOUND_RX'], callback)
+
+    def bind_transmitter(self, user, pasw, callback=None):
+        return self.__bind(pdu.BIND_TX(user, pasw), STATE['BOUND_TX'], callback)
+
+    def bind_transceiver(self, user, pasw, callback=None):
+        return self.__bind(pdu.BIND_TRX(user, pasw), STATE['BOUND_TRX'], callback)
+
+    def __bind(self, bind, state, callback):
+        if self.state != STATE['OPEN']:
+            raise SMPPError("State is not OPEN")
+        def bound(req):
+            if not req.error:
+                self.state = state
+                # optional parameters may follow (sc_interface_version)
+                self.system_name = req.resp.body.split('\0', 1)[0]
+        return self.__request(bind, callback, None, bound)
+
+    def unbind(self, callback=None):
+        if self.state not in BOUND:
+            raise SMPPError("State is not BOUND")
+        unbind = pdu.PDU()
+        unbind.command_id = COMMAND_ID['unbind']
+        def unbound(req):
+            if not req.error:
+                self.state = STATE['OPEN']
+        return self.__request(unbind, callback, None, unbound)
+
+    def enquire_link(self, callback=None, timeout=None):
+        enquire = pdu.PDU()
+        enquire.command_id = COMMAND_ID['enquire_link']
+        return self.__request(enquire, callback, timeout)
+
+    def submit_sm(self, sms, callback=None, timeout=None):
+        sms.command_id = COMMAND_ID['submit_sm']
+        return self.__request(sms, callback, timeout)
+
+    def deliver_sm(self, pdu):
+        """deliver_sm(self, pdu) -> PDU() or None\nOverride this method."""
+        return pdu.response(body="\0")
+
+    def data_sm(self, pdu):
+        """data_sm(self, pdu) -> PDU() or None\nOverride this method."""
+        return pdu.response(body="\0")
+
+    def send_pdu(self, p):
+        """Queues a PDU for sending (e.g. a deferred deliver_sm_resp)."""
+        msg = str(p)
+        if self.tracer.active:
+            self.tracer.pdu_out(p, msg)
+        self.__outbuf.append(msg)
+        if self.reactor is not None and len(self.__outbuf) == 1:
+            self.reactor.output(self)
+        if self.__answering and p.command_id & 0x80000000:
+            req = self.__answering.pop(p.sequence_number, None)
+            if req is not None and p.command_status == 0 and \
+               self.dedup is not None:
+                self.dedup.remember(req)
+
+    def pending(self):
+        """Number of requests waiting for a response."""
+        return len(self.__pending)
+
+    def process(self, timeout=None):
+        """Runs one pass of the asyncore loop this session belongs to.
+        Lets Pending.result() be used outside of the loop."""
+        if self.reactor is not None:
+            self.reactor.run_once(timeout)
+            return
+        asyncore.loop(timeout, map=self.__map, count=1)
+        self.expire()
+
+    def __request(self, p, callback, timeout, internal=None):
+        p.sequence_number = self.sequence
+        if timeout is None:
+            timeout = self.response_timeout
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        req = Pending(self, p, None, deadline)
+        if internal:
+            req.add_callback(internal)
+        if callback:
+            req.add_callback(callback)
+        self.__pending[p.sequence_number] = req
+        if deadline is not None:
+            self.__track(req)
+            if self.reactor is not None:
+                self.__arm(deadline)
+        self.send_pdu(p)
+        return req
+
+    def __track(self, req):
+        deadlines = self.__deadlines
+        heapq.heappush(deadlines, (req.deadline, req.sequence_number, req))
+        # the answered requests stay in the heap until their deadline
+        # comes up; don't let them pile up
+        if len(deadlines) > 2 * len(self.__pending) + 64:
+            pending = self.__pending
+            deadlines[:] = [d for d in deadlines if pending.get(d[1]) is d[2]]
+            heapq.heapify(deadlines)
+
+    def expire(self):
+        """Fails the requests whose time is up. With a reactor it also
+        sets the timer for the next deadline."""
+        self.__timer = None
+        now = time.time()
+        # a callback may send, or close the session: look again each time
+        while self.__deadlines:
+            deadline, seq, req = self.__deadlines[0]
+            if self.__pending.get(seq) is req:
+                if deadline > now:
+                    break
+                del self.__pending[seq]
+                error = SMPPError("Response timeout (sequence %d)" % seq)
+                self.tracer.error(error)
+                heapq.heappop(self.__deadlines)
+                req.set_error(error)
+            else:
+                heapq.heappop(self.__deadlines)     # answered already
+        if self.__deadlines and self.reactor is not None:
+            self.__arm(self.__deadlines[0][0])
+
+    def __arm(self, deadline):
+        # one timer for the earliest deadline, not one per request
+        timer = self.__timer
+        if timer is not None and not timer.cancelled:
+            if timer.when <= deadline:
+                return
+            self.reactor.cancel(timer)
+        self.__timer = self.reactor.call_at(deadline, self.expire)
+
+    def __dispatch(self, p):
+        cid = p.command_id
+        if cid & 0x80000000:
+            req = self.__pending.pop(p.sequence_number, None)
+            if req:
+                if not self.__pending:
+                    self.__idle()
+                req.set_response(p)
+            return
+        if cid == COMMAND_ID['enquire_link']:
+            resp = p.response()
+        elif cid in (COMMAND_ID['deliver_sm'], COMMAND_ID['data_sm']):
+            if self.dedup is not None:
+                if self.dedup.seen(p):
+                    self.send_pdu(p.response(body="\0"))
+                    return
+                # remembered once it is answered ESME_ROK, see send_pdu
+                self.__answering[p.sequence_number] = p
+            if cid == COMMAND_ID['deliver_sm']:
+                resp = self.deliver_sm(p)
+            else:
+                resp = self.data_sm(p)
+        elif cid == COMMAND_ID['unbind']:
+            resp = p.response()
+            self.state = STATE['OPEN']
+        else:
+            resp = p.response(cid=COMMAND_ID['generic_nack'], status=0x03)
+        if resp is not None:
+            self.send_pdu(resp)
+
+    # asyncore callbacks
+
+    def readable(self):
+        # asyncore asks this on every pass of the loop, good enough a
+        # place to notice timed out requests
+        deadlines = self.__deadlines
+        if deadlines and deadlines[0][0] <= time.time():
+            self.expire()
+        return True
+
+    def writable(self):
+        return (not self.connected) or len(self.__outbuf) > 0
+
+    def handle_connect(self):
+        pass
+
+    def handle_read(self):
+        try:
+            n = self.__framer.fill(self.socket)
+        except socket.error, why:
+            if why.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+                return
+            if why.args[0] in asyncore._DISCONNECTED:
+                self.handle_close()
+                return
+            raise
+        if n == 0:
+            self.handle_close()
+            return
+        try:
+            for data in self.__framer.pdus():
+                p = pdu.PDU(data)
+                if self.tracer.active:
+                    self.tracer.pdu_in(p, data)
+                self.__dispatch(p)
+        except pdu.PDUError, e:
+            self.tracer.error(e)
+            self.handle_close()
+
+    def handle_write(self):
+        data = ''.join(self.__outbuf)
+        sent = self.send(data)
+        if sent < len(data):
+            self.__outbuf = [data[sent:]]
+        else:
+            self.__outbuf = []
+
+    def handle_close(self):
+        self.close()
+        self.state = STATE["CLOSED"]
+        self.tracer.flush()
+        pending, self.__pending = self.__pending, {}
+        self.__deadlines = []
+        for req in pending.values():
+            req.set_error(SMPPError("socket connection broken"))
+
+    def close(self):
+        # from handle_close, a timer or the user: the reactor must let go
+        # before the socket is closed (and its fd maybe reused)
+        self.__idle()
+        if self.reactor is not None:
+            self.reactor.remove(self)
+        asyncore.dispatcher.close(self)
+
+    def __idle(self):
+        # nothing to time out: no timer keeps the reactor running
+        self.__deadlines = []
+        if self.__timer is not None and self.reactor is not None:
+            self.reactor.cancel(self.__timer)
+        self.__timer = None
+
+    def log_info(self, s, type='info'):
+        if type == 'error':
+            self.tracer.error(s)
+        else:
+            self.tracer.info(s)
+
+    def log_debug(self, s):
+        self.tracer.debug(s)
@@ -0,0 +1,360 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""Recording the PDUs of a session to a file, and playing them back.
+
+Example:
+    rec = capture.Recorder('/var/tmp/smsc.cap')
+    rec.attach(sm)                      # an SMPP or AsyncSMPP
+    ...
+    rec.close()
+
+    for direction, t, data in capture.read('/var/tmp/smsc.cap'):
+        print direction, t, pdu.PDU(data).dump()
+
+    # the captured deliver_sm through a handler, 10 times as fast
+    capture.replay('/var/tmp/smsc.cap', store, speed=10)
+
+    # or through a real session: an SMSC sending the captured deliver_sm
+    smsc = capture.ReplaySMSC('/var/tmp/smsc.cap', speed=None)
+    smsc.start()
+    sm = smpp.SMPP()
+    sm.connect(*smsc.address)
+    sm.bind_receiver('any', 'thing')
+    while not smsc.done():
+        sm.process(1)
+
+A capture file starts with MAGIC and the time it was started (a double),
+followed by records of
+    direction (1) microseconds since the start (8) the PDU as sent
+(the PDU carries its own length). The times never go back, even when
+the clock does. IN is a PDU received, OUT one sent.
+
+The Recorder only copies the PDUs into a buffer; a thread of its own
+writes them out, so a slow disk doesn't hold up the session. When more
+than max_buffer octets are waiting the new PDUs are dropped and counted
+in dropped.
+
+replay() and ReplaySMSC play the received PDUs of a capture at their
+recorded pace (speed=1), speed times as fast, or as fast as they can
+(speed=None). Nothing else is played back: ReplaySMSC answers the bind
+and enquire_link of the session and sends the captured deliver_sm,
+data_sm and the like; the responses of the session are read and dropped.
+"""
+import struct, time, threading, socket, select
+import pdu
+from pdu import COMMAND_ID
+from framer import Framer
+
+MAGIC = 'pySMPPc1'
+IN = 0
+OUT = 1
+
+REPLAYED = (COMMAND_ID['deliver_sm'], COMMAND_ID['data_sm'])
+
+_start = struct.Struct('>d')
+_record = struct.Struct('>BQ')
+_length = struct.Struct('>I')
+
+class CaptureError(Exception):
+    pass
+
+def _bytes(data):
+    if isinstance(data, str):
+        return data
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return str(data)
+
+
+class Recorder(object):
+    def __init__(self, path, max_buffer=16 * 1024 * 1024, flush_interval=0.2):
+        """path is a file name or a file open for writing."""
+        if isinstance(path, basestring):
+            path = open(path, 'wb')
+        self.file = path
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.started = time.time()
+        self.__last = 0
+        self.__chunks = []
+        self.__size = 0
+        self.__sessions = []
+        self.__cond = threading.Condition()
+        self.__closing = False
+        self.file.write(MAGIC + _start.pack(self.started))
+        self.__thread = threading.Thread(target=self.__write,
+                                         name="PDU capture writer")
+        self.__thread.setDaemon(True)
+        self.__thread.start()
+
+    def attach(self, session):
+        """Records the PDUs of session, through its tracer's hooks."""
+        hooks = [('on_pdu_in', lambda p, data: self.record(IN, data)),
+                 ('on_pdu_out', lambda p, data: self.record(OUT, data))]
+        for event, hook in hooks:
+            session.tracer.add_hook(event, hook)
+        self.__sessions.append((session, hooks))
+
+    def detach(self, session):
+        for s, hooks in self.__sessions[:]:
+            if s is session:
+                for event, hook in hooks:
+                    session.tracer.remove_hook(event, hook)
+                self.__sessions.remove((s, hooks))
+
+    def record(self, direction, data):
+        """Adds a raw PDU to the capture."""
+        data = _bytes(data)
+        t = int((time.time() - self.started) * 1000000)
+        self.__cond.acquire()
+        try:
+            if self.__size + len(data) > self.max_buffer or self.__closing:
+                self.dropped += 1
+                return
+            if t < self.__last:
+                t = self.__last
+            self.__last = t
+            self.__chunks.append(_record.pack(direction, t))
+            self.__chunks.append(data)
+            self.__size += len(data) + _record.size
+            if self.__size >= 65536:
+                self.__cond.notify()
+        finally:
+            self.__cond.release()
+
+    def __write(self):
+        cond = self.__cond
+        while True:
+            cond.acquire()
+            try:
+                if not self.__chunks and not self.__closing:
+                    cond.wait(self.flush_interval)
+                chunks, self.__chunks = self.__chunks, []
+                self.__size = 0
+                closing = self.__closing
+            finally:
+                cond.release()
+            if chunks:
+                self.file.write(''.join(chunks))
+                self.file.flush()
+            if closing and not chunks:
+                return
+
+    def close(self):
+        """Writes out what is buffered and closes the file."""
+        for session, hooks in self.__sessions[:]:
+            self.detach(session)
+        self.__cond.acquire()
+        self.__closing = True
+        self.__cond.notify()
+        self.__cond.release()
+        self.__thread.join()
+        self.file.close()
+
+
+def read(path, max_pdu_length=None):
+    """read(path, max_pdu_length=None) -> yields (direction, seconds
+    since the start, raw PDU)
+    A record cut short at the end (a crash) is left out. PDUs longer
+    than max_pdu_length are an error; by default any length is taken,
+    as the session that was recorded may have had a bigger limit."""
+    if isinstance(path, basestring):
+        path = open(path, 'rb')
+    head = path.read(len(MAGIC) + _start.size)
+    if head[:len(MAGIC)] != MAGIC:
+        raise CaptureError("Not a PDU capture")
+    while True:
+        header = path.read(_record.size + 4)
+        if len(header) < _record.size + 4:
+            return
+        direction, t = _record.unpack_from(header)
+        (length,) = _length.unpack_from(header, _record.size)
+        if length < 16 or (max_pdu_length is not None and
+                           length > max_pdu_length):
+            raise CaptureError("Bad PDU length %d in the capture" % length)
+        rest = path.read(length - 4)
+        if len(rest) < length - 4:
+            return
+        yield direction, t / 1000000.0, header[_record.size:] + rest
+
+def started(path):
+    """The time a capture was started."""
+    f = open(path, 'rb')
+    head = f.read(len(MAGIC) + _start.size)
+    f.close()
+    if head[:len(MAGIC)] != MAGIC:
+        raise CaptureError("Not a PDU capture")
+    return _start.unpack_from(head, len(MAGIC))[0]
+
+
+class _Pacer(object):
+    """Waits until a record's time, at speed times its recorded pace."""
+    def __init__(self, speed):
+        self.speed = speed
+        self.start = None
+        self.first = None
+
+    def wait(self, t):
+        if not self.speed:
+            return
+        if self.start is None:
+            self.start, self.first = time.time(), t
+            return
+        delay = self.start + (t - self.first) / self.speed - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def replay(path, handler, speed=1, commands=REPLAYED, max_pdu_length=None):
+    """replay(path, handler, speed=1, commands=REPLAYED,
+    max_pdu_length=None) -> (count, seconds)
+    Calls handler(pdu) for every received PDU of the capture with a
+    command_id in commands (None for all), like SMPP.dispatch() calls
+    deliver_sm(); what handler returns is ignored."""
+    pacer = _Pacer(speed)
+    count = 0
+    start = time.time()
+    for direction, t, data in read(path, max_pdu_length):
+        if direction != IN:
+            continue
+        p = pdu.PDU(data)
+        if commands is not None and p.command_id not in commands:
+            continue
+        pacer.wait(t)
+        handler(p)
+        count += 1
+    return count, time.time() - start
+
+
+class ReplaySMSC(object):
+    def __init__(self, path, addr='127.0.0.1', port=0, speed=1,
+                 commands=REPLAYED, system_id='pySMPP', max_pdu_length=None):
+        """Serves one session at a time on addr, port (0 picks one),
+        sending it the captured PDUs once it is bound. max_pdu_length
+        is as for read()."""
+        self.path = path
+        self.max_pdu_length = max_pdu_length
+        self.speed = speed
+        self.commands = commands
+        self.system_id = system_id
+        self.sent = 0
+        self.__done = threading.Event()
+        self.__sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.__sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__sock.bind((addr, port))
+        self.__sock.listen(5)
+        self.address = self.__sock.getsockname()
+        self.__thread = None
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.serve,
+                                         name="SMPP capture replay")
+        self.__thread.setDaemon(True)
+        self.__thread.start()
+
+    def done(self):
+        """True once the whole capture was sent."""
+        return self.__done.isSet()
+
+    def wait(self, timeout=None):
+        self.__done.wait(timeout)
+        return self.__done.isSet()
+
+    def serve(self):
+        """Accepts a session and plays the capture to it."""
+        conn, peer = self.__sock.accept()
+        self.__framer = Framer(self.max_pdu_length or pdu.MAX_PDU_LENGTH)
+        try:
+            while not self.__bound(conn):
+                pass
+            pacer = _Pacer(self.speed)
+            out = []
+            for direction, t, data in read(self.path, self.max_pdu_length):
+                if direction != IN:
+                    continue
+                (cid,) = _length.unpack_from(data, 4)
+                if self.commands is not None and cid not in self.commands:
+                    continue
+                if self.speed:
+                    pacer.wait(t)
+                    self.__send(conn, data)
+                else:
+                    out.append(data)
+                    if len(out) >= 100:
+                        self.__send(conn, ''.join(out))
+                        out = []
+                self.sent += 1
+            if out:
+                self.__send(conn, ''.join(out))
+            self.__done.set()
+            # keep answering until the session goes away
+            while self.__answer(conn, None):
+                pass
+        except socket.error:
+            pass
+        conn.close()
+        self.__done.set()
+
+    def __bound(self, conn):
+        if self.__framer.fill(conn) == 0:
+            raise socket.error("Connection closed before the bind")
+        for data in self.__framer.pdus():
+            p = pdu.PDU(data)
+            if p.command_id in (COMMAND_ID['bind_receiver'],
+                                COMMAND_ID['bind_transmitter'],
+                                COMMAND_ID['bind_tranceiver']):
+                conn.sendall(str(p.response(body=self.system_id + '\0')))
+                return True
+            self.__reply(conn, p)
+        return False
+
+    def __send(self, conn, data):
+        # reading meanwhile: a session blocked on sending us its
+        # responses doesn't read either
+        while data:
+            r, w, x = select.select([conn], [conn], [])
+            if r and not self.__answer(conn, 0):
+                raise socket.error("Connection closed")
+            if w:
+                data = data[conn.send(data):]
+
+    def __answer(self, conn, timeout):
+        """Reads what the session sent, answering its requests; False
+        when it closed the connection."""
+        r, w, x = select.select([conn], [], [], timeout)
+        if not r:
+            return True
+        if self.__framer.fill(conn) == 0:
+            return False
+        for data in self.__framer.pdus():
+            self.__reply(conn, pdu.PDU(data))
+        return True
+
+    def __reply(self, conn, p):
+        cid = p.command_id
+        if cid & 0x80000000:
+            return              # the session's responses to what we sent
+        if cid in (COMMAND_ID['enquire_link'], COMMAND_ID['unbind']):
+            conn.sendall(str(p.response()))
+        else:
+            conn.sendall(str(p.response(cid=COMMAND_ID['generic_nack'],
+                                        status=0x03)))
+
+    def close(self):
+        self.__sock.close()
@@ -0,0 +1,321 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""Encoding and decoding of PDU bodies, driven by SCHEMA.
+
+Example:
+    body = codec.encode('submit_sm', {'destination_addr': '38970123456',
+                                      'short_message': 'Hello'})
+    f = codec.decode(p.command_id, p.body)
+    print f.destination_addr, f.short_message
+
+SCHEMA lists the mandatory parameters of each command in COMMAND_ID in
+wire order. Field types:
+    C - C-Octet String (NULL terminated)
+    B - 1 octet integer
+    M - the short_message octets, as many as the preceding sm_length
+    D - the destinations of submit_multi, as many as number_of_dests:
+        (DEST_SME, ton, npi, address) or (DEST_DL, dl_name) tuples
+    U - the unsuccess_sme of submit_multi_resp, as many as no_unsuccess:
+        (ton, npi, address, error_status_code) tuples
+The counts (sm_length, number_of_dests, no_unsuccess) are always taken
+from what they count when encoding.
+Runs of integers are packed/unpacked with one precompiled struct.Struct.
+Whatever follows the mandatory parameters goes into the 'optional'
+field: decoding makes it a tlv.TLVs, for encoding it can be a string of
+encoded TLVs, a TLVs or a dict/list for tlv.encode().
+"""
+import struct
+from pdu import COMMAND_ID, PDUError
+from tlv import TLVs
+import tlv
+
+MAX_SM_LENGTH = 254
+MAX_DESTS = 254
+
+# dest_flag of a submit_multi destination
+DEST_SME = 1
+DEST_DL = 2
+
+# count field -> (the field it counts, the most there may be)
+_COUNTS = {
+    'sm_length':        ('short_message', MAX_SM_LENGTH),
+    'number_of_dests':  ('dest_address', MAX_DESTS),
+    'no_unsuccess':     ('unsuccess_sme', 255),
+}
+_sme = struct.Struct('>BB')
+_unsuccess = struct.Struct('>I')
+
+_bind = [('system_id', 'C'), ('password', 'C'), ('system_type', 'C'),
+    ('interface_version', 'B'), ('addr_ton', 'B'), ('addr_npi', 'B'),
+    ('address_range', 'C')]
+
+_sm = [('service_type', 'C'),
+    ('source_addr_ton', 'B'), ('source_addr_npi', 'B'), ('source_addr', 'C'),
+    ('dest_addr_ton', 'B'), ('dest_addr_npi', 'B'), ('destination_addr', 'C'),
+    ('esm_class', 'B'), ('protocol_id', 'B'), ('priority_flag', 'B'),
+    ('schedule_delivery_time', 'C'), ('validity_period', 'C'),
+    ('registered_delivery', 'B'), ('replace_if_present_flag', 'B'),
+    ('data_coding', 'B'), ('sm_default_msg_id', 'B'),
+    ('sm_length', 'B'), ('short_message', 'M')]
+
+_message_id = [('message_id', 'C')]
+
+SCHEMA = {
+    'generic_nack' :        [],
+    'bind_receiver' :       _bind,
+    'bind_receiver_resp' :  [('system_id', 'C')],
+    'bind_transmitter' :    _bind,
+    'bind_transmitter_resp':[('system_id', 'C')],
+    'query_sm' :            [('message_id', 'C'), ('source_addr_ton', 'B'),
+                             ('source_addr_npi', 'B'), ('source_addr', 'C')],
+    'query_sm_resp' :       [('message_id', 'C'), ('final_date', 'C'),
+                             ('message_state', 'B'), ('error_code', 'B')],
+    'submit_sm' :           _sm,
+    'submit_sm_resp' :      _message_id,
+    'deliver_sm' :          _sm,
+    'deliver_sm_resp' :     _message_id,
+    'unbind' :              [],
+    'unbind_resp' :         [],
+    'replace_sm' :          [('message_id', 'C'), ('source_addr_ton', 'B'),
+                             ('source_addr_npi', 'B'), ('source_addr', 'C'),
+                             ('schedule_delivery_time', 'C'),
+                             ('validity_period', 'C'),
+                             ('registered_delivery', 'B'),
+                             ('sm_default_msg_id', 'B'), ('sm_length', 'B'),
+                             ('short_message', 'M')],
+    'replace_sm_resp' :     [],
+    'cancel_sm' :           [('service_type', 'C'), ('message_id', 'C'),
+                             ('source_addr_ton', 'B'), ('source_addr_npi', 'B'),
+                             ('source_addr', 'C'), ('dest_addr_ton', 'B'),
+                             ('dest_addr_npi', 'B'), ('destination_addr', 'C')],
+    'cancel_sm_resp' :      [],
+    'bind_tranceiver' :     _bind,
+    'bind_tranceiver_resp': [('system_id', 'C')],
+    'outbind' :             [('system_id', 'C'), ('password', 'C')],
+    'alert_notification' :  [('source_addr_ton', 'B'), ('source_addr_npi', 'B'),
+                             ('source_addr', 'C'), ('esme_addr_ton', 'B'),
+                             ('esme_addr_npi', 'B'), ('esme_addr', 'C')],
+    'data_sm' :             [('service_type', 'C'),
+                             ('source_addr_ton', 'B'), ('source_addr_npi', 'B'),
+                             ('source_addr', 'C'), ('dest_addr_ton', 'B'),
+                             ('dest_addr_npi', 'B'), ('destination_addr', 'C'),
+                             ('esm_class', 'B'), ('registered_delivery', 'B'),
+                             ('data_coding', 'B')],
+    'data_sm_resp' :        _message_id,
+    'enquire_link' :        [],
+    'enquire_link_resp' :   [],
+    'submit_multi' :        [('service_type', 'C'),
+                             ('source_addr_ton', 'B'), ('source_addr_npi', 'B'),
+                             ('source_addr', 'C'), ('number_of_dests', 'B'),
+                             ('dest_address', 'D')] + _sm[7:],
+    'submit_multi_resp' :   [('message_id', 'C'), ('no_unsuccess', 'B'),
+                             ('unsuccess_sme', 'U')],
+}
+
+
+class Fields(object):
+    """Base of the decoded field objects, one subclass per command."""
+    __slots__ = ()
+    command = None
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def __repr__(self):
+        return '<%s %s>' % (self.command,
+            ', '.join(['%s=%r' % i for i in self.items()]))
+
+
+class _Codec(object):
+    """Compiled form of one SCHEMA entry."""
+    def __init__(self, command, fields):
+        self.command = command
+        self.names = [name for name, kind in fields]
+        self.ops = []
+        run = []
+        for name, kind in fields + [(None, None)]:
+            if kind == 'B':
+                run.append(name)
+                continue
+            if run:
+                self.ops.append(('B', struct.Struct('>' + 'B' * len(run)), run))
+                run = []
+            if kind is not None:
+                self.ops.append((kind, None, name))
+        self.cls = type(command, (Fields,), {
+            '__slots__': tuple(self.names) + ('optional',),
+            'command': command})
+
+    def encode(self, fields):
+        get = fields.get
+        parts = []
+        for kind, st, name in self.ops:
+            if kind == 'C':
+                parts.append(get(name) or '')
+                parts.append('\0')
+            elif kind == 'B':
+                if name[-1] in _COUNTS:
+                    counted, limit = _COUNTS[name[-1]]
+                    length = len(get(counted) or '')
+                    if length > limit:
+                        if counted == 'short_message':
+                            raise PDUError("short_message of %d octets, at "
+                                "most %d fit (see SMS.segments)" % (length, limit))
+                        raise PDUError("%d %s, at most %d fit" % (length,
+                            counted, limit))
+                    values = [get(n) or 0 for n in name[:-1]]
+                    values.append(length)
+                    parts.append(st.pack(*values))
+                else:
+                    parts.append(st.pack(*[get(n) or 0 for n in name]))
+            elif kind == 'D':
+                for dest in get(name) or ():
+                    if dest[0] == DEST_DL:
+                        parts.append(chr(DEST_DL) + dest[1] + '\0')
+                    else:
+                        flag, ton, npi, addr = dest
+                        parts.append(chr(DEST_SME) + _sme.pack(ton, npi) +
+                                     addr + '\0')
+            elif kind == 'U':
+                for ton, npi, addr, status in get(name) or ():
+                    parts.append(_sme.pack(ton, npi) + addr + '\0' +
+                                 _unsuccess.pack(status))
+            else:
+                parts.append(get(name) or '')
+        optional = get('optional')
+        if optional is not None:
+            if isinstance(optional, TLVs):
+                optional = optional.buf
+            elif not isinstance(optional, str):
+                optional = tlv.encode(optional)
+            parts.append(optional)
+        return ''.join(parts)
+
+    def decode(self, buf):
+        f = self.cls()
+        off = 0
+        end = len(buf)
+        for kind, st, name in self.ops:
+            if kind == 'C':
+                i = buf.find('\0', off)
+                if i < 0:
+                    if end == 0:
+                        # error responses usually come without a body
+                        self.__empty(f)
+                        return f
+                    raise PDUError("Unterminated C-Octet String %s in %s"
+                        % (name, self.command))
+                setattr(f, name, buf[off:i])
+                off = i + 1
+            elif kind == 'B':
+                if off + st.size > end:
+                    if end == 0:
+                        self.__empty(f)
+                        return f
+                    raise PDUError("Truncated %s body" % self.command)
+                for n, v in zip(name, st.unpack_from(buf, off)):
+                    setattr(f, n, v)
+                off += st.size
+            elif kind == 'D':
+                items = []
+                for i in range(f.number_of_dests):
+                    if off >= end:
+                        raise PDUError("Truncated dest_address in %s"
+                            % self.command)
+                    flag = ord(buf[off])
+                    off += 1
+                    if flag == DEST_SME:
+                        if off + 2 > end:
+                            raise PDUError("Truncated dest_address in %s"
+                                % self.command)
+                        ton, npi = _sme.unpack_from(buf, off)
+                        off += 2
+                    elif flag != DEST_DL:
+                        raise PDUError("Bad dest_flag %d in %s"
+                            % (flag, self.command))
+                    j = buf.find('\0', off)
+                    if j < 0:
+                        raise PDUError("Unterminated dest_address in %s"
+                            % self.command)
+                    if flag == DEST_SME:
+                        items.append((DEST_SME, ton, npi, buf[off:j]))
+                    else:
+                        items.append((DEST_DL, buf[off:j]))
+                    off = j + 1
+                setattr(f, name, items)
+            elif kind == 'U':
+                items = []
+                for i in range(f.no_unsuccess):
+                    j = buf.find('\0', off + 2)
+                    if j < 0 or j + 5 > end:
+                        raise PDUError("Truncated unsuccess_sme in %s"
+                            % self.command)
+                    ton, npi = _sme.unpack_from(buf, off)
+                    (status,) = _unsuccess.unpack_from(buf, j + 1)
+                    items.append((ton, npi, buf[off+2:j], status))
+                    off = j + 5
+                setattr(f, name, items)
+            else:
+                n = f.sm_length
+                if off + n > end:
+                    raise PDUError("short_message longer than %s body"
+                        % self.command)
+                setattr(f, name, buf[off:off+n])
+                off += n
+        f.optional = TLVs(buf[off:])
+        return f
+
+    def __empty(self, f):
+        for kind, st, name in self.ops:
+            if kind == 'B':
+                for n in name:
+                    setattr(f, n, 0)
+            elif kind in 'DU':
+                setattr(f, name, [])
+            else:
+                setattr(f, name, '')
+        f.optional = TLVs()
+
+
+_codecs = {}
+for _command, _fields in SCHEMA.items():
+    _codecs[_command] = _codecs[COMMAND_ID[_command]] = _Codec(_command, _fields)
+
+def encode(command, fields):
+    """encode(command, fields) -> string
+    command is a name or id from COMMAND_ID, fields a dict (or a Fields
+    object) of parameter values; missing ones default to '' or 0.
+    sm_length is always taken from short_message."""
+    try:
+        c = _codecs[command]
+    except KeyError:
+        raise PDUError("No codec for command %r" % (command,))
+    if isinstance(fields, Fields):
+        fields = dict(fields.items())
+    return c.encode(fields)
+
+def decode(command, buf):
+    """decode(command, buf) -> Fields
+    Parses the body buf of a command (name or id)."""
+    try:
+        c = _codecs[command]
+    except KeyError:
+        raise PDUError("No codec for command %r" % (command,))
+    if buf is None:
+        buf = ''
+    return c.decode(buf)
@@ -0,0 +1,210 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""Dropping the deliver_sm an SMSC sends again.
+
+Example:
+    sm = smpp.SMPP()
+    sm.dedup = dedup.Dedup(max_entries=200000, ttl=120,
+                           bloom=dedup.BloomFilter(1000000, window=120))
+    ...
+    print sm.dedup.stats()
+
+An SMSC that didn't get our deliver_sm_resp in time sends the deliver_sm
+again. With dedup set, SMPP.dispatch() (and AsyncSMPP) answers a copy of
+a deliver_sm or data_sm it has seen with the default response, and
+doesn't pass it on. A message counts as seen once it was answered with
+ESME_ROK: one answered with an error (ESME_RX_T_APPN, say) is meant to
+come again, and is handled again when it does.
+
+A delivery receipt is known by its source_addr, message id and state
+(an ENROUTE and a DELIVRD receipt of one message are both delivered),
+any other message by its whole body. Keys are SHA-1 digests. A receipt
+that can't be parsed is keyed on its body too.
+
+The body of a deliver_sm carries nothing that tells a resent copy from
+a subscriber sending the same text again ("YES", twice): both are taken
+for copies within ttl seconds. So ttl (and the window of a BloomFilter)
+should only cover how long the SMSC goes on resending, seconds to a few
+minutes; the default is two minutes.
+
+The keys seen in the last ttl seconds, at most max_entries of them, are
+kept in a dict, with the order they were last seen in a deque next to
+it (the least recently seen go first). A BloomFilter remembers the keys
+for longer in a fixed amount of memory, at the price of a false positive
+now and then: error_rate of the new messages are taken for copies and
+dropped. It is left out by default.
+"""
+import time, collections, hashlib, math, struct, threading
+import receipt
+
+_hashes = struct.Struct('>QQ')
+
+def _esm_class(body):
+    """esm_class of a deliver_sm/data_sm, without decoding the rest;
+    None if the body is too short."""
+    pos = body.find('\0') + 3           # service_type, source ton and npi
+    pos = body.find('\0', pos) + 3      # source_addr, dest ton and npi
+    pos = body.find('\0', pos) + 1      # destination_addr
+    if pos < 1 or pos >= len(body):
+        return None
+    return ord(body[pos])
+
+def key(p):
+    """key(p) -> the digest a deliver_sm/data_sm is known by"""
+    body = p.body or ''
+    esm_class = _esm_class(body)
+    if esm_class is not None and \
+       esm_class & receipt.ESM_TYPE_MASK == receipt.ESM_RECEIPT:
+        # a receipt we can't make sense of is still a message to pass
+        # on: whatever goes wrong, key it like the others
+        try:
+            r = receipt.from_pdu(p)
+            if r is not None:
+                return hashlib.sha1('r\0%s\0%s\0%s' % (
+                    p.fields().source_addr, r.message_id, r.stat)).digest()
+        except Exception:
+            pass
+    return hashlib.sha1(body).digest()
+
+
+class BloomFilter(object):
+    def __init__(self, capacity, error_rate=1e-6, window=None):
+        """Sized for capacity keys at error_rate false positives. With
+        window, the keys are kept from window to twice as many seconds:
+        there are two generations, the older one dropped every window
+        seconds (or when the newer one is full)."""
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window = window
+        self.bits = int(math.ceil(-capacity * math.log(error_rate) /
+                                  math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.bits * math.log(2) / capacity)))
+        self.__new = bytearray((self.bits + 7) / 8)
+        self.__old = None
+        self.__count = 0
+        self.__started = time.time()
+
+    def __positions(self, digest):
+        # double hashing on the first 16 octets of the digest
+        h1, h2 = _hashes.unpack_from(digest)
+        bits = self.bits
+        return [(h1 + i * h2) % bits for i in xrange(self.hashes)]
+
+    def __contains__(self, digest):
+        positions = self.__positions(digest)
+        for gen in (self.__new, self.__old):
+            if gen is None:
+                continue
+            for n in positions:
+                if not gen[n >> 3] & (1 << (n & 7)):
+                    break
+            else:
+                return True
+        return False
+
+    def add(self, digest, now=None):
+        if self.__count >= self.capacity or (self.window is not None and
+           (now or time.time()) - self.__started >= self.window):
+            self.rotate(now)
+        gen = self.__new
+        for n in self.__positions(digest):
+            gen[n >> 3] |= 1 << (n & 7)
+        self.__count += 1
+
+    def rotate(self, now=None):
+        """Starts a new generation, forgetting the older one."""
+        self.__old = self.__new
+        self.__new = bytearray(len(self.__old))
+        self.__count = 0
+        self.__started = now or time.time()
+
+
+class Dedup(object):
+    def __init__(self, max_entries=100000, ttl=120, bloom=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bloom = bloom
+        self.hits = 0               # copies found in the dict
+        self.bloom_hits = 0         # copies found (maybe falsely) by the bloom
+        self.misses = 0
+        self.evicted = 0
+        self.__entries = {}                 # key -> time last seen
+        self.__order = collections.deque()  # (time, key), oldest first
+        self.__lock = threading.Lock()      # remember() may come from the handlers
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def seen(self, p, now=None):
+        """seen(p, now=None) -> bool
+        True if p (a deliver_sm/data_sm) is a copy of one remembered
+        already, which is then remembered for another ttl. A new one
+        isn't: remember() it once it was answered with ESME_ROK."""
+        if now is None:
+            now = time.time()
+        k = key(p)
+        self.__lock.acquire()
+        try:
+            last = self.__entries.get(k)
+            if last is not None and last >= now - self.ttl:
+                self.hits += 1
+                self.__add(k, now)
+                return True
+            if self.bloom is not None and k in self.bloom:
+                self.bloom_hits += 1
+                return True
+            self.misses += 1
+            return False
+        finally:
+            self.__lock.release()
+
+    def remember(self, p, now=None):
+        """Takes p as seen from now on."""
+        if now is None:
+            now = time.time()
+        k = key(p)
+        self.__lock.acquire()
+        try:
+            self.__add(k, now)
+            if self.bloom is not None:
+                self.bloom.add(k, now)
+        finally:
+            self.__lock.release()
+
+    def __add(self, k, now):
+        self.__entries[k] = now
+        self.__order.append((now, k))
+        self.__evict(now)
+
+    def __evict(self, now):
+        entries = self.__entries
+        order = self.__order
+        limit = now - self.ttl
+        while order and (order[0][0] < limit or
+                         len(entries) > self.max_entries or
+                         len(order) > 2 * self.max_entries):
+            t, k = order.popleft()
+            # seen again since, then the deque entry is stale
+            if entries.get(k) == t:
+                del entries[k]
+                self.evicted += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'bloom_hits': self.bloom_hits,
+                'misses': self.misses, 'evicted': self.evicted,
+                'entries': len(self.__entries)}
@@ -0,0 +1,105 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""Splits a stream of bytes into PDUs.
+
+The Framer reads from a socket straight into one reusable bytearray, as
+much as the socket has, and hands out every complete PDU in it as a
+memoryview slice of that buffer (no copying). A slice is only good
+until the next fill() or feed(); pdu.PDU() copies out what it needs.
+"""
+import struct
+import pdu
+
+_length = struct.Struct('>I')
+
+class Framer(object):
+    def __init__(self, max_length=pdu.MAX_PDU_LENGTH, bufsize=65536):
+        self.max_length = max_length
+        self.__buf = bytearray(bufsize)
+        self.__view = memoryview(self.__buf)
+        self.__start = 0    # first byte not handed out yet
+        self.__end = 0      # end of the data read so far
+
+    def buffered(self):
+        """Number of bytes read but not yet returned as PDUs."""
+        return self.__end - self.__start
+
+    def ready(self):
+        """True if a complete PDU is waiting in the buffer."""
+        if self.__end - self.__start < 4:
+            return False
+        (length,) = _length.unpack_from(self.__buf, self.__start)
+        return self.__end - self.__start >= length
+
+    def fill(self, sock):
+        """Reads whatever the socket has into the buffer. Returns the
+        number of bytes read, 0 when the peer closed the connection."""
+        self.__makeroom()
+        n = sock.recv_into(self.__view[self.__end:])
+        self.__end += n
+        return n
+
+    def feed(self, data):
+        """Appends data that was read by someone else."""
+        n = len(data)
+        self.__makeroom(n)
+        self.__buf[self.__end:self.__end+n] = data
+        self.__end += n
+
+    def next(self):
+        """Returns the next complete PDU as a memoryview, or None."""
+        start = self.__start
+        avail = self.__end - start
+        if avail < 4:
+            return None
+        (length,) = _length.unpack_from(self.__buf, start)
+        if length < 16 or length > self.max_length:
+            raise pdu.PDUError("Illegal PDU length! length=%x." % length)
+        if avail < length:
+            return None
+        self.__start = start + length
+        return self.__view[start:start+length]
+
+    def pdus(self):
+        """Yields every complete PDU in the buffer."""
+        data = self.next()
+        while data is not None:
+            yield data
+            data = self.next()
+
+    def __makeroom(self, need=1):
+        start, end = self.__start, self.__end
+        if start == end:
+            self.__start = self.__end = start = end = 0
+        size = len(self.__buf)
+        if end + need <= size:
+            return
+        # a PDU bigger than the buffer needs a bigger buffer
+        want = end - start + need
+        if end - start >= 4:
+            (length,) = _length.unpack_from(self.__buf, start)
+            if length <= self.max_length and length > want:
+                want = length
+        if want > size:
+            buf = bytearray(max(want, size * 2))
+            buf[0:end-start] = self.__buf[start:end]
+            self.__buf = buf
+            self.__view = memoryview(buf)
+        elif start > 0:
+            self.__buf[0:end-start] = self.__buf[start:end]
+        self.__start, self.__end = 0, end - start
@@ -0,0 +1,197 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""GSM 03.38 text encoding.
+
+Example:
+    septets = gsm.encode(u'Hello {world}')     # one septet per octet
+    packed = gsm.pack7(septets)                 # 7 bit packed
+    dcs, octets = gsm.encode_auto(u'\\u0417\\u0434\\u0440\\u0430\\u0432\\u043e')
+    pairs = gsm.encode_many(texts)              # [(dcs, octets), ...]
+
+encode() maps unicode text to the GSM default alphabet plus its
+extension table (escaped with 0x1B), decode() goes back. encode_auto()
+picks the cheapest data_coding a text fits in: the default alphabet, or
+UCS2 when it has characters outside of it. The tables are lookups done
+by unicode.translate() and precompiled regular expressions, no Python
+loop runs per character (decode() runs a little Python per escape).
+encode_many() checks a whole batch of texts in one go with NumPy when it
+is installed.
+"""
+import re, struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# data_coding values
+DCS_DEFAULT = 0x00
+DCS_UCS2    = 0x08
+
+ESCAPE = 0x1B
+
+# GSM 03.38 default alphabet, 0x1B (the escape) is a placeholder
+ALPHABET = (u'@\u00a3$\u00a5\u00e8\u00e9\u00f9\u00ec\u00f2\u00c7\n\u00d8\u00f8\r\u00c5\u00e5'
+    u'\u0394_\u03a6\u0393\u039b\u03a9\u03a0\u03a8\u03a3\u0398\u039e\x1b\u00c6\u00e6\u00df\u00c9'
+    u' !"#\u00a4%&\'()*+,-./0123456789:;<=>?'
+    u'\u00a1ABCDEFGHIJKLMNOPQRSTUVWXYZ\u00c4\u00d6\u00d1\u00dc\u00a7'
+    u'\u00bfabcdefghijklmnopqrstuvwxyz\u00e4\u00f6\u00f1\u00fc\u00e0')
+
+# extension table, reached through the escape
+EXTENSION = {
+    0x0A: u'\x0c',
+    0x14: u'^',
+    0x28: u'{',
+    0x29: u'}',
+    0x2F: u'\\',
+    0x3C: u'[',
+    0x3D: u'~',
+    0x3E: u']',
+    0x40: u'|',
+    0x65: u'\u20ac',
+}
+
+_encode = {}
+for _i, _c in enumerate(ALPHABET):
+    if _i != ESCAPE:
+        _encode[ord(_c)] = unichr(_i)
+for _i, _c in EXTENSION.items():
+    _encode[ord(_c)] = unichr(ESCAPE) + unichr(_i)
+
+# septets (as latin-1) to the basic alphabet; an escape stays itself
+_basic = dict([(_i, _c) for _i, _c in enumerate(ALPHABET)] +
+              [(_i, u'?') for _i in range(len(ALPHABET), 256)])
+# the escape and the basic character after it -> the extended one;
+# unknown escapes fall back to the basic character
+_escapes = re.compile(u'\x1b(.?)', re.DOTALL)
+_escaped = dict([(ALPHABET[_i], _c) for _i, _c in EXTENSION.items()])
+_escaped[u'\x1b'] = u'?'
+
+_chars = u''.join([unichr(c) for c in _encode.keys()])
+_nongsm = re.compile(u'[^%s]' % re.escape(_chars), re.UNICODE)
+_extended = re.compile(u'[%s]' % re.escape(u''.join(EXTENSION.values())), re.UNICODE)
+
+def is_gsm(text):
+    """True if text can be written in the GSM default alphabet."""
+    return _nongsm.search(text) is None
+
+def septets(text):
+    """Number of septets text takes in the default alphabet."""
+    return len(text) + len(_extended.findall(text))
+
+def encode(text):
+    """encode(text) -> string, one septet per octet
+    Raises UnicodeError if text has characters outside of the alphabet."""
+    m = _nongsm.search(text)
+    if m:
+        raise UnicodeError("%r is not in the GSM default alphabet" % m.group())
+    return text.translate(_encode).encode('latin-1')
+
+def decode(data):
+    """decode(data) -> unicode, data being one septet per octet"""
+    text = data.decode('latin-1').translate(_basic)
+    if u'\x1b' in text:
+        text = _escapes.sub(_unescape, text)
+    return text
+
+def _unescape(m):
+    c = m.group(1)
+    return _escaped.get(c, c)
+
+def encode_auto(text):
+    """encode_auto(text) -> (data_coding, octets)
+    The default alphabet if text fits in it, UCS2 otherwise."""
+    if _nongsm.search(text) is None:
+        return DCS_DEFAULT, text.translate(_encode).encode('latin-1')
+    return DCS_UCS2, text.encode('utf-16-be')
+
+
+_q = struct.Struct('<Q')
+
+def pack7(data):
+    """pack7(data) -> string
+    Packs septets (one per octet in data) 8 into 7 octets."""
+    n = len(data)
+    pad = -n % 8
+    if pad:
+        data = data + '\0' * pad
+    groups = struct.unpack('>%dQ' % (len(data) / 8), data)
+    pack = _q.pack
+    out = []
+    for g in groups:
+        # the octets of g are septets 0..7, highest first
+        v = (g >> 56 & 0x7f) | (g >> 41 & 0x3f80) | (g >> 26 & 0x1fc000) | \
+            (g >> 11 & 0xfe00000) | (g << 4 & 0x7f0000000) | \
+            (g << 19 & 0x3f800000000) | (g << 34 & 0x1fc0000000000) | \
+            (g << 49 & 0xfe000000000000)
+        out.append(pack(v)[:7])
+    return ''.join(out)[:(n * 7 + 7) / 8]
+
+def unpack7(data, count=None):
+    """unpack7(data, count=None) -> string, one septet per octet
+    count is the number of septets, by default as many as fit."""
+    if count is None:
+        count = len(data) * 8 / 7
+    n = len(data)
+    pad = -n % 7
+    if pad:
+        data = data + '\0' * pad
+    unpack = _q.unpack
+    out = []
+    for i in range(0, len(data), 7):
+        (v,) = unpack(data[i:i+7] + '\0')
+        out.append(struct.pack('8B', v & 0x7f, v >> 7 & 0x7f, v >> 14 & 0x7f,
+            v >> 21 & 0x7f, v >> 28 & 0x7f, v >> 35 & 0x7f, v >> 42 & 0x7f,
+            v >> 49 & 0x7f))
+    return ''.join(out)[:count]
+
+
+_table = None
+
+def _gsm_table():
+    """NumPy lookup table: 1 for the code points of the alphabet."""
+    global _table
+    if _table is None:
+        _table = numpy.zeros(0x10000, numpy.uint8)
+        _table[[ord(c) for c in _chars]] = 1
+    return _table
+
+def encode_many(texts, use_numpy=None):
+    """encode_many(texts, use_numpy=None) -> [(data_coding, octets), ...]
+    encode_auto() for a batch of texts. With NumPy (used by default when
+    installed) the alphabet check of the whole batch is one table lookup
+    over all of the texts joined together."""
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if not use_numpy or not texts:
+        return [encode_auto(t) for t in texts]
+    texts = list(texts)
+    joined = u''.join(texts).encode('utf-16-le')
+    codes = numpy.frombuffer(joined, numpy.uint16)
+    # characters outside of the BMP are surrogate pairs, never in the table
+    bad = numpy.concatenate(([0], numpy.cumsum(_gsm_table()[codes] == 0)))
+    lengths = numpy.array([len(t.encode('utf-16-le')) / 2 for t in texts])
+    ends = numpy.cumsum(lengths)
+    counts = bad[ends] - bad[ends - lengths]
+    result = []
+    for text, nbad in zip(texts, counts):
+        if nbad:
+            result.append((DCS_UCS2, text.encode('utf-16-be')))
+        else:
+            result.append((DCS_DEFAULT, text.translate(_encode).encode('latin-1')))
+    return result
@@ -0,0 +1,159 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""Handling of inbound deliver_sm/data_sm off the reading thread.
+
+Example:
+    def store(pdu):
+        db.insert(pdu.fields())
+    sm = smpp.SMPP()
+    ...
+    sm.handler_pool = handlers.HandlerPool(sm, store, workers=8)
+    while 1:
+        sm.process(20)
+
+With a HandlerPool set, SMPP.dispatch() hands deliver_sm and data_sm to
+it and goes on reading. The handler has the signature of
+SMPP.deliver_sm: handler(pdu) -> response PDU or None (the default
+response). With ack='immediate' the response is sent before the handler
+runs and whatever it returns is ignored; with ack='after' the handler's
+response is sent when it's done (a handler raising an exception answers
+ESME_RX_T_APPN, so the SMSC tries again later).
+
+With ordered=True the messages from one source_addr are handled one at
+a time in the order they came. The queues are bounded: when they are
+full the reader waits, and so does the SMSC.
+
+processes=N runs the handlers in a multiprocessing.Pool of N processes;
+the worker threads then just wait for them. The handler must then be
+given, and be picklable: a module level function, not the session's
+methods (they would take the session and its socket along).
+"""
+import threading, Queue, socket, pickle
+from pdu import COMMAND_ID, COMMAND_STATUS
+
+ACK_IMMEDIATE = 'immediate'
+ACK_AFTER = 'after'
+
+def source_addr(p):
+    """source_addr of a deliver_sm/data_sm, without decoding the rest."""
+    body = p.body or ''
+    start = body.find('\0') + 3     # after service_type, ton and npi
+    end = body.find('\0', start)
+    if start < 3 or end < 0:
+        return ''
+    return body[start:end]
+
+class HandlerPool(object):
+    def __init__(self, session, handler=None, workers=4, queue_size=100,
+                 ordered=True, ack=ACK_IMMEDIATE, processes=None):
+        """handler defaults to the session's deliver_sm/data_sm methods."""
+        if ack not in (ACK_IMMEDIATE, ACK_AFTER):
+            raise ValueError("ack must be %r or %r" % (ACK_IMMEDIATE, ACK_AFTER))
+        self.session = session
+        self.handler = handler
+        self.ordered = ordered
+        self.ack = ack
+        self.errors = 0
+        self.__lock = threading.Lock()      # guards errors
+        self.__procs = None
+        if processes:
+            if handler is None:
+                raise ValueError("processes needs a module level handler")
+            try:
+                pickle.dumps(handler, pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError), e:
+                raise ValueError("The handler can't be sent to the "
+                                 "processes: %s" % e)
+            import multiprocessing
+            self.__procs = multiprocessing.Pool(processes)
+        if ordered:
+            self.queues = [Queue.Queue(queue_size) for i in range(workers)]
+        else:
+            self.queues = [Queue.Queue(queue_size)]
+        self.threads = []
+        for i in range(workers):
+            q = self.queues[i % len(self.queues)]
+            t = threading.Thread(target=self.__work, args=(q,),
+                name="SMPP handler %d" % i)
+            t.setDaemon(True)
+            t.start()
+            self.threads.append(t)
+
+    def submit(self, p):
+        """Queues an inbound PDU, blocks while its queue is full."""
+        if self.ack == ACK_IMMEDIATE:
+            self.session.send_pdu(p.response(body="\0"))
+        if self.ordered:
+            q = self.queues[hash(source_addr(p)) % len(self.queues)]
+        else:
+            q = self.queues[0]
+        q.put(p)
+
+    def __handler(self, p):
+        if self.handler is not None:
+            return self.handler
+        if p.command_id == COMMAND_ID['data_sm']:
+            return self.session.data_sm
+        return self.session.deliver_sm
+
+    def __work(self, q):
+        while True:
+            p = q.get()
+            try:
+                if p is None:
+                    return
+                self.__handle(p)
+            finally:
+                q.task_done()
+
+    def __handle(self, p):
+        handler = self.__handler(p)
+        try:
+            if self.__procs is not None:
+                resp = self.__procs.apply(handler, (p,))
+            else:
+                resp = handler(p)
+        except Exception, e:
+            self.__lock.acquire()
+            self.errors += 1
+            self.__lock.release()
+            self.session.tracer.error(e)
+            resp = p.response(status=COMMAND_STATUS['ESME_RX_T_APPN'])
+        if self.ack == ACK_AFTER:
+            if resp is None:
+                resp = p.response(body="\0")
+            try:
+                self.session.send_pdu(resp)
+            except (socket.error, RuntimeError), e:
+                # the connection is gone, the SMSC will deliver it again
+                self.session.tracer.error(e)
+
+    def join(self):
+        """Waits until everything queued has been handled."""
+        for q in self.queues:
+            q.join()
+
+    def close(self):
+        """Handles what is queued and stops the workers."""
+        for i in range(len(self.threads)):
+            self.queues[i % len(self.queues)].put(None)
+        for t in self.threads:
+            t.join()
+        if self.__procs is not None:
+            self.__procs.close()
+            self.__procs.join()
@@ -0,0 +1,316 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""Counters, an in-flight gauge and response latency histograms of the
+sessions.
+
+Example:
+    m = metrics.Metrics(labels={'account': 'operator1'})
+    sm = smpp.SMPP()
+    m.attach(sm)
+    ...
+    m.snapshot()['pdus_in']['submit_sm_resp']
+    print m.render()                    # Prometheus text format
+    print metrics.render([m1, m2])      # several, with their labels
+
+A Metrics installs PDU hooks in the tracer of the sessions it is
+attached to (see trace.Tracer) and counts:
+    PDUs in and out by command, and their bytes
+    responses with a command_status other than ESME_ROK, by command and
+    status, in both directions
+    errors reported to the tracer (timeouts, lost connections, ...)
+    the requests waiting for a response (the sessions' pending()), read
+    when the numbers are asked for
+    the time from sending a request (submit_sm and enquire_link by
+    default) to its response, in histograms of fixed buckets
+Per PDU this is a few dictionary operations in the hooks, under a lock
+of the Metrics (the sessions of a HandlerPool send from its threads);
+nothing is formatted until snapshot() or render(), which copy the
+numbers under the lock. Attach a Metrics once for each tracer: sessions
+sharing a tracer share the hooks too.
+"""
+import time, bisect, threading
+from pdu import COMMAND_ID, command_name, status_name
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0)
+TIMED = ('submit_sm', 'enquire_link')
+
+STALE = 300             # seconds after which an unanswered request isn't timed
+MAX_TIMED = 100000      # requests timed at once before the stale ones are dropped
+
+class Histogram(object):
+    """Counts of values in fixed buckets (upper bounds, inclusive)."""
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def copy(self):
+        h = Histogram(self.buckets)
+        h.counts = self.counts[:]
+        h.sum = self.sum
+        h.count = self.count
+        return h
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """cumulative(self) -> list of (upper bound, count), the last
+        bound is float('inf')"""
+        result = []
+        total = 0
+        for le, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            result.append((le, total))
+        return result
+
+    def quantile(self, q):
+        """The upper bound of the bucket holding the q quantile."""
+        if not self.count:
+            return None
+        for le, total in self.cumulative():
+            if total >= q * self.count:
+                return le
+
+
+class Metrics(object):
+    def __init__(self, timed=TIMED, buckets=BUCKETS, labels=None):
+        """timed are the names of the commands whose responses are timed,
+        labels a dict added to every sample rendered."""
+        self.labels = labels or {}
+        self.timed = [COMMAND_ID[c] for c in timed]
+        self.buckets = buckets
+        self.__sessions = []
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Sets every counter and histogram back to zero."""
+        latency = {}                # command_id -> Histogram
+        for cid in self.timed:
+            latency[cid] = Histogram(self.buckets)
+        self.__lock.acquire()
+        try:
+            self.pdus_in = {}       # command_id -> count
+            self.pdus_out = {}
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.statuses = {}      # (direction, command_id, status) -> count
+            self.errors = 0
+            self.latency = latency
+        finally:
+            self.__lock.release()
+
+    def attach(self, session):
+        """Starts counting the PDUs of session (an SMPP or AsyncSMPP)."""
+        timed = set(self.timed)
+        sent = {}                   # sequence_number -> (command_id, time)
+        clock = time.time
+        lock = self.__lock
+
+        def pdu_out(p, data):
+            cid = p.command_id
+            lock.acquire()
+            try:
+                counts = self.pdus_out
+                counts[cid] = counts.get(cid, 0) + 1
+                self.bytes_out += len(data)
+                if cid & 0x80000000:
+                    if p.command_status:
+                        statuses = self.statuses
+                        key = ('out', cid, p.command_status)
+                        statuses[key] = statuses.get(key, 0) + 1
+                elif cid in timed:
+                    sent[p.sequence_number] = (cid, clock())
+                    if len(sent) > MAX_TIMED:
+                        self.__prune(sent)
+            finally:
+                lock.release()
+
+        def pdu_in(p, data):
+            cid = p.command_id
+            lock.acquire()
+            try:
+                counts = self.pdus_in
+                counts[cid] = counts.get(cid, 0) + 1
+                self.bytes_in += len(data)
+                if cid & 0x80000000:
+                    if p.command_status:
+                        statuses = self.statuses
+                        key = ('in', cid, p.command_status)
+                        statuses[key] = statuses.get(key, 0) + 1
+                    if sent:
+                        request = sent.pop(p.sequence_number, None)
+                        if request is not None:
+                            self.latency[request[0]].observe(clock() - request[1])
+            finally:
+                lock.release()
+
+        hooks = [('on_pdu_out', pdu_out), ('on_pdu_in', pdu_in),
+                 ('on_error', self.__error)]
+        for event, hook in hooks:
+            session.tracer.add_hook(event, hook)
+        self.__sessions.append((session, hooks))
+
+    def detach(self, session):
+        for s, hooks in self.__sessions[:]:
+            if s is session:
+                for event, hook in hooks:
+                    session.tracer.remove_hook(event, hook)
+                self.__sessions.remove((s, hooks))
+
+    def __error(self, error):
+        self.__lock.acquire()
+        self.errors += 1
+        self.__lock.release()
+
+    def __prune(self, sent):
+        old = time.time() - STALE
+        for seq, (cid, t) in sent.items():
+            if t < old:
+                del sent[seq]
+
+    def in_flight(self):
+        """Requests of the attached sessions waiting for a response."""
+        return sum([s.pending() for s, hooks in self.__sessions])
+
+    def _copy(self):
+        """_copy(self) -> dict of the raw numbers, taken under the lock"""
+        self.__lock.acquire()
+        try:
+            latency = {}
+            for cid, h in self.latency.items():
+                latency[cid] = h.copy()
+            return {'pdus_in': self.pdus_in.copy(),
+                    'pdus_out': self.pdus_out.copy(),
+                    'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out,
+                    'statuses': self.statuses.copy(), 'errors': self.errors,
+                    'latency': latency}
+        finally:
+            self.__lock.release()
+
+    def snapshot(self):
+        """snapshot(self) -> dict of the current numbers, with command
+        and status names"""
+        numbers = self._copy()
+        latency = {}
+        for cid, h in numbers['latency'].items():
+            latency[_command(cid)] = {'buckets': h.cumulative(),
+                                      'sum': h.sum, 'count': h.count}
+        statuses = {}
+        for (direction, cid, status), n in numbers['statuses'].items():
+            statuses[(direction, _command(cid), _status(status))] = n
+        return {
+            'pdus_in': _named(numbers['pdus_in']),
+            'pdus_out': _named(numbers['pdus_out']),
+            'bytes_in': numbers['bytes_in'],
+            'bytes_out': numbers['bytes_out'],
+            'command_status': statuses,
+            'errors': numbers['errors'],
+            'in_flight': self.in_flight(),
+            'latency': latency,
+        }
+
+    def render(self, prefix='smpp'):
+        """render(self, prefix='smpp') -> Prometheus text format"""
+        return render([self], prefix)
+
+
+def _command(cid):
+    return command_name(cid) or '0x%08x' % cid
+
+def _status(status):
+    return status_name(status) or '0x%08x' % status
+
+def _named(counts):
+    named = {}
+    for cid, n in counts.items():
+        named[_command(cid)] = n
+    return named
+
+def _labels(labels, extra=()):
+    items = sorted(labels.items()) + list(extra)
+    if not items:
+        return ''
+    return '{%s}' % ','.join(['%s="%s"' % (k, _escape(v)) for k, v in items])
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)           # no L of longs
+
+def render(metrics, prefix='smpp'):
+    """render(metrics, prefix='smpp') -> Prometheus text format
+    The samples of several Metrics (told apart by their labels)."""
+    families = [
+        ('pdus_total', 'counter', 'PDUs by direction and command.'),
+        ('bytes_total', 'counter', 'PDU octets by direction.'),
+        ('command_status_total', 'counter',
+         'Responses with an error command_status.'),
+        ('errors_total', 'counter', 'Errors (timeouts, lost connections, ...).'),
+        ('in_flight', 'gauge', 'Requests waiting for a response.'),
+        ('response_seconds', 'histogram', 'Time from request to response.'),
+    ]
+    samples = {}
+    for name, kind, doc in families:
+        samples[name] = []
+    for m in metrics:
+        labels = m.labels
+        numbers = m._copy()
+        for direction in ('in', 'out'):
+            counts = numbers['pdus_' + direction]
+            for cid, n in sorted(counts.items()):
+                samples['pdus_total'].append((_labels(labels,
+                    [('direction', direction), ('command', _command(cid))]), n))
+        samples['bytes_total'].append((_labels(labels, [('direction', 'in')]),
+                                       numbers['bytes_in']))
+        samples['bytes_total'].append((_labels(labels, [('direction', 'out')]),
+                                       numbers['bytes_out']))
+        for (direction, cid, status), n in sorted(numbers['statuses'].items()):
+            samples['command_status_total'].append((_labels(labels,
+                [('direction', direction), ('command', _command(cid)),
+                 ('status', _status(status))]), n))
+        samples['errors_total'].append((_labels(labels), numbers['errors']))
+        samples['in_flight'].append((_labels(labels), m.in_flight()))
+        for cid, h in sorted(numbers['latency'].items()):
+            command = [('command', _command(cid))]
+            for le, n in h.cumulative():
+                samples['response_seconds'].append(('_bucket' +
+                    _labels(labels, command + [('le', _number(le))]), n))
+            samples['response_seconds'].append(('_sum' + _labels(labels, command),
+                                                h.sum))
+            samples['response_seconds'].append(('_count' + _labels(labels, command),
+                                                h.count))
+    lines = []
+    for name, kind, doc in families:
+        full = '%s_%s' % (prefix, name)
+        lines.append('# HELP %s %s' % (full, doc))
+        lines.append('# TYPE %s %s' % (full, kind))
+        for suffix, value in samples[name]:
+            lines.append('%s%s %s' % (full, suffix, _number(value)))
+    lines.append('')
+    return '\n'.join(lines)
@@ -0,0 +1,403 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""Sending from several processes, to use more than one core.
+
+Example:
+    sender = multiproc.ProcessSender('127.1', 10000, 'user', 'pass',
+                                     workers=4, binds=2)
+    sender.start()
+    for sms in messages:
+        sender.submit(sms)
+        for tag, status, message_id in sender.results():
+            ...
+    sender.close()                      # waits for the last responses
+    for tag, status, message_id in sender.results():
+        ...
+
+Each worker process has its own binds (binds SMPP sessions, made with
+session_factory and session_args) and reads submit_sm bodies from a
+Ring, a buffer in shared memory, one for each worker. The parent encodes
+the messages (or is given encoded bodies) and puts them in the rings in
+turn, or by shard(sms) when that is given. The workers send them with
+submit_sm_async() on their least loaded session and put the results in
+a second ring going back: (tag, command_status, message_id), where tag
+is what submit() returned and the status is ERROR for a request that
+got no response (timeout, lost connection). Results must be read with
+results(): a worker waits when its result ring is full.
+
+A Ring has one writer and one reader. The writer wakes up a waiting
+reader through a pipe, so the reader can select() on it along with its
+sockets.
+"""
+import os, mmap, ctypes, struct, select, time, errno, socket, itertools
+import pdu
+from pdu import COMMAND_ID
+from smpp import SMPP, SMPPError
+
+ERROR = 0xFFFFFFFF          # status of a submit that got no response
+STOP = 0xFFFFFFFFFFFFFFFF   # tag telling a worker to finish
+
+_length = struct.Struct('>I')
+_tag = struct.Struct('>Q')
+_result = struct.Struct('>QI')
+_SKIP = 0xFFFFFFFF          # record length: the rest of the buffer is unused
+
+class Ring(object):
+    """A buffer in shared memory of length prefixed records.
+    Create it before forking; one process writes, one reads."""
+    def __init__(self, size=4 * 1024 * 1024):
+        self.size = size
+        self.map = mmap.mmap(-1, 16 + size)
+        # monotonic byte counters, written by one side each
+        self.__head = ctypes.c_uint64.from_buffer(self.map, 0)
+        self.__tail = ctypes.c_uint64.from_buffer(self.map, 8)
+        self.rfd, self.wfd = os.pipe()
+
+    def fileno(self):
+        """Readable when a record was put in an empty ring."""
+        return self.rfd
+
+    def empty(self):
+        return self.__head.value == self.__tail.value
+
+    def put_many(self, records):
+        """Puts as many of records as there's room for, returns how many.
+        A record may be at most half of the ring's size."""
+        head = start = self.__head.value
+        tail = self.__tail.value
+        size = self.size
+        m = self.map
+        n = 0
+        for data in records:
+            need = 4 + len(data)
+            if need > size / 2:
+                raise ValueError("Record too big for the ring")
+            pos = head % size
+            skip = 0
+            if pos + need > size:
+                skip = size - pos
+            if head + skip + need - tail > size:
+                tail = self.__tail.value
+                if head + skip + need - tail > size:
+                    break
+            if skip:
+                if skip >= 4:
+                    _length.pack_into(m, 16 + pos, _SKIP)
+                head += skip
+                pos = 0
+            _length.pack_into(m, 16 + pos, len(data))
+            m[16 + pos + 4:16 + pos + need] = data
+            head += need
+            n += 1
+        if n:
+            self.__head.value = head
+            # the reader may have emptied the ring and gone to sleep
+            # before it saw the new head: wake it up
+            if self.__tail.value == start:
+                self.__ring()
+        return n
+
+    def put(self, data):
+        return self.put_many([data]) == 1
+
+    def get_many(self, count=None):
+        """Takes up to count records (all there are by default)."""
+        self.__drainPipe()
+        head = self.__head.value
+        tail = self.__tail.value
+        size = self.size
+        m = self.map
+        out = []
+        while tail < head and (count is None or len(out) < count):
+            pos = tail % size
+            if pos + 4 > size:
+                tail += size - pos
+                continue
+            (length,) = _length.unpack_from(m, 16 + pos)
+            if length == _SKIP:
+                tail += size - pos
+                continue
+            out.append(m[16 + pos + 4:16 + pos + 4 + length])
+            tail += 4 + length
+        self.__tail.value = tail
+        return out
+
+    def wait(self, timeout=None, others=()):
+        """Waits until the ring has records or one of others is readable.
+        Returns the readable ones of others."""
+        if not self.empty():
+            return []
+        r, w, x = _select([self] + list(others), timeout)
+        return [o for o in r if o is not self]
+
+    def __ring(self):
+        try:
+            os.write(self.wfd, 'x')
+        except OSError, e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def __drainPipe(self):
+        r, w, x = _select([self.rfd], 0)
+        if r:
+            os.read(self.rfd, 4096)
+
+    def nonblocking(self):
+        import fcntl
+        for fd in (self.rfd, self.wfd):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+
+def _select(fds, timeout):
+    while True:
+        try:
+            return select.select(fds, [], [], timeout)
+        except select.error, e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+
+class _Worker(object):
+    """What runs in a worker process."""
+    def __init__(self, sender, inbox, outbox):
+        self.sender = sender
+        self.inbox = inbox
+        self.outbox = outbox
+        self.sessions = []
+        self.stopping = False
+        self.results = []
+
+    def open(self):
+        sender = self.sender
+        while len(self.sessions) < sender.binds:
+            s = sender.session_factory(**sender.session_args)
+            try:
+                s.connect(sender.addr, sender.port)
+                getattr(s, sender.bind)(sender.user, sender.pasw)
+            except (socket.error, RuntimeError, SMPPError, pdu.PDUError):
+                s.abort()
+                time.sleep(1)
+                continue
+            self.sessions.append(s)
+
+    def run(self):
+        self.open()
+        try:
+            while not (self.stopping and self.__idle()):
+                # PDUs read already don't make the sockets readable
+                buffered = [s for s in self.sessions if s.pending_input()]
+                if buffered:
+                    ready = buffered
+                else:
+                    ready = self.inbox.wait(0.5, self.sessions)
+                for s in ready:
+                    self.__process(s, 0)
+                for record in self.inbox.get_many(1000):
+                    (tag,) = _tag.unpack_from(record)
+                    if tag == STOP:
+                        self.stopping = True
+                        continue
+                    self.__submit(tag, record[8:])
+                for s in self.sessions[:]:
+                    self.__process(s, 0)
+                self.__flush()
+            for s in self.sessions:
+                try:
+                    s.close()
+                except (socket.error, RuntimeError, SMPPError, pdu.PDUError):
+                    pass
+        finally:
+            self.__flush(True)
+
+    def __idle(self):
+        return self.inbox.empty() and \
+               not [s for s in self.sessions if s.pending()]
+
+    def __submit(self, tag, body):
+        p = pdu.PDU()
+        p.command_id = COMMAND_ID['submit_sm']
+        p.body = body
+        while True:
+            if not self.sessions:
+                self.open()
+            s = min(self.sessions, key=lambda s: s.pending())
+            try:
+                s.submit_sm_async(p, self.__callback(tag))
+                return
+            except (socket.error, RuntimeError, SMPPError, pdu.PDUError), e:
+                self.__fail(s, e)
+
+    def __callback(self, tag):
+        def done(req):
+            if req.resp is None:
+                self.results.append(_result.pack(tag, ERROR))
+            else:
+                self.results.append(_result.pack(tag, req.resp.command_status)
+                                    + (req.message_id or ''))
+        return done
+
+    def __process(self, s, timeout):
+        # SMPPError: the keepalive found the link dead
+        try:
+            s.process(timeout)
+            while s.pending_input():
+                s.process(0)
+        except (socket.error, RuntimeError, SMPPError, pdu.PDUError), e:
+            self.__fail(s, e)
+
+    def __fail(self, s, error):
+        if s in self.sessions:
+            self.sessions.remove(s)
+        s.abort(SMPPError("Session failed: %s" % error))
+
+    def __flush(self, wait=False):
+        """Hands the results to the parent, waiting for room only if it
+        must (or wait)."""
+        results = self.results
+        while results:
+            n = self.outbox.put_many(results)
+            del results[:n]
+            if results and (wait or len(results) > 10000):
+                time.sleep(0.001)
+            else:
+                break
+
+
+class ProcessSender(object):
+    def __init__(self, addr, port, user, pasw, workers=None, binds=1,
+                 bind='bind_transmitter', ring_size=4 * 1024 * 1024,
+                 shard=None, session_factory=SMPP, **session_args):
+        """workers defaults to the number of CPUs; shard(sms) -> int
+        picks the worker of an SMS (say by destination), by default
+        they take turns."""
+        import multiprocessing
+        self.multiprocessing = multiprocessing
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.addr = addr
+        self.port = port
+        self.user = user
+        self.pasw = pasw
+        self.workers = workers
+        self.binds = binds
+        self.bind = bind
+        self.ring_size = ring_size
+        self.shard = shard
+        self.session_factory = session_factory
+        self.session_args = session_args
+        self.processes = []
+        self.inboxes = []
+        self.outboxes = []
+        self.outstanding = 0
+        self.__tags = itertools.count(1)
+        self.__turn = itertools.cycle(range(workers))
+        self.__queued = [[] for i in range(workers)]
+        self.__read = []                # results read by close()
+
+    def start(self):
+        for i in range(self.workers):
+            inbox, outbox = Ring(self.ring_size), Ring(self.ring_size)
+            inbox.nonblocking()
+            outbox.nonblocking()
+            p = self.multiprocessing.Process(target=self.__run,
+                args=(inbox, outbox), name="SMPP sender %d" % i)
+            p.daemon = True
+            p.start()
+            self.processes.append(p)
+            self.inboxes.append(inbox)
+            self.outboxes.append(outbox)
+
+    def __run(self, inbox, outbox):
+        _Worker(self, inbox, outbox).run()
+
+    def submit(self, sms, flush=True):
+        """submit(sms, flush=True) -> tag
+        sms is an SMS (any PDU) or an encoded submit_sm body. With
+        flush=False it is only queued here until the next flush(), so
+        a batch is put in the rings at once."""
+        if self.shard is not None:
+            worker = self.shard(sms) % self.workers
+        else:
+            worker = self.__turn.next()
+        if not isinstance(sms, str):
+            str(sms)
+            sms = sms.body
+        tag = self.__tags.next()
+        self.__queued[worker].append(_tag.pack(tag) + sms)
+        self.outstanding += 1
+        if flush:
+            self.flush()
+        return tag
+
+    def submit_many(self, messages):
+        """submit_many(messages) -> list of tags"""
+        tags = [self.submit(sms, False) for sms in messages]
+        self.flush()
+        return tags
+
+    def flush(self):
+        """Puts the queued messages in the rings, waiting (and reading
+        results meanwhile) while they are full."""
+        for i, queued in enumerate(self.__queued):
+            while queued:
+                n = self.inboxes[i].put_many(queued)
+                del queued[:n]
+                if queued:
+                    self.__check(i)
+                    time.sleep(0.001)
+
+    def __check(self, i):
+        if not self.processes[i].is_alive():
+            raise SMPPError("Sender process %d died" % i)
+
+    def results(self, timeout=0):
+        """results(timeout=0) -> list of (tag, command_status, message_id)
+        Waits up to timeout for the first ones (None waits for ever)."""
+        out = self.__read
+        self.__read = []
+        for ring in self.outboxes:
+            out.extend(ring.get_many())
+        if not out and self.outstanding and timeout != 0:
+            _select(self.outboxes, timeout)
+            for ring in self.outboxes:
+                out.extend(ring.get_many())
+        result = []
+        for record in out:
+            tag, status = _result.unpack_from(record)
+            result.append((tag, status, record[_result.size:]))
+        self.outstanding -= len(result)
+        return result
+
+    def close(self, timeout=None):
+        """Sends what is queued, waits for the responses and stops the
+        workers. The results can still be read after."""
+        self.flush()
+        for ring in self.inboxes:
+            while not ring.put(_tag.pack(STOP)):
+                time.sleep(0.001)
+        if timeout is not None:
+            end = time.time() + timeout
+        for p in self.processes:
+            # a worker can't finish while its results don't fit
+            while p.is_alive():
+                for ring in self.outboxes:
+                    self.__read.extend(ring.get_many())
+                if timeout is not None and time.time() >= end:
+                    return
+                p.join(0.01)
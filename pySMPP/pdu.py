@@ -22,6 +22,109 @@
 
 import struct
 
+# largest PDU accepted from the wire, long deliver_sm/data_sm with
+# optional parameters easily go past 254 octets
+MAX_PDU_LENGTH = 0x10000
+
+_header = struct.Struct('>IIII')
+
+COMMAND_ID = {
+    'generic_nack' :        0x80000000,
+    'bind_receiver' :       0x00000001,
+    'bind_receiver_resp' :  0x80000001,
+    'bind_transmitter' :    0x00000002,
+    'bind_transmitter_resp':0x80000002,
+    'query_sm' :            0x00000003,
+    'query_sm_resp' :       0x80000003,
+    'submit_sm' :           0x00000004,
+    'submit_sm_resp' :      0x80000004,
+    'deliver_sm' :          0x00000005,
+    'deliver_sm_resp' :     0x80000005,
+    'unbind' :              0x00000006,
+    'unbind_resp' :         0x80000006,
+    'replace_sm' :          0x00000007,
+    'replace_sm_resp' :     0x80000007,
+    'cancel_sm' :           0x00000008,
+    'cancel_sm_resp' :      0x80000008,
+    'bind_tranceiver' :     0x00000009,
+    'bind_tranceiver_resp': 0x80000009,
+    'outbind' :             0x0000000B,
+    'submit_multi' :        0x00000021,
+    'submit_multi_resp' :   0x80000021,
+    'alert_notification' :  0x00000102,
+    'data_sm' :             0x00000103,
+    'data_sm_resp' :        0x80000103,
+    'enquire_link' :        0x00000015,
+    'enquire_link_resp' :   0x80000015,
+}
+
+COMMAND_STATUS = {
+    'ESME_ROK' :            0x00000000,
+    'ESME_RINVMSGLEN' :     0x00000001,
+    'ESME_RINVCMDLEN' :     0x00000002,
+    'ESME_RINVCMDID' :      0x00000003,
+    'ESME_RINVBNDSTS' :     0x00000004,
+    'ESME_RALYBND' :        0x00000005,
+    'ESME_RINVPRTFLG' :     0x00000006,
+    'ESME_RINVREGDLVFLG' :  0x00000007,
+    'ESME_RSYSERR' :        0x00000008,
+    'ESME_RINVSRCADR' :     0x0000000A,
+    'ESME_RINVDSTADR' :     0x0000000B,
+    'ESME_RINVMSGID' :      0x0000000C,
+    'ESME_RBINDFAIL' :      0x0000000D,
+    'ESME_RINVPASWD' :      0x0000000E,
+    'ESME_RINVSYSID' :      0x0000000F,
+    'ESME_RCANCELFAIL' :    0x00000011,
+    'ESME_RREPLACEFAIL' :   0x00000013,
+    'ESME_RMSGQFUL' :       0x00000014,
+    'ESME_RINVSERTYP' :     0x00000015,
+    'ESME_RINVNUMDESTS' :   0x00000033,
+    'ESME_RINVDLNAME' :     0x00000034,
+    'ESME_RINVDESTFLAG' :   0x00000040,
+    'ESME_RINVSUBREP' :     0x00000042,
+    'ESME_RINVESMCLASS' :   0x00000043,
+    'ESME_RCNTSUBDL' :      0x00000044,
+    'ESME_RSUBMITFAIL' :    0x00000045,
+    'ESME_RINVSRCTON' :     0x00000048,
+    'ESME_RINVSRCNPI' :     0x00000049,
+    'ESME_RINVDSTTON' :     0x00000050,
+    'ESME_RINVDSTNPI' :     0x00000051,
+    'ESME_RINVSYSTYP' :     0x00000053,
+    'ESME_RINVREPFLAG' :    0x00000054,
+    'ESME_RINVNUMMSGS' :    0x00000055,
+    'ESME_RTHROTTLED' :     0x00000058,
+    'ESME_RINVSCHED' :      0x00000061,
+    'ESME_RINVEXPIRY' :     0x00000062,
+    'ESME_RINVDFTMSGID' :   0x00000063,
+    'ESME_RX_T_APPN' :      0x00000064,
+    'ESME_RX_P_APPN' :      0x00000065,
+    'ESME_RX_R_APPN' :      0x00000066,
+    'ESME_RQUERYFAIL' :     0x00000067,
+    'ESME_RINVOPTPARSTREAM':0x000000C0,
+    'ESME_ROPTPARNOTALLWD': 0x000000C1,
+    'ESME_RINVPARLEN' :     0x000000C2,
+    'ESME_RMISSINGOPTPARAM':0x000000C3,
+    'ESME_RINVOPTPARAMVAL': 0x000000C4,
+    'ESME_RDELIVERYFAILURE':0x000000FE,
+    'ESME_RUNKNOWNERR' :    0x000000FF,
+}
+
+_status_names = {}
+for _name, _status in COMMAND_STATUS.items():
+    _status_names[_status] = _name
+
+def status_name(status):
+    """Name of a command_status, None if unknown."""
+    return _status_names.get(status)
+
+_command_names = {}
+for _name, _cid in COMMAND_ID.items():
+    _command_names[_cid] = _name
+
+def command_name(command_id):
+    """Name of a command_id, None if unknown."""
+    return _command_names.get(command_id)
+
 class PDUError(Exception):
     def __init__(self, value):
         self.value = value
@@ -29,19 +132,39 @@ class PDUError(Exception):
         return `self.value`
 
 class PDU(object):
+    __slots__ = ('command_length', 'command_id', 'command_status',
+                 'sequence_number', 'body')
+
     def __init__(self, s='\0\0\0\x10\0\0\0\0\0\0\0\0\0\0\0\0'):
         self.decompile(s)
 
+    def __getstate__(self):
+        # slotted, and subclasses may have a __dict__ too
+        state = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def decompile(self, s):
         if len(s) < 16:
             raise PDUError("Illegal PDU (length too short)")
         ( self.command_length,
           self.command_id,
           self.command_status,
-          self.sequence_number )  =  struct.unpack('>iiii',s[0:16])
-        l = len(s[16:])
-        if l > 0:
-            self.body = struct.unpack(`l`+'s',s[16:])[0]
+          self.sequence_number )  =  _header.unpack_from(s)
+        if len(s) > 16:
+            if isinstance(s, str):
+                self.body = s[16:]
+            else:
+                # a memoryview from the framer: the only copy made
+                self.body = s[16:].tobytes()
         else:
             self.body = None
         return
@@ -57,6 +180,10 @@ class PDU(object):
         p.body=body
         return p
 
+    def fields(self):
+        """fields(self) -> codec.Fields\nDecodes the body."""
+        return codec.decode(self.command_id, self.body)
+
        
     def getcmdlen(self):
         if self.body:
@@ -67,13 +194,12 @@ class PDU(object):
         return self.command_length
         
     def __str__(self):
-        self.getcmdlen()
         b = self.body
         if not b:
             b = ''
-        l = len(b)
-        return struct.pack('>iiii'+`l`+'s',self.command_length, self.command_id,
-            self.command_status, self.sequence_number, b)
+        self.command_length = len(b) + 16
+        return _header.pack(self.command_length, self.command_id,
+            self.command_status, self.sequence_number) + b
 
     def dump(self):
         self.getcmdlen()
@@ -94,37 +220,32 @@ class BIND(PDU):
         self.addr_ton = 0
         self.addr_npi = 0
         self.addr_range = ''
-        str(self)
 
     def __str__(self):
-        l = len(self.user)
-        s = struct.pack(`l`+'s',self.user) + '\0'
-        l = len(self.pasw)
-        s += struct.pack(`l`+'s',self.pasw) + '\0'
-        l = len(self.system_type)
-        s += struct.pack(`l`+'s', self.system_type) + '\0'
-        s += struct.pack('B', self.smpp_version)
-        s += struct.pack('B', self.addr_ton)
-        s += struct.pack('B', self.addr_npi)
-        l = len(self.addr_range)
-        s += struct.pack(`l`+'s', self.addr_range) + '\0'
-        self.body = s
+        self.body = codec.encode('bind_transmitter', {
+            'system_id': self.user,
+            'password': self.pasw,
+            'system_type': self.system_type,
+            'interface_version': self.smpp_version,
+            'addr_ton': self.addr_ton,
+            'addr_npi': self.addr_npi,
+            'address_range': self.addr_range})
         return PDU.__str__(self)
 
 class BIND_RX(BIND):
     def __init__(self,user,password):
         BIND.__init__(self,user,password)
-        self.command_id = 0x00000001
+        self.command_id = COMMAND_ID['bind_receiver']
 
 class BIND_TX(BIND):
     def __init__(self,user,password):
         BIND.__init__(self,user,password)
-        self.command_id = 0x00000002
+        self.command_id = COMMAND_ID['bind_transmitter']
 
 class BIND_TRX(BIND):
     def __init__(self,user,password):
         BIND.__init__(self,user,password)
-        self.command_id = 0x00000009
+        self.command_id = COMMAND_ID['bind_tranceiver']
 
 ### Helpers #####
 
@@ -135,4 +256,7 @@ def c_octet_string(str):
 def short(i):
     return struct.pack('B',i)
 
+# codec needs COMMAND_ID and PDUError from this module
+import codec
+
 ### END OF FILE #####
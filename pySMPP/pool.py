@@ -0,0 +1,255 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""This module provides the class SessionPool, several binds to the same
+SMSC used as one.
+
+Example:
+    from pySMPP import pool
+    p = pool.SessionPool('127.1', 10000, 'user', 'pass', size=4)
+    p.start()
+    req = p.submit_sm(sms)
+    print req.result()
+    p.close()
+
+Every submit goes to the healthy session with the fewest unanswered
+requests. Each session has a thread reading its responses; a session
+that fails is dropped and rebound in the background. The callbacks of
+the submits (given to submit_sm or added later with add_callback) run
+once the reader threads have let go of the session, so a callback may
+submit through the pool again.
+"""
+import time, select, socket, threading, collections
+import pdu
+from smpp import SMPP, SMPPError
+
+class _Member(object):
+    """One session of the pool, with the thread reading its socket."""
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        self.session = None
+        self.healthy = False
+        self.lock = threading.Lock()        # held for any socket work
+        self.cv = threading.Condition()     # notified after each read
+        self.thread = None
+        self.callbacks = collections.deque()    # (callback, req) to run
+
+    def open(self):
+        pool = self.pool
+        s = pool.session_factory(**pool.session_args)
+        s.connect(pool.addr, pool.port)
+        try:
+            getattr(s, pool.bind)(pool.user, pool.pasw)
+        except:
+            s.abort()
+            raise
+        self.session = s
+        self.healthy = True
+
+    def fail(self, error):
+        self.healthy = False
+        if self.session is not None:
+            self.session.abort(SMPPError("Session failed: %s" % error))
+        self.cv.acquire()
+        self.cv.notifyAll()
+        self.cv.release()
+
+    def load(self):
+        return self.session.pending()
+
+    def submit_sm(self, sms, callback, timeout):
+        if callback is not None:
+            callback = self.__defer(callback)
+        self.lock.acquire()
+        try:
+            try:
+                req = self.session.submit_sm_async(sms, callback, timeout)
+            except (socket.error, RuntimeError, pdu.PDUError), e:
+                self.fail(e)
+                raise SMPPError("Session failed: %s" % e)
+        finally:
+            self.lock.release()
+            self.run_callbacks()
+        # Pending.result() must not read the socket behind the reader's
+        # back, it waits for the reader instead (see process)
+        req.session = self
+        req.add_callback = self.__deferring(req.add_callback)
+        return req
+
+    def __defer(self, callback):
+        # called with the lock held (by whoever read the response): the
+        # callback runs after it is released, see run_callbacks
+        def deferred(req):
+            self.callbacks.append((callback, req))
+        return deferred
+
+    def __deferring(self, add_callback):
+        # Pending.add_callback of a request of ours
+        def deferring_add_callback(callback):
+            add_callback(self.__defer(callback))
+            # done already, no reader will get to it
+            self.run_callbacks()
+        return deferring_add_callback
+
+    def run_callbacks(self):
+        """Runs the callbacks of the requests that are done."""
+        callbacks = self.callbacks
+        while callbacks:
+            try:
+                callback, req = callbacks.popleft()
+            except IndexError:
+                break           # another thread took the last one
+            callback(req)
+
+    def process(self, timeout=None):
+        """Waits until the reader thread has handled some input."""
+        self.cv.acquire()
+        try:
+            self.cv.wait(timeout)
+        finally:
+            self.cv.release()
+
+    def run(self):
+        while self.pool.running:
+            if not self.healthy:
+                time.sleep(0.1)
+                continue
+            s = self.session
+            if s.pending():
+                wait = 0.05
+            else:
+                wait = 0.5
+            try:
+                # what was read already doesn't make the socket readable
+                if not s.pending_input():
+                    select.select([s], [], [], wait)
+                self.lock.acquire()
+                try:
+                    if self.healthy:
+                        s.process(0)
+                        while s.pending_input():
+                            s.process(0)
+                finally:
+                    self.lock.release()
+            except (socket.error, select.error, RuntimeError, SMPPError,
+                    pdu.PDUError), e:
+                if self.session is s:
+                    self.fail(e)
+            self.run_callbacks()
+            self.cv.acquire()
+            self.cv.notifyAll()
+            self.cv.release()
+
+
+class SessionPool(object):
+    def __init__(self, addr, port, user, pasw, size=2, bind='bind_transmitter',
+                 rebind_interval=5, session_factory=SMPP, **session_args):
+        """bind is the name of the SMPP method used to bind each session,
+        session_factory makes the sessions (an SMPP subclass, say) and is
+        called with session_args, e.g. window_size and response_timeout."""
+        self.addr = addr
+        self.port = port
+        self.user = user
+        self.pasw = pasw
+        self.bind = bind
+        self.rebind_interval = rebind_interval
+        self.session_factory = session_factory
+        self.session_args = session_args
+        self.members = [_Member(self, i) for i in range(size)]
+        self.running = False
+        self.__rebinder = None
+        self.__stop = threading.Event()
+
+    def start(self):
+        """Binds all the sessions; the ones that fail are retried in the
+        background. Raises SMPPError if none could be bound."""
+        self.running = True
+        self.__stop.clear()
+        errors = []
+        for m in self.members:
+            try:
+                m.open()
+            except (socket.error, RuntimeError, SMPPError, pdu.PDUError), e:
+                errors.append(e)
+            m.thread = threading.Thread(target=m.run,
+                name="SMPP session %d" % m.index)
+            m.thread.setDaemon(True)
+            m.thread.start()
+        self.__rebinder = threading.Thread(target=self.__rebind,
+            name="SMPP rebinder")
+        self.__rebinder.setDaemon(True)
+        self.__rebinder.start()
+        if len(errors) == len(self.members):
+            self.close()
+            raise SMPPError("No session could bind: %s" % errors[0])
+
+    def healthy(self):
+        """Number of sessions currently bound."""
+        return len([m for m in self.members if m.healthy])
+
+    def submit_sm(self, sms, callback=None, timeout=None):
+        """submit_sm(self, sms, callback=None, timeout=None) -> Pending
+        Submits through the least loaded healthy session."""
+        while True:
+            best = None
+            for m in self.members:
+                if m.healthy and (best is None or m.load() < best.load()):
+                    best = m
+            if best is None:
+                raise SMPPError("No bound session in the pool")
+            try:
+                return best.submit_sm(sms, callback, timeout)
+            except SMPPError:
+                if best.healthy:
+                    raise
+                # the session broke before sending, try the next one
+
+    def __rebind(self):
+        while not self.__stop.isSet():
+            self.__stop.wait(self.rebind_interval)
+            for m in self.members:
+                if m.healthy or self.__stop.isSet():
+                    continue
+                m.lock.acquire()
+                try:
+                    if self.__stop.isSet():
+                        break
+                    try:
+                        m.open()
+                    except (socket.error, RuntimeError, SMPPError, pdu.PDUError):
+                        pass
+                finally:
+                    m.lock.release()
+
+    def close(self):
+        """Unbinds and closes all the sessions."""
+        self.running = False
+        self.__stop.set()
+        if self.__rebinder is not None and \
+           self.__rebinder is not threading.currentThread():
+            self.__rebinder.join()
+        for m in self.members:
+            if m.thread is not None:
+                m.thread.join()
+            if m.healthy:
+                m.healthy = False
+                try:
+                    m.session.close()
+                except (socket.error, RuntimeError, SMPPError, pdu.PDUError), e:
+                    m.session.abort(SMPPError(str(e)))
+            m.run_callbacks()
@@ -0,0 +1,345 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""A loop running many AsyncSMPP sessions in one thread.
+
+Example:
+    from pySMPP import reactor, asyncsmpp
+    r = reactor.Reactor()
+    for account in accounts:
+        sm = asyncsmpp.AsyncSMPP(map=r.map, response_timeout=30)
+        sm.connect(account.host, account.port)
+        r.add(sm, keepalive=60)
+        sm.bind_transmitter(account.user, account.pasw)
+    r.call_later(1, send_more)
+    r.run()
+
+The sockets are watched with epoll where there is one (Linux), poll or
+select otherwise, and stay registered for as long as the session is
+open: each pass of the loop only looks at the sessions that have
+something to do. What the sessions send goes into their output buffer;
+at the end of a pass every session with output is written once, and
+only the ones left with output are watched for writing.
+
+Timers (call_at, call_later) are kept in a heap. The sessions time out
+their requests with one timer each (for the oldest deadline), and with
+keepalive an enquire_link is sent by a timer when the session has been
+silent that long; a session that doesn't answer it is closed.
+"""
+import select, socket, time, heapq, itertools, errno, asyncore
+from smpp import BOUND, STATE
+
+_IN = select.POLLIN | select.POLLPRI
+_OUT = select.POLLOUT
+
+class _EpollPoller(object):
+    def __init__(self):
+        self.ep = select.epoll()
+
+    def register(self, fd, events):
+        self.ep.register(fd, events)
+
+    def modify(self, fd, events):
+        self.ep.modify(fd, events)
+
+    def unregister(self, fd):
+        try:
+            self.ep.unregister(fd)
+        except (IOError, OSError, ValueError):
+            pass            # closed already, epoll forgot it
+
+    def poll(self, timeout):
+        if timeout is None:
+            timeout = -1
+        return self.ep.poll(timeout)
+
+class _PollPoller(object):
+    def __init__(self):
+        self.p = select.poll()
+
+    def register(self, fd, events):
+        self.p.register(fd, events)
+
+    def modify(self, fd, events):
+        self.p.modify(fd, events)
+
+    def unregister(self, fd):
+        try:
+            self.p.unregister(fd)
+        except KeyError:
+            pass
+
+    def poll(self, timeout):
+        if timeout is not None:
+            timeout = int(timeout * 1000)
+        return self.p.poll(timeout)
+
+class _SelectPoller(object):
+    def __init__(self):
+        self.fds = {}
+
+    def register(self, fd, events):
+        self.fds[fd] = events
+
+    modify = register
+
+    def unregister(self, fd):
+        self.fds.pop(fd, None)
+
+    def poll(self, timeout):
+        r = [fd for fd, ev in self.fds.items() if ev & _IN]
+        w = [fd for fd, ev in self.fds.items() if ev & _OUT]
+        r, w, x = select.select(r, w, [], timeout)
+        events = {}
+        for fd in r:
+            events[fd] = select.POLLIN
+        for fd in w:
+            events[fd] = events.get(fd, 0) | select.POLLOUT
+        return events.items()
+
+def _poller():
+    if hasattr(select, 'epoll'):
+        return _EpollPoller()
+    if hasattr(select, 'poll'):
+        return _PollPoller()
+    return _SelectPoller()
+
+
+class Timer(object):
+    """A call scheduled by Reactor.call_at()."""
+    __slots__ = ('when', 'func', 'args', 'cancelled')
+
+    def __init__(self, when, func, args):
+        self.when = when
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _Channel(object):
+    """A session registered with the reactor."""
+    def __init__(self, session, fd, keepalive):
+        self.session = session
+        self.fd = fd
+        self.events = 0
+        self.keepalive = keepalive
+        self.last_io = time.time()
+        self.timer = None
+        self.enquiring = False
+
+
+class Reactor(object):
+    def __init__(self):
+        self.map = {}       # give it to the AsyncSMPP sessions
+        self.running = False
+        self.__poller = _poller()
+        self.__channels = {}            # fd -> _Channel
+        self.__dirty = {}               # fd -> _Channel with output
+        self.__timers = []              # heap of (when, n, Timer)
+        self.__cancelled = 0
+        self.__tick = itertools.count()
+
+    def __len__(self):
+        return len(self.__channels)
+
+    # timers
+
+    def call_at(self, when, func, *args):
+        """Calls func(*args) at time when; returns a Timer."""
+        timer = Timer(when, func, args)
+        heapq.heappush(self.__timers, (when, self.__tick.next(), timer))
+        return timer
+
+    def call_later(self, delay, func, *args):
+        return self.call_at(time.time() + delay, func, *args)
+
+    def cancel(self, timer):
+        if not timer.cancelled:
+            timer.cancel()
+            self.__cancelled += 1
+            # don't let a heap of dead timers build up
+            if self.__cancelled > 64 and self.__cancelled > len(self.__timers) / 2:
+                self.__timers = [t for t in self.__timers if not t[2].cancelled]
+                heapq.heapify(self.__timers)
+                self.__cancelled = 0
+
+    def __runTimers(self):
+        timers = self.__timers
+        now = time.time()
+        while timers and timers[0][0] <= now:
+            when, n, timer = heapq.heappop(timers)
+            if timer.cancelled:
+                self.__cancelled -= 1
+                continue
+            timer.cancelled = True      # it's done, cancel() is a no-op
+            timer.func(*timer.args)
+
+    def __nextTimer(self):
+        timers = self.__timers
+        while timers and timers[0][2].cancelled:
+            heapq.heappop(timers)
+            self.__cancelled -= 1
+        if not timers:
+            return None
+        return max(timers[0][0] - time.time(), 0)
+
+    # sessions
+
+    def add(self, session, keepalive=None):
+        """Runs session (an AsyncSMPP, already connecting) in this loop.
+        keepalive is the seconds of silence after which it sends an
+        enquire_link."""
+        fd = session.fileno()
+        ch = _Channel(session, fd, keepalive)
+        self.__channels[fd] = ch
+        session.reactor = self
+        ch.events = _IN
+        if session.writable():
+            ch.events |= _OUT
+        self.__poller.register(fd, ch.events)
+        if keepalive:
+            ch.timer = self.call_later(keepalive, self.__keepalive, ch)
+        session.expire()            # sets the timer of requests made already
+
+    def remove(self, session):
+        """Stops running session (it is not closed)."""
+        ch = self.__channels.get(session._fileno)
+        if ch is not None and ch.session is session:
+            self.__forget(ch)
+            return
+        for fd, ch in self.__channels.items():
+            if ch.session is session:
+                self.__forget(ch)
+
+    def __forget(self, ch):
+        del self.__channels[ch.fd]
+        self.__dirty.pop(ch.fd, None)
+        self.__poller.unregister(ch.fd)
+        if ch.timer is not None:
+            self.cancel(ch.timer)
+        ch.session.reactor = None
+
+    def output(self, session):
+        """Called by a session that has something to send."""
+        fd = session._fileno
+        ch = self.__channels.get(fd)
+        if ch is not None:
+            self.__dirty[fd] = ch
+
+    def __keepalive(self, ch):
+        ch.timer = None
+        if ch.fd not in self.__channels:
+            return
+        session = ch.session
+        idle = time.time() - ch.last_io
+        if idle >= ch.keepalive and not ch.enquiring and \
+           session.state in BOUND:
+            ch.enquiring = True
+            session.enquire_link(lambda req: self.__keptAlive(ch, req),
+                                 ch.keepalive)
+            idle = 0
+        ch.timer = self.call_later(ch.keepalive - idle, self.__keepalive, ch)
+
+    def __keptAlive(self, ch, req):
+        ch.enquiring = False
+        if req.resp is None and ch.fd in self.__channels and \
+           ch.session.state != STATE['CLOSED']:
+            # no answer, the link is dead
+            ch.session.tracer.error(req.error)
+            ch.session.handle_close()
+            self.__closed(ch)
+
+    def __closed(self, ch):
+        session = ch.session
+        if ch.fd in self.__channels and (session._fileno is None or
+                                         session.state == STATE['CLOSED']):
+            self.__forget(ch)
+
+    # the loop
+
+    def run_once(self, timeout=None):
+        """One pass: waits up to timeout for I/O or the next timer,
+        handles them and writes the output."""
+        wait = self.__nextTimer()
+        if wait is not None and (timeout is None or wait < timeout):
+            timeout = wait
+        if self.__dirty:
+            timeout = 0
+        try:
+            events = self.__poller.poll(timeout)
+        except (select.error, IOError), e:
+            if e.args[0] != errno.EINTR:
+                raise
+            events = []
+        now = time.time()
+        channels = self.__channels
+        for fd, flags in events:
+            ch = channels.get(fd)
+            if ch is None:
+                continue
+            ch.last_io = now
+            asyncore.readwrite(ch.session, flags)
+            self.__closed(ch)
+            if ch.fd in channels and ch.events & _OUT:
+                # maybe connected, or the buffer emptied
+                self.__dirty[fd] = ch
+        self.__runTimers()
+        self.__flush()
+
+    def __flush(self):
+        dirty, self.__dirty = self.__dirty, {}
+        now = time.time()
+        for fd, ch in dirty.items():
+            session = ch.session
+            if fd not in self.__channels:
+                continue
+            if session.connected and session.writable():
+                try:
+                    session.handle_write()
+                    ch.last_io = now
+                except socket.error:
+                    session.handle_error()
+                self.__closed(ch)
+                if fd not in self.__channels:
+                    continue
+            events = _IN
+            if session.writable():
+                events |= _OUT
+            if events != ch.events:
+                ch.events = events
+                self.__poller.modify(fd, events)
+
+    def run(self, timeout=None):
+        """Runs until stop() is called, nothing is left to do, or for
+        timeout seconds."""
+        self.running = True
+        if timeout is not None:
+            end = time.time() + timeout
+        while self.running and (self.__channels or self.__nextTimer() is not None):
+            wait = None
+            if timeout is not None:
+                wait = end - time.time()
+                if wait <= 0:
+                    break
+            self.run_once(wait)
+        self.running = False
+
+    def stop(self):
+        self.running = False
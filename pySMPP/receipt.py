@@ -0,0 +1,223 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""Delivery receipts and matching them to the submits.
+
+Example:
+    index = receipt.Correlator(ttl=2*86400)
+    req = sm.submit_sm_async(sms)
+    index.track(req, sms.dest_addr)         # added when the resp is in
+    ...
+    def deliver_sm(pdu):
+        r = receipt.from_pdu(pdu)
+        if r is not None:
+            m = index.match(r)
+            if m is not None:
+                dest_addr, latency = m
+
+parse() reads the "id:... sub:... dlvrd:... submit date:... done date:...
+stat:... err:... text:..." body of a receipt (SMPP 3.4 appendix B) with
+one precompiled regular expression. from_pdu() also checks esm_class and
+prefers the receipted_message_id and message_state parameters when the
+SMSC sends them.
+
+Correlator maps message_id to (submit time, value) in a dict, so a
+lookup is O(1). Each entry is one tuple; the order they expire in is
+kept in a deque next to it. Entries older than ttl, or the oldest ones
+past max_entries, are dropped as new ones come in. A final receipt
+removes its entry, an intermediate one (ENROUTE, ACCEPTD) doesn't.
+"""
+import re, time, collections, calendar
+
+# esm_class message type of an SMSC delivery receipt
+ESM_RECEIPT = 0x04
+ESM_TYPE_MASK = 0x3C
+
+# message_state parameter -> stat of the text body
+STATE = {
+    1: 'ENROUTE',
+    2: 'DELIVRD',
+    3: 'EXPIRED',
+    4: 'DELETED',
+    5: 'UNDELIV',
+    6: 'ACCEPTD',
+    7: 'UNKNOWN',
+    8: 'REJECTD',
+}
+FINAL = ['DELIVRD', 'EXPIRED', 'DELETED', 'UNDELIV', 'UNKNOWN', 'REJECTD']
+
+_fields = re.compile(r'(id|sub|dlvrd|submit date|done date|stat|err):(\S*)',
+                     re.IGNORECASE)
+_text = re.compile(r'\btext:', re.IGNORECASE)
+_names = {
+    'id': 'message_id',
+    'sub': 'sub',
+    'dlvrd': 'dlvrd',
+    'submit date': 'submit_date',
+    'done date': 'done_date',
+    'stat': 'stat',
+    'err': 'err',
+}
+
+class Receipt(object):
+    __slots__ = ('message_id', 'sub', 'dlvrd', 'submit_date', 'done_date',
+                 'stat', 'err', 'text')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def final(self):
+        """True unless the message is still on its way."""
+        return self.stat in FINAL
+
+    def __repr__(self):
+        return '<Receipt id=%r stat=%r err=%r>' % (self.message_id, self.stat,
+                                                   self.err)
+
+def parse(text):
+    """parse(text) -> Receipt, None if text has no id"""
+    r = Receipt()
+    m = _text.search(text)
+    if m:
+        r.text = text[m.end():]
+        text = text[:m.start()]
+    for key, value in _fields.findall(text):
+        setattr(r, _names[key.lower()], value)
+    if r.message_id is None:
+        return None
+    if r.stat is not None:
+        r.stat = r.stat.upper()
+    return r
+
+def from_pdu(p):
+    """from_pdu(p) -> Receipt, None if p isn't a delivery receipt
+    p is a deliver_sm or data_sm."""
+    f = p.fields()
+    if f.esm_class & ESM_TYPE_MASK != ESM_RECEIPT:
+        return None
+    # data_sm has no short_message, only the message_payload parameter
+    text = getattr(f, 'short_message', None) or \
+           f.optional.get('message_payload') or ''
+    r = parse(text)
+    message_id = f.optional.get('receipted_message_id')
+    if r is None:
+        if message_id is None:
+            return None
+        r = Receipt()
+    if message_id is not None:
+        r.message_id = message_id
+    state = f.optional.get('message_state')
+    if state in STATE:
+        r.stat = STATE[state]
+    return r
+
+def parse_date(s, utc=False):
+    """parse_date(s) -> seconds since the epoch
+    s is YYMMDDhhmm or YYMMDDhhmmss, the SMSC's local time unless utc."""
+    t = (2000 + int(s[0:2]), int(s[2:4]), int(s[4:6]), int(s[6:8]),
+         int(s[8:10]), int(s[10:12] or 0), 0, 0, -1)
+    if utc:
+        return calendar.timegm(t)
+    return time.mktime(t)
+
+
+class Correlator(object):
+    def __init__(self, ttl=86400, max_entries=1000000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.matched = 0
+        self.missed = 0
+        self.expired = 0
+        self.__entries = {}                 # message_id -> (time, value)
+        self.__order = collections.deque()  # (time, message_id), oldest first
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def add(self, message_id, value=None, now=None):
+        """Remembers value (the destination, a database key...) for
+        message_id."""
+        if now is None:
+            now = time.time()
+        self.__entries[message_id] = (now, value)
+        self.__order.append((now, message_id))
+        self.__evict(now)
+
+    def track(self, req, value=None):
+        """Adds the message_id of req (a Pending submit) once its response
+        is in; the latency is counted from now."""
+        now = time.time()
+        def done(req):
+            if req.error is None and req.message_id:
+                self.add(req.message_id, value, now)
+        req.add_callback(done)
+
+    def get(self, message_id):
+        """get(message_id) -> (submit time, value) or None"""
+        return self.__entries.get(message_id)
+
+    def pop(self, message_id):
+        """pop(message_id) -> (submit time, value) or None"""
+        return self.__entries.pop(message_id, None)
+
+    def match(self, r, now=None):
+        """match(r, now=None) -> (value, latency) or None
+        Finds the submit of the receipt r; a final receipt removes it."""
+        entry = None
+        for message_id in _variants(r.message_id):
+            if r.final():
+                entry = self.__entries.pop(message_id, None)
+            else:
+                entry = self.__entries.get(message_id)
+            if entry is not None:
+                break
+        if entry is None:
+            self.missed += 1
+            return None
+        self.matched += 1
+        if now is None:
+            now = time.time()
+        return entry[1], now - entry[0]
+
+    def __evict(self, now):
+        entries = self.__entries
+        order = self.__order
+        limit = now - self.ttl
+        while order and (order[0][0] < limit or
+                         len(entries) > self.max_entries or
+                         len(order) > 2 * self.max_entries):
+            t, message_id = order.popleft()
+            entry = entries.get(message_id)
+            # popped or added again since, then the deque entry is stale
+            if entry is not None and entry[0] == t:
+                del entries[message_id]
+                self.expired += 1
+
+def _variants(message_id):
+    """The ways an SMSC may write the same id: some give it in hex in the
+    submit_sm_resp and in decimal in the receipt, or the other way."""
+    yield message_id
+    try:
+        n = int(message_id, 16)
+    except ValueError:
+        return
+    if message_id.isdigit():
+        yield str(int(message_id))
+        yield '%x' % int(message_id)
+        yield '%X' % int(message_id)
+    yield str(n)
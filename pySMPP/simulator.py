@@ -0,0 +1,380 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""A small SMSC to test and load test clients against.
+
+Example:
+    from pySMPP import simulator, smpp
+    smsc = simulator.SMSC(latency=0.01, tps=5000, receipts=True)
+    smsc.start()                    # serves from a thread
+    sm = smpp.SMPP()
+    sm.connect(*smsc.address)
+    ...
+    smsc.stop()
+    print smsc.stats
+
+SMSC accepts bind_receiver/transmitter/transceiver (checked against
+users, a dict of system_id -> password, when given) and answers
+submit_sm and submit_multi with message_ids counting up, enquire_link
+and unbind.
+It can
+ - delay the responses by latency seconds,
+ - answer ESME_RTHROTTLED to submits over tps a second (all binds
+   together),
+ - answer error_status to a random error_rate of the submits (of the
+   destinations, for submit_multi),
+ - send a delivery receipt receipt_delay seconds after each submit
+   asking for one (registered_delivery), or after every submit with
+   receipts='all',
+ - send mo_rate deliver_sm a second to every receiver bind.
+Receipts go to a receiver or transceiver bind of the same system_id.
+
+One thread serves all the connections with select(), reading through a
+Framer and writing all the responses of one read in one send(); the
+PDUs are built with pdu.PDU and codec like the client side's.
+"""
+import socket, select, threading, time, heapq, random, itertools, errno
+import pdu, codec
+from pdu import COMMAND_ID, COMMAND_STATUS
+from framer import Framer
+from throttle import TokenBucket
+
+_BINDS = {
+    COMMAND_ID['bind_receiver']:    (True, False),  # receives, transmits
+    COMMAND_ID['bind_transmitter']: (False, True),
+    COMMAND_ID['bind_tranceiver']:  (True, True),
+}
+
+class _Connection(object):
+    def __init__(self, sock, max_length):
+        self.sock = sock
+        self.framer = Framer(max_length)
+        self.out = []
+        self.system_id = None
+        self.receiver = False
+        self.transmitter = False
+        self.closing = False
+        self.seq = itertools.count(1)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def write(self, data):
+        self.out.append(data)
+
+    def flush(self):
+        """Sends what it can; True if something is left."""
+        if not self.out:
+            return False
+        data = ''.join(self.out)
+        try:
+            n = self.sock.send(data)
+        except socket.error, e:
+            if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+            n = 0
+        if n < len(data):
+            self.out = [data[n:]]
+            return True
+        self.out = []
+        return False
+
+
+class SMSC(object):
+    def __init__(self, addr='127.0.0.1', port=0, users=None, latency=0,
+                 tps=None, error_rate=0, error_status=COMMAND_STATUS['ESME_RSYSERR'],
+                 receipts=False, receipt_delay=0, mo_rate=0,
+                 system_id='pySMPP', max_pdu_length=pdu.MAX_PDU_LENGTH,
+                 seed=None):
+        self.users = users
+        self.latency = latency
+        self.bucket = None
+        if tps:
+            self.bucket = TokenBucket(tps)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.receipts = receipts
+        self.receipt_delay = receipt_delay
+        self.mo_rate = mo_rate
+        self.system_id = system_id
+        self.max_pdu_length = max_pdu_length
+        self.random = random.Random(seed)
+        self.stats = {'binds': 0, 'submits': 0, 'throttled': 0, 'errors': 0,
+                      'receipts': 0, 'mo': 0, 'delivered': 0}
+        self.running = False
+        self.__stop = threading.Event()
+        self.__ids = itertools.count(1)
+        self.__timers = []          # heap of (when, n, connection, data)
+        self.__tick = itertools.count()
+        self.__conns = []
+        self.__thread = None
+        self.__nextMo = None
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((addr, port))
+        self.sock.listen(64)
+        self.sock.setblocking(0)
+        self.address = self.sock.getsockname()
+
+    def start(self):
+        """Serves from a daemon thread."""
+        # set here, not in the thread: a stop() right after start() may
+        # come before the thread runs
+        self.__stop.clear()
+        self.running = True
+        self.__thread = threading.Thread(target=self.serve_forever,
+            name="SMPP simulator")
+        self.__thread.setDaemon(True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        self.running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def serve_forever(self):
+        """Serves until stop()."""
+        self.running = True
+        try:
+            while not self.__stop.isSet():
+                self.serve_once(0.1)
+        finally:
+            self.running = False
+            for c in self.__conns[:]:
+                self.__drop(c)
+            self.sock.close()
+
+    def serve_once(self, timeout=None):
+        """One select() pass: accepts, reads, answers and runs the timers
+        that are due."""
+        now = time.time()
+        if self.__timers:
+            wait = max(0, self.__timers[0][0] - now)
+            if timeout is None or wait < timeout:
+                timeout = wait
+        if self.mo_rate and self.__nextMo is not None:
+            wait = max(0, self.__nextMo - now)
+            if timeout is None or wait < timeout:
+                timeout = wait
+        writers = [c for c in self.__conns if c.out]
+        r, w, x = select.select([self.sock] + self.__conns, writers, [], timeout)
+        for c in r:
+            if c is self.sock:
+                self.__accept()
+            else:
+                self.__read(c)
+        self.__runTimers()
+        self.__sendMo()
+        for c in self.__conns[:]:
+            try:
+                if not c.flush() and c.closing:
+                    self.__drop(c)
+            except socket.error:
+                self.__drop(c)
+
+    def __accept(self):
+        try:
+            sock, addr = self.sock.accept()
+        except socket.error:
+            return
+        sock.setblocking(0)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.__conns.append(_Connection(sock, self.max_pdu_length))
+
+    def __drop(self, c):
+        if c in self.__conns:
+            self.__conns.remove(c)
+        c.sock.close()
+
+    def __read(self, c):
+        try:
+            n = c.framer.fill(c.sock)
+        except socket.error, e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            n = 0
+        if not n:
+            self.__drop(c)
+            return
+        try:
+            for data in c.framer.pdus():
+                self.handle(c, pdu.PDU(data))
+        except pdu.PDUError:
+            c.write(str(pdu.PDU().response(cid=COMMAND_ID['generic_nack'],
+                status=COMMAND_STATUS['ESME_RINVCMDLEN'])))
+            c.closing = True
+
+    def __respond(self, c, resp):
+        data = str(resp)
+        if self.latency:
+            self.__schedule(time.time() + self.latency, c, data)
+        else:
+            c.write(data)
+
+    def __schedule(self, when, c, data):
+        heapq.heappush(self.__timers, (when, self.__tick.next(), c, data))
+
+    def __runTimers(self):
+        timers = self.__timers
+        now = time.time()
+        while timers and timers[0][0] <= now:
+            when, n, c, data = heapq.heappop(timers)
+            if c in self.__conns:
+                c.write(data)
+
+    def handle(self, c, p):
+        """Answers one PDU from the client."""
+        cid = p.command_id
+        if cid == COMMAND_ID['submit_sm']:
+            self.submit_sm(c, p)
+        elif cid == COMMAND_ID['submit_multi']:
+            self.submit_multi(c, p)
+        elif cid == COMMAND_ID['enquire_link']:
+            self.__respond(c, p.response())
+        elif cid in _BINDS:
+            self.bind(c, p)
+        elif cid == COMMAND_ID['unbind']:
+            c.write(str(p.response()))
+            c.closing = True
+        elif cid == COMMAND_ID['deliver_sm_resp'] or \
+             cid == COMMAND_ID['data_sm_resp']:
+            self.stats['delivered'] += 1
+        elif cid & 0x80000000:
+            pass
+        else:
+            c.write(str(p.response(cid=COMMAND_ID['generic_nack'],
+                status=COMMAND_STATUS['ESME_RINVCMDID'])))
+
+    def bind(self, c, p):
+        f = p.fields()
+        status = 0
+        if c.system_id is not None:
+            status = COMMAND_STATUS['ESME_RALYBND']
+        elif self.users is not None:
+            if f.system_id not in self.users:
+                status = COMMAND_STATUS['ESME_RINVSYSID']
+            elif self.users[f.system_id] != f.password:
+                status = COMMAND_STATUS['ESME_RINVPASWD']
+        if status:
+            c.write(str(p.response(status=status)))
+            return
+        c.system_id = f.system_id
+        c.receiver, c.transmitter = _BINDS[p.command_id]
+        self.stats['binds'] += 1
+        c.write(str(p.response(body=self.system_id + '\0')))
+        if c.receiver and self.mo_rate and self.__nextMo is None:
+            self.__nextMo = time.time() + 1.0 / self.mo_rate
+
+    def submit_sm(self, c, p):
+        if not c.transmitter:
+            c.write(str(p.response(status=COMMAND_STATUS['ESME_RINVBNDSTS'])))
+            return
+        if self.bucket is not None and self.bucket.take():
+            self.stats['throttled'] += 1
+            self.__respond(c, p.response(status=COMMAND_STATUS['ESME_RTHROTTLED']))
+            return
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            self.__respond(c, p.response(status=self.error_status))
+            return
+        self.stats['submits'] += 1
+        message_id = '%x' % self.__ids.next()
+        self.__respond(c, p.response(body=message_id + '\0'))
+        if self.receipts:
+            f = p.fields()
+            if self.receipts == 'all' or f.registered_delivery & 0x03:
+                self.__receipt(c, f, message_id)
+
+    def submit_multi(self, c, p):
+        """Like submit_sm, error_rate failing single destinations."""
+        if not c.transmitter:
+            c.write(str(p.response(status=COMMAND_STATUS['ESME_RINVBNDSTS'])))
+            return
+        if self.bucket is not None and self.bucket.take():
+            self.stats['throttled'] += 1
+            self.__respond(c, p.response(status=COMMAND_STATUS['ESME_RTHROTTLED']))
+            return
+        unsuccess = []
+        for dest in p.fields().dest_address:
+            if dest[0] == codec.DEST_SME and self.error_rate and \
+               self.random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                unsuccess.append(dest[1:] + (self.error_status,))
+            else:
+                self.stats['submits'] += 1
+        message_id = '%x' % self.__ids.next()
+        self.__respond(c, p.response(body=codec.encode('submit_multi_resp',
+            {'message_id': message_id, 'unsuccess_sme': unsuccess})))
+
+    def __receipt(self, c, f, message_id):
+        target = self.__receiver(c)
+        if target is None:
+            return
+        stamp = time.strftime('%y%m%d%H%M')
+        text = 'id:%s sub:001 dlvrd:001 submit date:%s done date:%s ' \
+               'stat:DELIVRD err:000 text:%s' % (message_id, stamp, stamp,
+                                                 f.short_message[:20])
+        body = codec.encode('deliver_sm', {
+            'source_addr_ton': f.dest_addr_ton,
+            'source_addr_npi': f.dest_addr_npi,
+            'source_addr': f.destination_addr,
+            'dest_addr_ton': f.source_addr_ton,
+            'dest_addr_npi': f.source_addr_npi,
+            'destination_addr': f.source_addr,
+            'esm_class': 0x04,
+            'short_message': text,
+            'optional': [('receipted_message_id', message_id),
+                         ('message_state', 2)]})
+        data = self.__deliver(target, body)
+        self.stats['receipts'] += 1
+        self.__schedule(time.time() + self.latency + self.receipt_delay,
+                        target, data)
+
+    def __receiver(self, c):
+        if c.receiver:
+            return c
+        for other in self.__conns:
+            if other.receiver and other.system_id == c.system_id:
+                return other
+        return None
+
+    def __deliver(self, c, body):
+        p = pdu.PDU()
+        p.command_id = COMMAND_ID['deliver_sm']
+        p.sequence_number = c.seq.next()
+        p.body = body
+        return str(p)
+
+    def __sendMo(self):
+        if not self.mo_rate or self.__nextMo is None:
+            return
+        now = time.time()
+        if self.__nextMo < now - 1:
+            self.__nextMo = now     # don't make up for a long stall
+        receivers = [c for c in self.__conns if c.receiver]
+        while self.__nextMo <= now:
+            self.__nextMo += 1.0 / self.mo_rate
+            n = self.stats['mo']
+            for c in receivers:
+                body = codec.encode('deliver_sm', {
+                    'source_addr': '3897%07d' % (n % 10000000),
+                    'destination_addr': c.system_id,
+                    'short_message': 'MO %d' % n})
+                c.write(self.__deliver(c, body))
+            self.stats['mo'] += 1
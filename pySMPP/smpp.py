@@ -32,12 +32,25 @@ Example:
 supported SMPP commands:
  + bind_receiver
  + bind_transmiter
+ + bind_transceiver (submits and deliver_sm on one connection)
  + unbind
  + enquire_link
  + submit_sm
+ + submit_sm_async (windowed: up to window_size requests in flight)
+ + submit_many (batches of submit_sm written together)
+ + submit_multi (up to 254 destinations a PDU, longer lists are split)
+ + throttling (throttle.Throttle, retries ESME_RTHROTTLED/ESME_RMSGQFUL)
+ + keepalive (enquire_link after keepalive seconds of silence, from
+   process(); no answer means the link is dead)
+ + reconnect (throttle.Backoff: a lost connection is reconnected and
+   bound again by process(), and the unanswered requests resent)
+
+deliver_sm and data_sm (issued by SMSC) go to the deliver_sm()/data_sm()
+methods, or to a handlers.HandlerPool when handler_pool is set. With
+dedup (a dedup.Dedup) set, the copies an SMSC sends again are answered
+and dropped.
 
 TODO:
- - deliver_sm (issued by SMSC)
  - query_sm
  - generic_nack
  - cancel_sm
@@ -46,48 +59,24 @@ TODO:
  - Better documentation
 
 unsupported (maybe):
- - bind_transciever
  - replace_sm
- - submit_multi
  - data_sm
  - outbind (issued by SMSC)
  - alert_notification (issued by SMSC)
-Doesn't support optional parameters (no v3.4)
-It works syncronously.
+Optional parameters (SMPP 3.4 TLVs) are in the tlv module, see
+SMS.optional and PDU.fields().optional.
+Every request is matched with its response by sequence_number when
+process() reads it, so requests from the SMSC (deliver_sm, enquire_link,
+unbind) may come in between; the synchronous calls (bind_*, unbind,
+enquire_link, submit_sm) process the session until their response is
+in, submit_sm_async() and friends return at once.
 """
-import struct
-import socket, select
-import pdu
-
-COMMAND_ID = {
-    'generic_nack' :        0x80000000,
-    'bind_receiver' :       0x00000001,
-    'bind_receiver_resp' :  0x80000001,
-    'bind_transmitter' :    0x00000002,
-    'bind_transmitter_resp':0x80000002,
-    'query_sm' :            0x00000003,
-    'query_sm_resp' :       0x80000003,
-    'submit_sm' :           0x00000004,
-    'submit_sm_resp' :      0x80000004,
-    'deliver_sm' :          0x00000005,
-    'deliver_sm_resp' :     0x80000005,
-    'unbind' :              0x00000006,
-    'unbind_resp' :         0x80000006,
-    'replace_sm' :          0x00000007,
-    'replace_sm_resp' :     0x80000007,
-    'cancel_sm' :           0x00000008,
-    'cancel_sm_resp' :      0x80000008,
-    'bind_tranceiver' :     0x00000009,
-    'bind_tranceiver_resp': 0x80000009,
-    'outbind' :             0x0000000B,
-    'submit_multi' :        0x00000021,
-    'submit_multi_resp' :   0x80000021,
-    'alert_notification' :  0x00000102,
-    'data_sm' :             0x00000103,
-    'data_sm_resp' :        0x80000103,
-    'enquire_link' :        0x00000015,
-    'enquire_link_resp' :   0x80000015,
-}
+import struct, time, itertools, heapq
+import socket, select, threading
+import pdu, codec
+from pdu import COMMAND_ID, COMMAND_STATUS
+from framer import Framer
+from trace import Tracer
 
 STATE = {
     'CLOSED'    : -1,
@@ -98,22 +87,133 @@ STATE = {
 }
 BOUND = [ STATE["BOUND_TX"], STATE["BOUND_RX"], STATE["BOUND_TRX"] ]
 
+# statuses telling us to slow down, see throttle.Throttle
+THROTTLED = [ COMMAND_STATUS['ESME_RTHROTTLED'], COMMAND_STATUS['ESME_RMSGQFUL'] ]
+
 class SMPPError(Exception):
     def __init__(self, value='Unknown SMPP error.'):
         self.value = value
     def __str__(self):
         if isinstance(self.value, pdu.PDU):
+            name = pdu.status_name(self.value.command_status)
+            if name:
+                return 'Command_id: 0x%08x; Command_status: 0x%08x (%s).' % (
+                    self.value.command_id, self.value.command_status, name)
             return 'Command_id: 0x%08x; Command_status: 0x%08x.' % (
                 self.value.command_id, self.value.command_status)
         else:
             return str(self.value)
 
+class Pending(object):
+    """A request sent to the SMSC whose response hasn't arrived yet.
+    Returned by SMPP.submit_sm_async() and by the AsyncSMPP requests.
+    The callbacks are called with this object once the response (or a
+    timeout) is in."""
+    def __init__(self, session, p, callback=None, deadline=None):
+        self.session = session
+        self.pdu = p
+        self.sequence_number = p.sequence_number
+        self.callbacks = []
+        if callback:
+            self.callbacks.append(callback)
+        self.deadline = deadline
+        self.timeout = None
+        self.retries = 0
+        self.messages = 1       # throttle tokens it costs (destinations)
+        self.paid = 0           # of those, taken for a resend so far
+        self.resp = None
+        self.error = None
+        self.__done = False
+
+    def done(self):
+        return self.__done
+
+    def add_callback(self, callback):
+        """Calls callback(self) when the response is in (right away if
+        it already is)."""
+        if self.__done:
+            callback(self)
+        else:
+            self.callbacks.append(callback)
+
+    def set_response(self, resp):
+        self.resp = resp
+        if resp.command_id != self.pdu.command_id + 0x80000000 or \
+           resp.command_status != 0:
+            self.error = SMPPError(resp)
+        self.__finish()
+
+    def set_error(self, error):
+        self.error = error
+        self.__finish()
+
+    def __finish(self):
+        self.__done = True
+        for callback in self.callbacks:
+            callback(self)
+
+    def getmessageid(self):
+        if self.resp is None or not self.resp.body:
+            return None
+        return self.resp.body.split('\0', 1)[0]
+
+    message_id = property(getmessageid, doc="message_id from the submit_sm_resp, None until answered")
+
+    def result(self, timeout=None):
+        """result(self, timeout=None) -> message_id
+        Waits for the response, processing the session meanwhile.
+        Raises SMPPError if the SMSC rejected the request."""
+        if timeout is not None:
+            end = time.time() + timeout
+        while not self.__done:
+            wait = None
+            if self.deadline is not None:
+                wait = max(self.deadline - time.time(), 0)
+            if timeout is not None:
+                left = end - time.time()
+                if left <= 0:
+                    raise SMPPError("Timeout waiting for response")
+                if wait is None or left < wait:
+                    wait = left
+            self.session.process(wait)
+        if self.error:
+            raise self.error
+        return self.message_id
+
+
 class SMPP(object):
-    def __init__(self, log=None):
+    def __init__(self, log=None, window_size=10, response_timeout=None,
+                 max_pdu_length=pdu.MAX_PDU_LENGTH, tracer=None, throttle=None,
+                 keepalive=None, reconnect=None):
+        """keepalive is the seconds of silence on the link after which an
+        enquire_link is sent; reconnect a throttle.Backoff, to reconnect
+        and bind again when the connection is lost."""
         self.__state = STATE["CLOSED"]
         self.__sock = None
-        self.__log = log
+        self.__framer = Framer(max_pdu_length)
+        if tracer is None:
+            tracer = Tracer(log)
+        self.tracer = tracer
         self.__sequence = 0
+        self.__pending = {}
+        self.__deadlines = []       # heap of (deadline, sequence, Pending)
+        self.__retry = []
+        self.__retryAt = 0
+        self.__wlock = threading.Lock()
+        self.handler_pool = None    # see handlers.HandlerPool
+        self.dedup = None           # see dedup.Dedup
+        self.__answering = {}       # sequence -> deliver_sm for dedup to remember
+        self.window_size = window_size
+        self.throttle = throttle
+        self.response_timeout = response_timeout
+        self.keepalive = keepalive
+        self.reconnect = reconnect
+        self.__lastIO = 0
+        self.__addr = None
+        self.__bound = None         # (bind method, user, pasw) to rebind
+        self.__enquiring = None     # the keepalive enquire_link
+        self.__linkError = None
+        self.__reconnecting = False
         self.system_type = ''
         self.addr_ton = 0
         self.addr_npi = 0
@@ -130,71 +230,326 @@ class SMPP(object):
     def unbind(self):
         if self.__state not in BOUND:
             return
+        self.__bound = None
         unbind = pdu.PDU()
         unbind.command_id = COMMAND_ID['unbind']
         unbind.sequence_number = self.sequence
-        self.__writePdu(unbind)
-        resp = self.__readPdu()
-        if not self.__checkResponse(unbind, resp):
+        req = self.__sendRequest(unbind, None, None)
+        try:
+            req.result()
+        except SMPPError:
             raise SMPPError, "Error in unbind command. State still OPEN"
         self.__state = STATE['OPEN']
+        # nothing else will be answered now
+        self.__failPending(SMPPError("Unbound"))
         return
 
-    def __checkResponse(self, pdu, resp):
-        return (pdu.command_id + 0x80000000 == resp.command_id) and \
-            (pdu.sequence_number == resp.sequence_number) and \
-             (resp.command_status == 0)
-
-    def bind_receiver(self, user, pasw):
+    def __bind(self, bind, state, method):
+        """Sends bind and waits for its response; whatever else the SMSC
+        sends meanwhile is dispatched as usual."""
         if self.__state != STATE['OPEN']:
             raise SMPPError, "State is not OPEN"
-        bind = pdu.BIND_RX(user,pasw)
+        bind.system_type = self.system_type
+        bind.smpp_version = self.smpp_version
+        bind.addr_ton = self.addr_ton
+        bind.addr_npi = self.addr_npi
+        bind.addr_range = self.addr_range
         bind.sequence_number = self.sequence
-        self.__writePdu(bind)
-        resp = self.__readPdu()
-        if not self.__checkResponse(bind,resp):
-            raise SMPPError, resp
-        self.__state = STATE['BOUND_RX']
-        self.system_name = resp.body[:-1]
+        req = self.__sendRequest(bind, None, None)
+        req.result()
+        self.__state = STATE[state]
+        self.system_name = req.message_id
+        self.__bound = (method, bind.user, bind.pasw)
         return
 
+    def bind_receiver(self, user, pasw):
+        self.__bind(pdu.BIND_RX(user, pasw), 'BOUND_RX', 'bind_receiver')
+
     def bind_transmitter(self, user, pasw):
-        if self.__state != STATE['OPEN']:
-            raise SMPPError, "State is not OPEN"
-        bind = pdu.BIND_TX(user,pasw)
-        bind.sequence_number = self.sequence
-        self.__writePdu(bind)
-        resp = self.__readPdu()
-        if not self.__checkResponse(bind,resp):
-            raise SMPPError, resp
-        self.__state = STATE['BOUND_TX']
-        self.system_name = resp.body[:-1]
-        return
+        self.__bind(pdu.BIND_TX(user, pasw), 'BOUND_TX', 'bind_transmitter')
+
+    def bind_transceiver(self, user, pasw):
+        """Binds for both directions: submits and the SMSC's deliver_sm
+        share one connection."""
+        self.__bind(pdu.BIND_TRX(user, pasw), 'BOUND_TRX', 'bind_transceiver')
 
     def enquire_link(self):
+        self.enquire_link_async().result()
+        return
+
+    def enquire_link_async(self, callback=None, timeout=None):
+        """enquire_link_async(self, callback=None, timeout=None) -> Pending
+        Sends an enquire_link without waiting for the response."""
         enquire = pdu.PDU()
         enquire.command_id = COMMAND_ID['enquire_link']
         enquire.sequence_number = self.sequence
-        self.__writePdu(enquire)
-        resp = self.__readPdu()
-        if not self.__checkResponse(enquire,resp):
-            raise SMPPError, resp
-        return
+        return self.__sendRequest(enquire, callback, timeout)
 
     def submit_sm(self, sms):
+        return self.submit_sm_async(sms).result()
+
+    def submit_sm_async(self, sms, callback=None, timeout=None):
+        """submit_sm_async(self, sms, callback=None, timeout=None) -> Pending
+        Sends the sms without waiting for its submit_sm_resp. At most
+        window_size requests are kept unacknowledged; when the window is
+        full this blocks until a response arrives. timeout defaults to
+        response_timeout."""
+        self.__waitRoom()
         sms.sequence_number = self.sequence
         sms.command_id = COMMAND_ID['submit_sm']
-        self.__writePdu(sms)
-        
-#        nack = pdu.PDU()
-#        nack.command_id = COMMAND_ID['generic_nack']
-#        nack.sequence_number = self.sequence
-#        self.__writePdu(nack)
+        return self.__sendRequest(sms, callback, timeout)
+
+    def __waitRoom(self, messages=1):
+        """Waits for room in the window and a throttle token for each
+        of messages."""
+        while True:
+            wait = None
+            if self.pending() < self.window_size:
+                n, wait = self.__takeTokens(messages)
+                messages -= n
+                if not messages:
+                    return
+            self.process(self.__nextDeadline(wait))
+
+    def submit_multi_async(self, sms, destinations, callback=None, timeout=None):
+        """submit_multi_async(self, sms, destinations, callback=None,
+        timeout=None) -> Pending
+        Sends sms to up to codec.MAX_DESTS destinations in one
+        submit_multi. A destination is an address (ton and npi 1), or a
+        codec dest_address tuple: (codec.DEST_SME, ton, npi, address) or
+        (codec.DEST_DL, dl_name) for a distribution list. The throttle
+        is charged one token for each destination, not one for the PDU."""
+        dests = []
+        for d in destinations:
+            if isinstance(d, tuple):
+                dests.append(d)
+            else:
+                dests.append((codec.DEST_SME, 1, 1, d))
+        dcs, message = sms.encode_message()
+        fields = sms._fields(dcs, message)
+        fields['dest_address'] = dests
+        p = pdu.PDU()
+        p.command_id = COMMAND_ID['submit_multi']
+        p.body = codec.encode('submit_multi', fields)
+        self.__waitRoom(len(dests))
+        p.sequence_number = self.sequence
+        req = self.__sendRequest(p, callback, timeout)
+        req.messages = len(dests)
+        return req
 
-        resp = self.__readPdu()
-        if not self.__checkResponse(sms,resp):
-            raise SMPPError, resp
-        return resp.body[:-1]
+    def submit_multi(self, sms, destinations, timeout=None):
+        """submit_multi(self, sms, destinations, timeout=None) -> list
+        Sends sms to all of destinations (see submit_multi_async), in
+        submit_multi PDUs of up to codec.MAX_DESTS of them, pipelined.
+        Returns, in the order of destinations, the message_id of each
+        one or the SMPPError it failed with: the error of the whole PDU,
+        or the error_status_code of its unsuccess_sme entry."""
+        destinations = list(destinations)
+        reqs = []
+        for i in range(0, len(destinations), codec.MAX_DESTS):
+            chunk = destinations[i:i+codec.MAX_DESTS]
+            reqs.append((chunk, self.submit_multi_async(sms, chunk, None, timeout)))
+        results = []
+        for chunk, req in reqs:
+            while not req.done():
+                self.process(self.__nextDeadline())
+            if req.error is not None:
+                results.extend([req.error] * len(chunk))
+                continue
+            # by (ton, npi, address): the same number may be given with
+            # another ton/npi
+            failed = {}
+            for ton, npi, addr, status in req.resp.fields().unsuccess_sme:
+                name = pdu.status_name(status)
+                if name:
+                    status = '0x%08x (%s)' % (status, name)
+                else:
+                    status = '0x%08x' % status
+                failed[(ton, npi, addr)] = SMPPError(
+                    "submit_multi to %s failed: %s" % (addr, status))
+            message_id = req.message_id
+            for d in chunk:
+                if not isinstance(d, tuple):
+                    d = (codec.DEST_SME, 1, 1, d)
+                if d[0] == codec.DEST_SME:
+                    results.append(failed.get(d[1:], message_id))
+                else:
+                    # unsuccess_sme names SME addresses only
+                    results.append(message_id)
+        return results
+
+    def submit_many(self, messages, timeout=None):
+        """submit_many(self, messages, timeout=None) -> list
+        Submits every SMS in messages, writing as many PDUs as the window
+        allows with a single send. Waits for all the responses and
+        returns, in the order of messages, the message_id of each one or
+        the SMPPError it failed with."""
+        messages = iter(messages)
+        reqs = []
+        batch = []
+        while True:
+            room = self.window_size - self.pending()
+            if room <= 0:
+                self.process(self.__nextDeadline())
+                continue
+            if len(batch) < room:
+                batch.extend(itertools.islice(messages, room - len(batch)))
+            if not batch:
+                break
+            n, wait = self.__takeTokens(min(room, len(batch)))
+            if not n:
+                self.process(self.__nextDeadline(wait))
+                continue
+            reqs.extend(self.__sendRequests(batch[:n], timeout))
+            del batch[:n]
+        results = []
+        for req in reqs:
+            while not req.done():
+                self.process(self.__nextDeadline())
+            results.append(req.error or req.message_id)
+        return results
+
+    def drain(self, timeout=None):
+        """Processes the session until every pending request is answered
+        or timed out. Returns False if timeout ran out first."""
+        if timeout is not None:
+            end = time.time() + timeout
+        while self.__pending or self.__retry:
+            wait = self.__nextDeadline()
+            if timeout is not None:
+                left = end - time.time()
+                if left <= 0:
+                    return False
+                if wait is None or left < wait:
+                    wait = left
+            self.process(wait)
+        return True
+
+    def pending(self):
+        """Number of requests waiting for a response."""
+        return len(self.__pending) + len(self.__retry)
+
+    def __sendRequest(self, p, callback, timeout):
+        if timeout is None:
+            timeout = self.response_timeout
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        req = Pending(self, p, callback, deadline)
+        req.timeout = timeout
+        self.__track(req)
+        try:
+            self.__writePdu(p)
+        except (socket.error, RuntimeError), e:
+            if not self.__canReconnect():
+                del self.__pending[p.sequence_number]
+                raise
+            # sent again once we are back
+            self.__reconnect(e)
+        return req
+
+    def __sendRequests(self, batch, timeout):
+        if timeout is None:
+            timeout = self.response_timeout
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        reqs = []
+        data = []
+        for sms in batch:
+            sms.sequence_number = self.sequence
+            sms.command_id = COMMAND_ID['submit_sm']
+            msg = str(sms)
+            if self.tracer.active:
+                self.tracer.pdu_out(sms, msg)
+            data.append(msg)
+            req = Pending(self, sms, None, deadline)
+            req.timeout = timeout
+            reqs.append(req)
+        for req in reqs:
+            self.__track(req)
+        try:
+            self.__writeData(''.join(data))
+        except (socket.error, RuntimeError), e:
+            if not self.__canReconnect():
+                for req in reqs:
+                    del self.__pending[req.sequence_number]
+                raise
+            self.__reconnect(e)
+        return reqs
+
+    def __takeTokens(self, n):
+        """Takes up to n tokens from the throttle -> (taken, wait)"""
+        if self.throttle is None:
+            return n, 0
+        taken = 0
+        while taken < n:
+            wait = self.throttle.take()
+            if wait:
+                return taken, wait
+            taken += 1
+        return n, 0
+
+    def __resend(self):
+        """Sends again the requests the SMSC throttled."""
+        while self.__retry:
+            req = self.__retry[0]
+            n, wait = self.__takeTokens(req.messages - req.paid)
+            req.paid += n
+            if req.paid < req.messages:
+                self.__retryAt = time.time() + wait
+                return
+            req.paid = 0
+            self.__retry.pop(0)
+            p = req.pdu
+            p.sequence_number = req.sequence_number = self.sequence
+            if req.timeout is not None:
+                req.deadline = time.time() + req.timeout
+            self.__track(req)
+            self.__writePdu(p)
+
+    def __track(self, req):
+        """Adds req to the requests waiting for a response."""
+        self.__pending[req.sequence_number] = req
+        if req.deadline is None:
+            return
+        deadlines = self.__deadlines
+        heapq.heappush(deadlines, (req.deadline, req.sequence_number, req))
+        # the answered requests stay in the heap until their deadline
+        # comes up; don't let them pile up
+        if len(deadlines) > 2 * len(self.__pending) + 64:
+            pending = self.__pending
+            deadlines[:] = [d for d in deadlines if pending.get(d[1]) is d[2]]
+            heapq.heapify(deadlines)
+
+    def __nextDeadline(self, wait=None):
+        """Seconds until a timeout or a retry is due (or wait, if sooner)."""
+        deadlines = self.__deadlines
+        pending = self.__pending
+        while deadlines and pending.get(deadlines[0][1]) is not deadlines[0][2]:
+            heapq.heappop(deadlines)
+        first = None
+        if deadlines:
+            first = deadlines[0][0]
+        if self.__retry and (first is None or self.__retryAt < first):
+            first = self.__retryAt
+        if wait is not None and (first is None or time.time() + wait < first):
+            first = time.time() + wait
+        if first is None:
+            return None
+        return max(first - time.time(), 0)
+
+    def __expirePending(self):
+        now = time.time()
+        # a callback may send, or drop the connection: look again each time
+        while self.__deadlines and self.__deadlines[0][0] <= now:
+            deadline, seq, req = heapq.heappop(self.__deadlines)
+            if self.__pending.get(seq) is not req:
+                continue            # answered (or resent) already
+            del self.__pending[seq]
+            error = SMPPError("Response timeout (sequence %d)" % seq)
+            self.tracer.error(error)
+            req.set_error(error)
 
     def deliver_sm(self, pdu):
         """deliver_sm(self, pdu) -> PDU()\nOverride this method."""
@@ -211,6 +566,42 @@ class SMPP(object):
     def dispatch(self):
         sms = self.__readPdu()
         cid = sms.command_id
+        if cid & 0x80000000:
+            req = self.__pending.pop(sms.sequence_number, None)
+            if req is None:
+                return
+            throttle = self.throttle
+            if throttle is not None:
+                if sms.command_status in THROTTLED and \
+                   req.retries < throttle.retries:
+                    throttle.throttled()
+                    req.retries += 1
+                    self.__retry.append(req)
+                    self.__retryAt = throttle.paused_until
+                    return
+                if sms.command_status == 0:
+                    throttle.accepted()
+            req.set_response(sms)
+            return
+        if self.dedup is not None and \
+           cid in (COMMAND_ID['deliver_sm'], COMMAND_ID['data_sm']):
+            if self.dedup.seen(sms):
+                # sent again, we answered too late: answer, don't hand it on
+                self.__writePdu(sms.response(body="\0"))
+                return
+            # remembered once it is answered ESME_ROK, see __writePdu
+            self.__answering[sms.sequence_number] = sms
+        if self.handler_pool is not None and \
+           cid in (COMMAND_ID['deliver_sm'], COMMAND_ID['data_sm']):
+            self.handler_pool.submit(sms)
+            return
+        if cid == COMMAND_ID['unbind']:
+            # the SMSC is going away, don't come back
+            self.__bound = None
+            self.__writePdu(sms.response())
+            self.__state = STATE['OPEN']
+            self.__failPending(SMPPError("Unbound by the SMSC"))
+            return
         if cid == COMMAND_ID['enquire_link']:
             cb = lambda pdu: pdu.response()
         elif cid == COMMAND_ID['deliver_sm']:
@@ -230,33 +621,150 @@ class SMPP(object):
         return
 
     def log_info(self, s):
-        log = self.__log
-        if log: print >>log, s
-        log.flush()
+        self.tracer.info(s)
 
     def log_debug(self, s):
-        log = self.__log
-        if log: print >>log, s
-        log.flush()
+        self.tracer.debug(s)
 
     def process(self, timeout=None):
-        a,b,c = select.select([self], [], [self], timeout)
-        if len(c) > 0: # ako ima specialen efekt?FIXME?
-            print "ERROR?!?"
-        elif len(a) > 0: # ako ima za citanje -> dispatch
+        """Handles what the SMSC sent, waiting up to timeout for it, and
+        the timeouts, retries and keepalive that are due. Every complete
+        PDU read already is handled before it returns: select() on
+        fileno() only tells about what is still in the socket."""
+        try:
+            self.__process(timeout)
+        except (socket.error, RuntimeError, pdu.PDUError), e:
+            if not self.__canReconnect():
+                # don't leave the waiting requests to their timeouts
+                self.abort(SMPPError("Connection closed: %s" % e))
+                raise
+            self.__reconnect(e)
+        error = self.__linkError
+        if error is not None:
+            self.__linkError = None
+            if not self.__canReconnect():
+                self.abort(error)
+                raise error
+            self.__reconnect(error)
+
+    def __process(self, timeout):
+        wait = self.__keepaliveDue()
+        if wait is not None and (timeout is None or wait < timeout):
+            timeout = wait
+        if not self.__framer.ready():
+            a,b,c = select.select([self], [], [self], timeout)
+            if len(c) > 0: # ako ima specialen efekt?FIXME?
+                print "ERROR?!?"
+            elif len(a) > 0: # ako ima za citanje -> dispatch
+                self.dispatch()
+        # one read may bring several PDUs, don't leave them to the next
+        # select(): it wouldn't see them
+        while self.__framer.ready():
             self.dispatch()
+        if self.__deadlines:
+            self.__expirePending()
+        if self.__retry:
+            self.__resend()
+        self.__keepAlive()
+
+    def __keepaliveDue(self):
+        """Seconds until an enquire_link is due, None if none will be."""
+        if not self.keepalive or self.__enquiring is not None or \
+           self.__state not in BOUND:
+            return None
+        return max(self.__lastIO + self.keepalive - time.time(), 0)
+
+    def __keepAlive(self):
+        if self.__keepaliveDue() == 0:
+            timeout = self.response_timeout or self.keepalive
+            self.__enquiring = self.enquire_link_async(self.__keptAlive, timeout)
+
+    def __keptAlive(self, req):
+        self.__enquiring = None
+        if req.resp is None and self.__state in BOUND:
+            # no answer, the link is dead
+            self.__linkError = req.error
+
+    def __canReconnect(self):
+        return self.reconnect is not None and self.__bound is not None and \
+               not self.__reconnecting
+
+    def __reconnect(self, error):
+        """Connects and binds again, backing off between the attempts.
+        The requests that weren't answered are sent again after (the
+        SMSC may have got some of them already); if reconnect.retries
+        attempts fail they fail with SMPPError."""
+        self.tracer.info("Connection lost (%s), reconnecting" % error)
+        reqs = self.__pending.values()
+        reqs.sort(lambda a, b: cmp(a.sequence_number, b.sequence_number))
+        reqs.extend(self.__retry)
+        self.__pending = {}
+        self.__deadlines = []
+        self.__retry = []
+        self.__drop()
+        self.__enquiring = None
+        requeue = []
+        for req in reqs:
+            if req.pdu.command_id == COMMAND_ID['enquire_link']:
+                req.set_error(error)
+            else:
+                requeue.append(req)
+        backoff = self.reconnect
+        method, user, pasw = self.__bound
+        attempt = 0
+        while True:
+            if backoff.retries is not None and attempt >= backoff.retries:
+                self.__bound = None
+                error = SMPPError("Reconnect failed: %s" % error)
+                for req in requeue:
+                    req.set_error(error)
+                raise error
+            time.sleep(backoff.delay(attempt))
+            attempt += 1
+            self.__reconnecting = True
+            try:
+                self.connect(*self.__addr)
+                getattr(self, method)(user, pasw)
+                break
+            except (socket.error, RuntimeError, SMPPError, pdu.PDUError), e:
+                self.tracer.error(e)
+                error = e
+                self.__drop()
+                self.__pending = {}
+                self.__reconnecting = False
+        self.__reconnecting = False
+        self.tracer.info("Reconnected after %d attempt(s), resending %d "
+                         "request(s)" % (attempt, len(requeue)))
+        self.__retry = requeue
+        self.__retryAt = 0
+
+    def __drop(self):
+        if self.__sock is not None:
+            try:
+                self.__sock.close()
+            except socket.error:
+                pass
+        self.__state = STATE["CLOSED"]
 
     def connect(self, addr, port):
         if self.__state != STATE["CLOSED"]:
             return
         self.__sock = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
         self.__sock.connect((addr,int(port)))
+        self.__framer = Framer(self.__framer.max_length)
+        self.__answering = {}
+        self.__addr = (addr, port)
         self.__state = STATE["OPEN"]
         return
 
     def fileno(self):
         return self.__sock.fileno()
 
+    def pending_input(self):
+        """True if a complete PDU was read from the socket but not
+        handled yet (select() on fileno() won't tell)."""
+        return self.__framer.ready()
+
     def close(self):
         if self.__state in BOUND:
             self.unbind()
@@ -264,40 +772,86 @@ class SMPP(object):
             return
         self.__sock.close()
         self.__state = STATE["CLOSED"]
+        self.__failPending(SMPPError("Connection closed"))
+        self.tracer.flush()
         return
 
+    def abort(self, error=None):
+        """abort(self, error=None) -> list of Pending
+        Drops the connection without unbinding. The requests still
+        waiting for a response fail with error and are returned, oldest
+        first."""
+        if error is None:
+            error = SMPPError("Connection aborted")
+        self.__drop()
+        self.__bound = None
+        pending = self.__failPending(error)
+        self.tracer.flush()
+        return pending
+
+    def __failPending(self, error):
+        """Fails every request still waiting for a response, returns
+        them oldest first."""
+        pending = self.__pending.values()
+        pending.sort(lambda a, b: cmp(a.sequence_number, b.sequence_number))
+        pending.extend(self.__retry)
+        self.__pending = {}
+        self.__deadlines = []
+        self.__retry = []
+        for req in pending:
+            req.set_error(error)
+        return pending
+
+    def getstate(self):
+        return self.__state
+
+    state = property(getstate, doc="Session state, one of the STATE values")
+
+    def send_pdu(self, p):
+        """Sends a PDU as it is, e.g. a response from another thread."""
+        self.__writePdu(p)
+
     def __writePdu(self, p):
-        self.log_debug(p.dump())
         msg = str(p)
-        totalsent = 0
-        while totalsent < len(msg):
-            sent = self.__sock.send(msg[totalsent:])
-            if sent == 0:
-                raise RuntimeError, "socket connection broken"
-            totalsent = totalsent + sent
+        if self.tracer.active:
+            self.tracer.pdu_out(p, msg)
+        self.__writeData(msg)
+        if self.__answering and p.command_id & 0x80000000:
+            self.__answered(p)
+
+    def __answered(self, resp):
+        req = self.__answering.pop(resp.sequence_number, None)
+        if req is not None and resp.command_status == 0 and \
+           self.dedup is not None:
+            self.dedup.remember(req)
+
+    def __writeData(self, msg):
+        self.__wlock.acquire()
+        try:
+            totalsent = 0
+            while totalsent < len(msg):
+                sent = self.__sock.send(msg[totalsent:])
+                if sent == 0:
+                    raise RuntimeError, "socket connection broken"
+                totalsent = totalsent + sent
+            self.__lastIO = time.time()
+        finally:
+            self.__wlock.release()
         return
 
     def __readPdu(self):
-        msg = ''
-        # get the first 4 bytes (PDU length)
-        length = 4
-        while length > 0:
-            chunk = self.__sock.recv(length)
-            if chunk == '':
-                raise RuntimeError, "socket connection broken"
-            msg = msg + chunk
-            length = length - len(chunk)
-        (length,) = struct.unpack('>i', msg)
-        if length < 16 or length > 254:
-            raise pdu.PDUError("Illegal PDU length! length=%x." % length)
-        # get the rest of the PDU
-        length = length - 4
-        while length > 0:
-            chunk = self.__sock.recv(length)
-            if chunk == '':
-                raise RuntimeError, "socket connection broken"
-            msg = msg + chunk
-            length = length - len(chunk)
-        p = pdu.PDU(msg)
-        self.log_debug(p.dump())
+        framer = self.__framer
+        try:
+            data = framer.next()
+            while data is None:
+                if framer.fill(self.__sock) == 0:
+                    raise RuntimeError, "socket connection broken"
+                self.__lastIO = time.time()
+                data = framer.next()
+        except (RuntimeError, pdu.PDUError), e:
+            self.tracer.error(e)
+            raise
+        p = pdu.PDU(data)
+        if self.tracer.active:
+            self.tracer.pdu_in(p, data)
         return p
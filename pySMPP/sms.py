@@ -15,8 +15,8 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
 
-import struct
-import pdu
+import struct, copy, itertools, random
+import pdu, codec, gsm, tlv
 
 # http://www.dreamfabric.com/sms
 #
@@ -36,33 +36,32 @@ import pdu
 #         01 - Fax
 #         10 - Email
 
+# octets of user data in one SMS, and septets in the default alphabet
+MAX_OCTETS = 140
+MAX_SEPTETS = 160
+
+ESM_UDHI = 0x40         # esm_class: short_message starts with a UDH
+
+# concatenated SMS reference numbers, shared by all messages
+_refs = itertools.count(random.randint(0, 0xffff))
+
 def convert8to7bit(str):
     """Convert 8bit string to compressed 7bit string of hex values.
     Returns string."""
-
-    length = len(str)
-    str = str + '\0'
-    dp = ''
-    j = 0
-    while length > 0:
-        bb = ord(str[j])
-        i = 7
-        while i > 0 and length > 0:
-            bb = bb | ord(str[j+8-i]) << i
-            dp = dp + chr(0xff & bb)
-            bb = bb >> 8
-            length = length - 1
-            i = i - 1
-        length = length - 1
-        j = j + 8
-
-    return dp
+    return gsm.pack7(str)
 
 
 class SMS(pdu.PDU):
-    """Encapsulates an SMS message. """
+    """Encapsulates an SMS message.
+    The message is a string sent as it is, or unicode text, which is
+    sent in the GSM default alphabet when it fits, UCS2 otherwise (the
+    alphabet bits of dcs are set accordingly)."""
+    __slots__ = ('message', 'esm_class', 'protocol', 'dcs', 'priority',
+                 'src_addr', 'dest_addr', 'optional')
+
     def __init__(self, message=''):
         pdu.PDU.__init__(self)
+        self.command_id = pdu.COMMAND_ID['submit_sm']
         self.message = message
         self.esm_class = 0
         self.protocol = 0
@@ -70,28 +69,228 @@ class SMS(pdu.PDU):
         self.priority = 0
         self.src_addr = ""
         self.dest_addr = ""
+        # optional parameters: a dict for tlv.encode(), or a string of
+        # already encoded ones
+        self.optional = {}
+
+    def encode_message(self):
+        """encode_message(self) -> (dcs, octets) for the short_message"""
+        if isinstance(self.message, unicode):
+            alphabet, octets = gsm.encode_auto(self.message)
+            return (self.dcs & ~0x0C) | alphabet, octets
+        return self.dcs, self.message
+
+    def segments(self, method='udh', ref16=False):
+        """segments(self, method='udh', ref16=False) -> list of SMS
+        Splits a message too long for one SMS. With method 'udh' it
+        becomes concatenated SMS, each with a user data header (16 bit
+        reference numbers if ref16) and esm_class UDHI set; with 'sar'
+        the same, marked with the sar_* optional parameters instead; with
+        method 'payload' one SMS carrying the whole text in
+        message_payload. The optional parameters added go after the
+        SMS's own, a dict or an encoded string.
+        A message that fits is returned as it is. Submit the segments
+        together, e.g. with SMPP.submit_many()."""
+        dcs, octets = self.encode_message()
+        septets = dcs & 0x0C == gsm.DCS_DEFAULT
+        if septets:
+            limit = MAX_SEPTETS
+        else:
+            limit = MAX_OCTETS
+        if len(octets) <= limit:
+            return [self]
+        if method == 'payload':
+            sms = copy.copy(self)
+            sms.message, sms.dcs = '', dcs
+            sms.optional = self.__optional([('message_payload', octets)])
+            return [sms]
+        if method == 'sar':
+            udhlen = 0
+        elif method != 'udh':
+            raise ValueError("Unknown segmentation method %r" % method)
+        elif ref16:
+            udhlen = 7
+        else:
+            udhlen = 6
+        if septets:
+            size = (MAX_SEPTETS * 7 - udhlen * 8) / 7
+        else:
+            size = MAX_OCTETS - udhlen
+            if dcs & 0x0C == gsm.DCS_UCS2:
+                size -= size % 2
+        parts = []
+        i = 0
+        while i < len(octets):
+            part = octets[i:i+size]
+            if septets and part[-1] == '\x1b' and i + size < len(octets):
+                part = part[:-1]    # don't split an escape sequence
+            elif dcs & 0x0C == gsm.DCS_UCS2 and i + size < len(octets) and \
+                 0xd8 <= ord(part[-2]) <= 0xdb:
+                part = part[:-2]    # nor a surrogate pair
+            parts.append(part)
+            i += len(part)
+        if len(parts) > 255:
+            raise pdu.PDUError("Message too long, %d segments" % len(parts))
+        ref = _refs.next()
+        if method == 'sar':
+            result = []
+            for n, part in enumerate(parts):
+                sms = copy.copy(self)
+                sms.message, sms.dcs = part, dcs
+                sms.optional = self.__optional([
+                    ('sar_msg_ref_num', ref & 0xffff),
+                    ('sar_total_segments', len(parts)),
+                    ('sar_segment_seqnum', n + 1)])
+                result.append(sms)
+            return result
+        if ref16:
+            udh = struct.pack('>BBBHB', 6, 0x08, 4, ref & 0xffff, len(parts))
+        else:
+            udh = struct.pack('>BBBBB', 5, 0x00, 3, ref & 0xff, len(parts))
+        result = []
+        for n, part in enumerate(parts):
+            sms = copy.copy(self)
+            sms.message = udh + chr(n + 1) + part
+            sms.dcs = dcs
+            sms.esm_class = self.esm_class | ESM_UDHI
+            result.append(sms)
+        return result
+
+    def __optional(self, params):
+        """self.optional with params, (name, value) pairs, added"""
+        if isinstance(self.optional, str):
+            return self.optional + tlv.encode(params)
+        optional = dict(self.optional)
+        optional.update(params)
+        return optional
 
     def __str__(self):
-        self.body  = pdu.c_octet_string("");                #service type
-        self.body += pdu.short(1);							#src_addr_ton
-        self.body += pdu.short(1);							#src_addr_npi
-        self.body += pdu.c_octet_string(self.src_addr);     #src_addr
-        self.body += pdu.short(1);					    	#dest_addr_ton
-        self.body += pdu.short(1);				    		#dest_addr_npi
-        self.body += pdu.c_octet_string(self.dest_addr);    #dest_addr
-        self.body += pdu.short(0);							#esm_class
-        self.body += pdu.short(self.protocol);				#protocol_id
-        self.body += pdu.short(self.priority);				#priority_flag
-        self.body += pdu.c_octet_string("");		    	#schedule_time
-        self.body += pdu.c_octet_string("");			    #validity_period
-        self.body += pdu.short(0);			            	#registered_dlv
-        self.body += pdu.short(0);							#replace_flag
-        self.body += pdu.short(self.dcs);					#data_coding
-        self.body += pdu.short(0);							#sm_def_msg
-        self.body += pdu.short(len(self.message) );     	#sm_length
-        self.body += pdu.c_octet_string(self.message);		#sms
+        dcs, message = self.encode_message()
+        self.body = codec.encode('submit_sm', self._fields(dcs, message))
         return pdu.PDU.__str__(self)
 
+    def _fields(self, dcs, message):
+        """The submit_sm parameters, for codec.encode()."""
+        return {
+            'source_addr_ton': 1,
+            'source_addr_npi': 1,
+            'source_addr': self.src_addr,
+            'dest_addr_ton': 1,
+            'dest_addr_npi': 1,
+            'destination_addr': self.dest_addr,
+            'esm_class': self.esm_class,
+            'protocol_id': self.protocol,
+            'priority_flag': self.priority,
+            'data_coding': dcs,
+            'short_message': message,
+            'optional': self.optional}
+
+
+class SMSTemplate(object):
+    """An SMS sent to many recipients, encoded once.
+
+    Example:
+        t = sms.SMSTemplate(SMS(u'Hi {name}, 20% off today'), u'{name}')
+        for dest_addr, name in customers:
+            sm.submit_sm_async(t.pdu(dest_addr, name))
+
+    The submit_sm body is cut around destination_addr (and around the
+    placeholder in the message, when given) and the pieces are encoded
+    once; pdu() and body() only join them with the parts that change.
+    The data_coding is chosen for the text without the placeholder; a
+    value that doesn't fit in it is encoded the slow way, through a copy
+    of the SMS (and so is a message too long for one submit_sm, raising
+    PDUError). The SMS shouldn't be changed after the template is made."""
+    def __init__(self, sms, placeholder=None):
+        self.sms = sms
+        self.placeholder = placeholder
+        message = sms.message
+        if placeholder is None:
+            head, tail = message, message[:0]
+        else:
+            head, tail = message.split(placeholder, 1)
+        if isinstance(message, unicode):
+            dcs, octets = gsm.encode_auto(head + tail)
+            if dcs == gsm.DCS_DEFAULT:
+                self.__encode = gsm.encode
+            else:
+                self.__encode = lambda text: text.encode('utf-16-be')
+            head, tail = self.__encode(head), self.__encode(tail)
+            dcs = (sms.dcs & ~0x0C) | dcs
+        else:
+            dcs = sms.dcs
+            self.__encode = str
+        self.head = head
+        self.tail = tail
+        fields = sms._fields(dcs, '')
+        fields['destination_addr'] = ''
+        optional = fields['optional']
+        fields['optional'] = None
+        body = codec.encode('submit_sm', fields)
+        # destination_addr comes after service_type, source_addr and the
+        # ton/npi octets of both
+        at = len(sms.src_addr) + 6
+        self.prefix = body[:at]
+        self.middle = body[at+1:-1]     # up to sm_length
+        if isinstance(optional, str):
+            self.optional = optional
+        else:
+            self.optional = tlv.encode(optional)
+
+    def body(self, dest_addr, value=None):
+        """body(self, dest_addr, value=None) -> string
+        The submit_sm body for dest_addr, value replacing the
+        placeholder."""
+        if value is None:
+            message = self.head + self.tail
+        else:
+            try:
+                message = self.head + self.__encode(value) + self.tail
+            except UnicodeError:
+                return self.__slow(dest_addr, value)
+        if len(message) > codec.MAX_SM_LENGTH:
+            return self.__slow(dest_addr, value)
+        return ''.join((self.prefix, dest_addr, '\0', self.middle,
+                        chr(len(message)), message, self.optional))
+
+    def __slow(self, dest_addr, value):
+        sms = copy.copy(self.sms)
+        sms.dest_addr = dest_addr
+        if value is not None:
+            sms.message = sms.message.replace(self.placeholder, value, 1)
+        str(sms)
+        return sms.body
+
+    def pdu(self, dest_addr, value=None):
+        """pdu(self, dest_addr, value=None) -> pdu.PDU
+        A submit_sm ready for SMPP.submit_sm_async() or submit_many()."""
+        p = pdu.PDU()
+        p.command_id = pdu.COMMAND_ID['submit_sm']
+        p.body = self.body(dest_addr, value)
+        return p
+
+    def pdus(self, recipients):
+        """pdus(self, recipients) -> list of pdu.PDU
+        recipients are dest_addr strings or (dest_addr, value) pairs."""
+        result = []
+        for r in recipients:
+            if isinstance(r, tuple):
+                result.append(self.pdu(*r))
+            else:
+                result.append(self.pdu(r))
+        return result
+
+def from_texts(texts, use_numpy=None):
+    """from_texts(texts, use_numpy=None) -> list of SMS
+    Makes an SMS of each unicode text, encoding all of them in one batch
+    with the cheapest dcs for each (see gsm.encode_many)."""
+    result = []
+    for dcs, octets in gsm.encode_many(texts, use_numpy):
+        sms = SMS(octets)
+        sms.dcs = dcs
+        result.append(sms)
+    return result
+
 class DeliveryNotification(SMS):
     pass
 
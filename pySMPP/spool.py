@@ -0,0 +1,381 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""A persistent queue of outbound submit_sm, surviving restarts.
+
+Example:
+    q = spool.Spool('/var/spool/smpp')
+    q.put_many([sms1, sms2, ...])       # SMS objects or encoded bodies
+    ...
+    sm = smpp.SMPP()
+    ...
+    while 1:
+        q.drain(sm, 1000)               # submits, acks what was answered
+        sm.process(1)
+
+The spool directory holds segment files, each a preallocated file of
+segment_size octets written through mmap, and one file of
+acknowledgements. A record is the submit_sm body without the PDU
+header (the sequence_number is given when it's sent):
+    length (4) crc32 (4) record id (8) body
+New records are appended to the last segment; a segment is deleted
+once all of its records have been acknowledged, and a fresh one is
+started when the last one is full. Opening a spool reads back every
+record that wasn't acknowledged, stopping at the first torn record.
+
+Writes are made durable in groups: put() and put_many() copy into the
+mapped segment and the segments and the acknowledgements are synced
+(msync/fsync) at most every sync_interval seconds, or by sync(). With
+sync_interval=0 every put, put_many and ack_many call syncs; what was
+put after the last sync may be lost in a crash. The SMSC may see a
+message twice if we crash between its submit_sm_resp and the sync of
+the acknowledgement.
+"""
+import os, mmap, struct, zlib, time, threading, collections
+import pdu
+from pdu import COMMAND_ID
+from smpp import SMPPError, THROTTLED
+
+MAGIC = 'pySMPPq1'
+SEGMENT_SIZE = 64 * 1024 * 1024
+ACKS_COMPACT = 100000       # acknowledgements kept before rewriting the file
+
+_record = struct.Struct('>IIQ')
+_ack = struct.Struct('>Q')
+
+class SpoolError(Exception):
+    pass
+
+class _Segment(object):
+    """One segment file, mapped."""
+    def __init__(self, path, size=None):
+        self.path = path
+        self.base = int(os.path.basename(path).split('.')[0], 16)
+        create = size is not None
+        self.file = open(path, create and 'w+b' or 'r+b')
+        if create:
+            self.file.truncate(size)
+        else:
+            size = os.fstat(self.file.fileno()).st_size
+        self.size = size
+        self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_WRITE)
+        if create:
+            self.map[0:len(MAGIC)] = MAGIC
+        elif self.map[0:len(MAGIC)] != MAGIC:
+            raise SpoolError("%s is not a spool segment" % path)
+        self.end = len(MAGIC)
+        self.live = 0           # records not acknowledged yet
+        self.dirty = False
+
+    def records(self):
+        """Yields (record id, offset of the body, length) of the records
+        written, and leaves end after the last good one."""
+        m = self.map
+        off = len(MAGIC)
+        while off + _record.size <= self.size:
+            length, crc, rid = _record.unpack_from(m, off)
+            start = off + _record.size
+            if length == 0 or start + length > self.size:
+                break
+            if zlib.crc32(m[start:start+length]) & 0xffffffff != crc:
+                break           # torn by a crash, nothing good after it
+            yield rid, start, length
+            off = start + length
+        self.end = off
+
+    def append(self, rid, body):
+        """Writes a record, returns the offset of its body or None when
+        the segment is full."""
+        off = self.end
+        start = off + _record.size
+        end = start + len(body)
+        # keep room for a zero length after the last record
+        if end + 4 > self.size:
+            return None
+        _record.pack_into(self.map, off, len(body),
+                          zlib.crc32(body) & 0xffffffff, rid)
+        self.map[start:end] = body
+        self.end = end
+        self.dirty = True
+        return start
+
+    def sync(self):
+        if self.dirty:
+            self.map.flush()
+            self.dirty = False
+
+    def close(self):
+        self.sync()
+        self.map.close()
+        self.file.close()
+
+    def remove(self):
+        self.map.close()
+        self.file.close()
+        os.unlink(self.path)
+
+
+class Spool(object):
+    def __init__(self, directory, segment_size=SEGMENT_SIZE, sync_interval=0.05):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync_interval = sync_interval
+        self.lock = threading.RLock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.__segments = []
+        self.__index = {}                   # record id -> (segment, offset, length)
+        self.__ready = collections.deque()  # record ids not handed out yet
+        self.__lastSync = time.time()
+        self.__acksDirty = False
+        self.__nextId = 1
+        self.__recover()
+
+    def __recover(self):
+        acked = set()
+        path = os.path.join(self.directory, 'acks')
+        if os.path.exists(path):
+            data = open(path, 'rb').read()
+            n = len(data) / _ack.size
+            acked.update(struct.unpack('>%dQ' % n, data[:n * _ack.size]))
+        names = [n for n in os.listdir(self.directory) if n.endswith('.seg')]
+        names.sort()
+        for name in names:
+            seg = _Segment(os.path.join(self.directory, name))
+            # the ids go on from the base even when no record made it
+            # into the segment (and the ones before were deleted)
+            self.__nextId = max(self.__nextId, seg.base)
+            for rid, off, length in seg.records():
+                self.__nextId = max(self.__nextId, rid + 1)
+                if rid not in acked:
+                    self.__index[rid] = (seg, off, length)
+                    self.__ready.append(rid)
+                    seg.live += 1
+            self.__segments.append(seg)
+        for seg in self.__segments[:-1]:
+            if not seg.live:
+                self.__segments.remove(seg)
+                seg.remove()
+        if self.__segments:
+            first = self.__segments[0].base
+        else:
+            first = self.__nextId
+        self.__acks = None
+        self.__writeAcks([rid for rid in acked if rid >= first])
+
+    def __writeAcks(self, acked):
+        """Replaces the file of acknowledgements by one with just acked
+        (the ones of deleted segments are not needed any more)."""
+        path = os.path.join(self.directory, 'acks')
+        f = open(path + '.new', 'wb')
+        f.write(struct.pack('>%dQ' % len(acked), *acked))
+        f.flush()
+        os.fsync(f.fileno())
+        os.rename(path + '.new', path)
+        if self.__acks is not None:
+            self.__acks.close()
+        self.__acks = f
+        self.__acked = len(acked)
+        self.__acksDirty = False
+
+    def __compactAcks(self):
+        first = self.__segments[0].base
+        index = self.__index
+        self.__writeAcks([rid for rid in xrange(first, self.__nextId)
+                          if rid not in index])
+
+    def __len__(self):
+        """Number of records not acknowledged yet."""
+        return len(self.__index)
+
+    def ready(self):
+        """Number of records not handed out by get() yet."""
+        return len(self.__ready)
+
+    def put(self, item):
+        """put(item) -> record id
+        item is an SMS (or any PDU) or an encoded submit_sm body."""
+        return self.put_many([item])[0]
+
+    def put_many(self, items):
+        """put_many(items) -> list of record ids"""
+        bodies = []
+        for item in items:
+            if not isinstance(item, str):
+                str(item)               # encodes the body
+                item = item.body
+            if not item:
+                raise SpoolError("Can't spool an empty body")
+            bodies.append(item)
+        self.lock.acquire()
+        try:
+            rids = []
+            for body in bodies:
+                rid = self.__nextId
+                seg = self.__segments and self.__segments[-1]
+                off = seg and seg.append(rid, body)
+                if not off:
+                    seg = self.__newSegment(rid, len(body))
+                    off = seg.append(rid, body)
+                self.__nextId = rid + 1
+                self.__index[rid] = (seg, off, len(body))
+                self.__ready.append(rid)
+                seg.live += 1
+                rids.append(rid)
+            self.__maybeSync()
+            return rids
+        finally:
+            self.lock.release()
+
+    def __newSegment(self, rid, length):
+        size = max(self.segment_size, len(MAGIC) + _record.size + length + 4)
+        path = os.path.join(self.directory, '%016x.seg' % rid)
+        if self.__segments:
+            last = self.__segments[-1]
+            if last.live:
+                last.sync()
+            else:
+                self.__segments.remove(last)
+                last.remove()
+        seg = _Segment(path, size)
+        self.__segments.append(seg)
+        return seg
+
+    def get_many(self, count):
+        """get_many(count) -> list of (record id, body)
+        Hands out up to count records; they stay in the spool until
+        acknowledged, or are handed out again after requeue()."""
+        self.lock.acquire()
+        try:
+            result = []
+            ready = self.__ready
+            while ready and len(result) < count:
+                rid = ready.popleft()
+                entry = self.__index.get(rid)
+                if entry is None:
+                    continue        # acknowledged meanwhile
+                seg, off, length = entry
+                result.append((rid, seg.map[off:off+length]))
+            return result
+        finally:
+            self.lock.release()
+
+    def requeue(self, rids):
+        """Hands the records out again, before the others."""
+        self.lock.acquire()
+        try:
+            for rid in reversed(rids):
+                if rid in self.__index:
+                    self.__ready.appendleft(rid)
+        finally:
+            self.lock.release()
+
+    def ack(self, rid):
+        self.ack_many([rid])
+
+    def ack_many(self, rids):
+        """Removes the records for good (once synced)."""
+        self.lock.acquire()
+        try:
+            done = []
+            removed = False
+            for rid in rids:
+                entry = self.__index.pop(rid, None)
+                if entry is None:
+                    continue
+                done.append(rid)
+                seg = entry[0]
+                seg.live -= 1
+                if not seg.live and seg is not self.__segments[-1]:
+                    self.__segments.remove(seg)
+                    seg.remove()
+                    removed = True
+            if done:
+                self.__acks.write(struct.pack('>%dQ' % len(done), *done))
+                self.__acksDirty = True
+                self.__acked += len(done)
+            if removed and self.__acked > 2 * len(self.__index) + ACKS_COMPACT:
+                self.__compactAcks()
+            self.__maybeSync()
+        finally:
+            self.lock.release()
+
+    def __maybeSync(self):
+        if time.time() - self.__lastSync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """Makes everything put and acknowledged so far durable."""
+        self.lock.acquire()
+        try:
+            if self.__segments:
+                self.__segments[-1].sync()
+            if self.__acksDirty:
+                self.__acks.flush()
+                os.fsync(self.__acks.fileno())
+                self.__acksDirty = False
+            self.__lastSync = time.time()
+        finally:
+            self.lock.release()
+
+    def drain(self, session, count=None, timeout=None):
+        """drain(session, count=None, timeout=None) -> number submitted
+        Submits up to count records (all that are ready by default)
+        through session.submit_sm_async(). A record is acknowledged when
+        the SMSC answers it, also with an error status other than a
+        throttling one (it would fail again); after a timeout, a
+        throttling status or a lost connection it is requeued."""
+        if count is None:
+            count = len(self.__ready)
+        sent = 0
+        while sent < count:
+            batch = self.get_many(min(count - sent, 1000))
+            if not batch:
+                break
+            for i, (rid, body) in enumerate(batch):
+                p = pdu.PDU()
+                p.command_id = COMMAND_ID['submit_sm']
+                p.body = body
+                try:
+                    session.submit_sm_async(p, self.__callback(rid), timeout)
+                except:
+                    self.requeue([r for r, b in batch[i:]])
+                    raise
+                sent += 1
+        return sent
+
+    def __callback(self, rid):
+        def done(req):
+            error = req.error
+            if error is None or (isinstance(error, SMPPError) and
+                                 isinstance(error.value, pdu.PDU) and
+                                 error.value.command_status not in THROTTLED):
+                self.ack(rid)
+            else:
+                self.requeue([rid])
+        return done
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self.sync()
+            for seg in self.__segments:
+                seg.close()
+            self.__segments = []
+            self.__acks.close()
+        finally:
+            self.lock.release()
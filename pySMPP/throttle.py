@@ -0,0 +1,137 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""Rate limiting of submits.
+
+Example:
+    sm = smpp.SMPP(throttle=throttle.Throttle(50))    # 50 submits/sec
+
+TokenBucket lets through rate requests per second on average, with
+bursts of up to burst. Throttle adapts the rate: when the SMSC answers
+ESME_RTHROTTLED or ESME_RMSGQFUL the rate is cut by backoff and sending
+pauses for pause seconds (the session retries the rejected submits),
+then the rate grows by ramp every ramp_interval seconds of successful
+responses, back up to the configured one. A Throttle shared by several
+sessions limits them together.
+
+Backoff gives the delays between reconnect attempts: growing by factor
+from initial up to maximum, each cut by a random part of up to jitter,
+so a fleet of clients that lost the SMSC together doesn't come back all
+at once.
+"""
+import time, threading, random
+
+class TokenBucket(object):
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        if burst is None:
+            burst = max(rate, 1)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def take(self, n=1):
+        """take(self, n=1) -> seconds
+        Takes n tokens and returns 0, or returns how long to wait before
+        they will be there (taking nothing)."""
+        self.lock.acquire()
+        try:
+            now = time.time()
+            tokens = self.tokens + (now - self.last) * self.rate
+            if tokens > self.burst:
+                tokens = self.burst
+            self.tokens = tokens
+            self.last = now
+            if tokens >= n:
+                self.tokens = tokens - n
+                return 0
+            return (n - tokens) / self.rate
+        finally:
+            self.lock.release()
+
+    def acquire(self, n=1):
+        """Sleeps until n tokens can be taken."""
+        wait = self.take(n)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.take(n)
+
+
+class Throttle(TokenBucket):
+    def __init__(self, rate, burst=None, min_rate=1, backoff=0.5, ramp=1.1,
+                 ramp_interval=1.0, pause=1.0, retries=5):
+        TokenBucket.__init__(self, rate, burst)
+        self.max_rate = self.rate
+        self.min_rate = min_rate
+        self.backoff = backoff
+        self.ramp = ramp
+        self.ramp_interval = ramp_interval
+        self.pause = pause
+        self.retries = retries              # per PDU, then it fails
+        self.paused_until = 0
+        self.last_change = self.last
+
+    def take(self, n=1):
+        wait = self.paused_until - time.time()
+        if wait > 0:
+            return wait
+        return TokenBucket.take(self, n)
+
+    def throttled(self):
+        """The SMSC said we are going too fast."""
+        self.lock.acquire()
+        try:
+            now = time.time()
+            # one burst of rejections is one event, not many
+            if now >= self.paused_until:
+                self.rate = max(self.min_rate, self.rate * self.backoff)
+                self.tokens = 0
+            self.paused_until = now + self.pause
+            self.last_change = now
+        finally:
+            self.lock.release()
+
+    def accepted(self):
+        """A request went through, maybe it's time to speed up."""
+        if self.rate >= self.max_rate:
+            return
+        self.lock.acquire()
+        try:
+            now = time.time()
+            if now - self.last_change >= self.ramp_interval:
+                self.rate = min(self.max_rate, self.rate * self.ramp)
+                self.last_change = now
+        finally:
+            self.lock.release()
+
+
+class Backoff(object):
+    def __init__(self, initial=1.0, maximum=60.0, factor=2.0, jitter=0.5,
+                 retries=None):
+        """retries is the number of attempts before giving up, None for
+        no limit."""
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.retries = retries
+
+    def delay(self, attempt):
+        """Seconds to wait before attempt (counted from 0)."""
+        base = min(self.maximum, self.initial * self.factor ** attempt)
+        return base * (1 - self.jitter * random.random())
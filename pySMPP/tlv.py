@@ -0,0 +1,204 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""SMPP 3.4 optional parameters (TLVs).
+
+Example:
+    s = tlv.encode({'user_message_reference': 42, 'source_port': 2948})
+    opt = tlv.TLVs(body_tail)
+    print opt.get('receipted_message_id')
+
+TAGS gives the tag and value type of each parameter:
+    B, H, I - 1, 2 and 4 octet integers
+    C       - C-Octet String (the NULL is stripped when decoding)
+    O       - octet string
+The tag and length of the integer parameters are packed beforehand, so
+encoding them is one struct call. TLVs indexes the parameters of a PDU
+the first time one is asked for, in one pass, and decodes only the
+values that are asked for.
+"""
+import struct
+from pdu import PDUError
+
+TAGS = {
+    'dest_addr_subunit' :           (0x0005, 'B'),
+    'dest_network_type' :           (0x0006, 'B'),
+    'dest_bearer_type' :            (0x0007, 'B'),
+    'dest_telematics_id' :          (0x0008, 'H'),
+    'source_addr_subunit' :         (0x000D, 'B'),
+    'source_network_type' :         (0x000E, 'B'),
+    'source_bearer_type' :          (0x000F, 'B'),
+    'source_telematics_id' :        (0x0010, 'B'),
+    'qos_time_to_live' :            (0x0017, 'I'),
+    'payload_type' :                (0x0019, 'B'),
+    'additional_status_info_text' : (0x001D, 'C'),
+    'receipted_message_id' :        (0x001E, 'C'),
+    'ms_msg_wait_facilities' :      (0x0030, 'B'),
+    'privacy_indicator' :           (0x0201, 'B'),
+    'source_subaddress' :           (0x0202, 'O'),
+    'dest_subaddress' :             (0x0203, 'O'),
+    'user_message_reference' :      (0x0204, 'H'),
+    'user_response_code' :          (0x0205, 'B'),
+    'source_port' :                 (0x020A, 'H'),
+    'destination_port' :            (0x020B, 'H'),
+    'sar_msg_ref_num' :             (0x020C, 'H'),
+    'language_indicator' :          (0x020D, 'B'),
+    'sar_total_segments' :          (0x020E, 'B'),
+    'sar_segment_seqnum' :          (0x020F, 'B'),
+    'sc_interface_version' :        (0x0210, 'B'),
+    'callback_num_pres_ind' :       (0x0302, 'B'),
+    'callback_num_atag' :           (0x0303, 'O'),
+    'number_of_messages' :          (0x0304, 'B'),
+    'callback_num' :                (0x0381, 'O'),
+    'dpf_result' :                  (0x0420, 'B'),
+    'set_dpf' :                     (0x0421, 'B'),
+    'ms_availability_status' :      (0x0422, 'B'),
+    'network_error_code' :          (0x0423, 'O'),
+    'message_payload' :             (0x0424, 'O'),
+    'delivery_failure_reason' :     (0x0425, 'B'),
+    'more_messages_to_send' :       (0x0426, 'B'),
+    'message_state' :               (0x0427, 'B'),
+    'ussd_service_op' :             (0x0501, 'B'),
+    'display_time' :                (0x1201, 'B'),
+    'sms_signal' :                  (0x1203, 'H'),
+    'ms_validity' :                 (0x1204, 'B'),
+    'alert_on_message_delivery' :   (0x130C, 'O'),
+    'its_reply_type' :              (0x1380, 'B'),
+    'its_session_info' :            (0x1383, 'H'),
+}
+
+_header = struct.Struct('>HH')
+_ints = {'B': struct.Struct('>B'), 'H': struct.Struct('>H'), 'I': struct.Struct('>I')}
+
+_names = {}
+_packers = {}       # name -> struct packing tag, length and value at once
+for _name, (_tag, _kind) in TAGS.items():
+    _names[_tag] = _name
+    if _kind in _ints:
+        _st = struct.Struct('>HH' + _kind)
+        _packers[_name] = (_st, _tag, _st.size - 4)
+
+def encode(params):
+    """encode(params) -> string
+    params is a dict, or a list of (name, value) pairs to keep the
+    order. A name can also be a numeric tag, its value an octet string."""
+    if hasattr(params, 'items'):
+        params = params.items()
+    parts = []
+    for name, value in params:
+        packer = _packers.get(name)
+        if packer is not None:
+            st, tag, size = packer
+            parts.append(st.pack(tag, size, value))
+            continue
+        if name in TAGS:
+            tag, kind = TAGS[name]
+            if kind == 'C':
+                value = value + '\0'
+        else:
+            tag = name
+        parts.append(_header.pack(tag, len(value)))
+        parts.append(value)
+    return ''.join(parts)
+
+
+class TLVs(object):
+    """The optional parameters of a PDU, decoded on demand."""
+    __slots__ = ('buf', '_TLVs__index')
+
+    def __init__(self, buf=''):
+        self.buf = buf
+        self.__index = None
+
+    def __build(self):
+        index = {}
+        buf = self.buf
+        end = len(buf)
+        off = 0
+        unpack = _header.unpack_from
+        while off + 4 <= end:
+            tag, length = unpack(buf, off)
+            off += 4
+            if off + length > end:
+                raise PDUError("Truncated optional parameter 0x%04x" % tag)
+            if tag not in index:
+                index[tag] = (off, length)
+            off += length
+        self.__index = index
+        return index
+
+    def raw(self, tag):
+        """Value octets of a tag (a number), None if it isn't there."""
+        index = self.__index
+        if index is None:
+            if not self.buf:
+                return None
+            index = self.__build()
+        pos = index.get(tag)
+        if pos is None:
+            return None
+        off, length = pos
+        return self.buf[off:off+length]
+
+    def get(self, name, default=None):
+        tag, kind = TAGS[name]
+        value = self.raw(tag)
+        if value is None:
+            return default
+        if kind in _ints:
+            if len(value) != _ints[kind].size:
+                raise PDUError("Bad length of %s" % name)
+            return _ints[kind].unpack(value)[0]
+        if kind == 'C' and value[-1:] == '\0':
+            return value[:-1]
+        return value
+
+    def __getitem__(self, name):
+        value = self.get(name)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name):
+        return self.raw(TAGS[name][0]) is not None
+
+    def __len__(self):
+        if not self.buf:
+            return 0
+        index = self.__index or self.__build()
+        return len(index)
+
+    def items(self):
+        """All the parameters as (name, value); unknown tags come as
+        (tag, octets)."""
+        if not self.buf:
+            return []
+        index = self.__index or self.__build()
+        result = []
+        for tag in index.keys():
+            name = _names.get(tag)
+            if name is None:
+                result.append((tag, self.raw(tag)))
+            else:
+                result.append((name, self.get(name)))
+        return result
+
+    def __str__(self):
+        return self.buf
+
+    def __repr__(self):
+        return '<TLVs %r>' % dict(self.items())
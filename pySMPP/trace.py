@@ -0,0 +1,114 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+"""Logging and PDU tracing for the sessions.
+
+Example:
+    t = trace.Tracer(sys.stderr, level=trace.DEBUG, sample=100, buffer=50)
+    t.add_hook('on_pdu_in', lambda p, data: ...)
+    sm = smpp.SMPP(tracer=t)
+
+A session only calls pdu_in()/pdu_out() when the tracer is active, i.e.
+when PDUs are being dumped or a PDU hook is installed; otherwise tracing
+costs one attribute test per PDU. Hooks are called as
+    on_pdu_in(pdu, data), on_pdu_out(pdu, data), on_error(error)
+where data is the raw PDU (a string or buffer, only good during the call).
+"""
+
+NONE  = 0
+ERROR = 1
+INFO  = 2
+DEBUG = 3       # DEBUG dumps the PDUs
+
+HOOKS = ('on_pdu_in', 'on_pdu_out', 'on_error')
+
+class Tracer(object):
+    def __init__(self, log=None, level=DEBUG, sample=1, buffer=1):
+        """log is a file-like object. Every sample-th PDU is dumped, and
+        dumps are written (and flushed) buffer at a time."""
+        self.log = log
+        self.sample = sample
+        self.buffer = buffer
+        self.on_pdu_in = []
+        self.on_pdu_out = []
+        self.on_error = []
+        self.__lines = []
+        self.__count = 0
+        self.setlevel(level)
+
+    def setlevel(self, level):
+        self.level = level
+        self.__update()
+
+    def add_hook(self, event, hook):
+        if event not in HOOKS:
+            raise ValueError("No such trace hook: %s" % event)
+        getattr(self, event).append(hook)
+        self.__update()
+
+    def remove_hook(self, event, hook):
+        getattr(self, event).remove(hook)
+        self.__update()
+
+    def __update(self):
+        self.dumping = self.log is not None and self.level >= DEBUG
+        self.active = self.dumping or bool(self.on_pdu_in or self.on_pdu_out)
+
+    def pdu_in(self, p, data):
+        if self.dumping:
+            self.__dump('PDU in', p)
+        for hook in self.on_pdu_in:
+            hook(p, data)
+
+    def pdu_out(self, p, data):
+        if self.dumping:
+            self.__dump('PDU out', p)
+        for hook in self.on_pdu_out:
+            hook(p, data)
+
+    def error(self, error):
+        if self.log is not None and self.level >= ERROR:
+            self.__lines.append('Error: %s' % error)
+            self.flush()
+        for hook in self.on_error:
+            hook(error)
+
+    def info(self, s):
+        if self.log is not None and self.level >= INFO:
+            self.__write(s)
+
+    def debug(self, s):
+        if self.log is not None and self.level >= DEBUG:
+            self.__write(s)
+
+    def __dump(self, direction, p):
+        self.__count += 1
+        if self.__count % self.sample == 0:
+            self.__write('%s:\n%s' % (direction, p.dump()))
+
+    def __write(self, s):
+        self.__lines.append(s)
+        if len(self.__lines) >= self.buffer:
+            self.flush()
+
+    def flush(self):
+        """Writes out the buffered lines."""
+        if self.__lines and self.log is not None:
+            self.__lines.append('')
+            self.log.write('\n'.join(self.__lines))
+            self.log.flush()
+        self.__lines = []
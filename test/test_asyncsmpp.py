@@ -0,0 +1,59 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, socket, struct, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import pdu, codec, asyncsmpp, smpp
+
+def read_pdu(sock):
+    data = sock.recv(4)
+    (length,) = struct.unpack('>I', data)
+    while len(data) < length:
+        data += sock.recv(length - len(data))
+    return pdu.PDU(data)
+
+class BindTest(unittest.TestCase):
+    def setUp(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        self.map = {}
+        self.sm = asyncsmpp.AsyncSMPP(map=self.map)
+        self.sm.connect(*server.getsockname())
+        self.smsc, peer = server.accept()
+        server.close()
+
+    def tearDown(self):
+        self.sm.close()
+        self.smsc.close()
+
+    def test_system_name_with_optional_parameters(self):
+        req = self.sm.bind_transmitter('user', 'pass')
+        while self.sm.writable():
+            self.sm.process(0.1)
+        bind = read_pdu(self.smsc)
+        self.smsc.sendall(str(bind.response(body=codec.encode(
+            'bind_transmitter_resp', {'system_id': 'SMSC',
+                                      'optional': {'sc_interface_version': 0x34}}))))
+        req.result(2)
+        self.assertEqual(self.sm.system_name, 'SMSC')
+        self.assertEqual(self.sm.state, smpp.STATE['BOUND_TX'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, shutil, tempfile, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import capture, codec, pdu, smpp, trace
+from pySMPP.pdu import COMMAND_ID
+
+class Session(object):
+    """Enough of a session to attach a Recorder to."""
+    def __init__(self):
+        self.tracer = trace.Tracer()
+
+def deliver_sm(seq, text):
+    p = pdu.PDU()
+    p.command_id = COMMAND_ID['deliver_sm']
+    p.sequence_number = seq
+    p.body = codec.encode('deliver_sm', {'source_addr': '123',
+        'destination_addr': '456', 'short_message': text})
+    return p
+
+class CaptureTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'smsc.cap')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def record(self, pdus):
+        """captures pdus, (direction, PDU) pairs"""
+        session = Session()
+        rec = capture.Recorder(self.path)
+        rec.attach(session)
+        for direction, p in pdus:
+            if direction == capture.IN:
+                session.tracer.pdu_in(p, str(p))
+            else:
+                session.tracer.pdu_out(p, str(p))
+        rec.close()
+        return rec
+
+    def test_read(self):
+        pdus = [(capture.IN, deliver_sm(1, 'one')),
+                (capture.OUT, deliver_sm(1, '').response()),
+                (capture.IN, deliver_sm(2, 'two'))]
+        rec = self.record(pdus)
+        self.assertEqual(rec.dropped, 0)
+        records = list(capture.read(self.path))
+        self.assertEqual([(d, data) for d, t, data in records],
+                         [(d, str(p)) for d, p in pdus])
+        times = [t for d, t, data in records]
+        self.assertEqual(times, sorted(times))
+        self.assertAlmostEqual(capture.started(self.path), rec.started, 3)
+
+    def test_torn(self):
+        self.record([(capture.IN, deliver_sm(1, 'one')),
+                     (capture.IN, deliver_sm(2, 'two'))])
+        data = open(self.path, 'rb').read()
+        for cut in (5, 20):
+            open(self.path, 'wb').write(data[:-cut])
+            self.assertEqual(len(list(capture.read(self.path))), 1)
+
+    def test_not_a_capture(self):
+        open(self.path, 'wb').write('something else')
+        self.assertRaises(capture.CaptureError, list, capture.read(self.path))
+
+    def test_max_pdu_length(self):
+        big = deliver_sm(1, 'x' * 200)
+        self.record([(capture.IN, big)])
+        self.assertEqual(len(list(capture.read(self.path))), 1)
+        self.assertRaises(capture.CaptureError, list,
+                          capture.read(self.path, max_pdu_length=100))
+
+    def test_replay(self):
+        self.record([(capture.IN, deliver_sm(n, 'm%d' % n)) for n in range(10)] +
+                    [(capture.OUT, deliver_sm(1, '').response())])
+        got = []
+        count, seconds = capture.replay(self.path, got.append, speed=None)
+        self.assertEqual(count, 10)
+        self.assertEqual([p.sequence_number for p in got], range(10))
+
+    def test_replay_smsc(self):
+        self.record([(capture.IN, deliver_sm(n + 1, 'm%d' % n))
+                     for n in range(50)])
+        smsc = capture.ReplaySMSC(self.path, speed=None)
+        smsc.start()
+        got = []
+        def handler(p):
+            got.append(p.sequence_number)
+            return p.response(body='\0')
+        sm = smpp.SMPP()
+        sm.deliver_sm = handler
+        try:
+            sm.connect(*smsc.address)
+            sm.bind_receiver('any', 'thing')
+            while len(got) < 50:
+                sm.process(5)
+            self.assertTrue(smsc.wait(5))
+        finally:
+            sm.close()
+            smsc.close()
+        self.assertEqual(got, range(1, 51))
+        self.assertEqual(smsc.sent, 50)
+
+if __name__ == '__main__':
+    unittest.main()
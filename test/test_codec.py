@@ -0,0 +1,102 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import codec, tlv
+from pySMPP.pdu import COMMAND_ID, PDUError
+
+class CodecTest(unittest.TestCase):
+    def test_round_trip(self):
+        # every command, with its fields set to something
+        for command, fields in codec.SCHEMA.items():
+            values = {}
+            for name, kind in fields:
+                if kind == 'C':
+                    values[name] = name[:5]
+                elif kind == 'B' and name not in codec._COUNTS:
+                    values[name] = len(name)
+                elif kind == 'M':
+                    values[name] = '\0\x01' + name
+            body = codec.encode(command, values)
+            f = codec.decode(COMMAND_ID[command], body)
+            for name, value in values.items():
+                self.assertEqual(getattr(f, name), value, (command, name))
+            self.assertEqual(codec.encode(command, f), body)
+
+    def test_submit_sm(self):
+        body = codec.encode('submit_sm', {'destination_addr': '38970123456',
+            'short_message': 'Hello', 'data_coding': 8,
+            'optional': {'user_message_reference': 7}})
+        f = codec.decode('submit_sm', body)
+        self.assertEqual(f.destination_addr, '38970123456')
+        self.assertEqual(f.sm_length, 5)
+        self.assertEqual(f.short_message, 'Hello')
+        self.assertEqual(f.data_coding, 8)
+        self.assertEqual(f.source_addr, '')
+        self.assertEqual(f.optional['user_message_reference'], 7)
+        # the optional parameters given encoded, or decoded
+        for optional in (tlv.encode({'user_message_reference': 7}), f.optional):
+            self.assertEqual(codec.encode('submit_sm', {
+                'destination_addr': '38970123456', 'short_message': 'Hello',
+                'data_coding': 8, 'optional': optional}), body)
+
+    def test_submit_multi(self):
+        dests = [(codec.DEST_SME, 1, 1, '38970123456'),
+                 (codec.DEST_DL, 'friends'), (codec.DEST_SME, 0, 0, '1')]
+        f = codec.decode('submit_multi', codec.encode('submit_multi',
+            {'dest_address': dests, 'short_message': 'hi'}))
+        self.assertEqual(f.number_of_dests, 3)
+        self.assertEqual(f.dest_address, dests)
+        self.assertEqual(f.short_message, 'hi')
+        unsuccess = [(1, 1, '38970123456', 0x0b), (0, 0, '2', 0x45)]
+        f = codec.decode('submit_multi_resp', codec.encode('submit_multi_resp',
+            {'message_id': 'abc', 'unsuccess_sme': unsuccess}))
+        self.assertEqual(f.message_id, 'abc')
+        self.assertEqual(f.no_unsuccess, 2)
+        self.assertEqual(f.unsuccess_sme, unsuccess)
+
+    def test_empty_body(self):
+        # an error response without a body
+        f = codec.decode(COMMAND_ID['submit_sm_resp'], '')
+        self.assertEqual(f.message_id, '')
+        f = codec.decode('submit_multi_resp', None)
+        self.assertEqual(f.unsuccess_sme, [])
+        self.assertEqual(f.optional.get('sc_interface_version'), None)
+
+    def test_bind_resp_tlv(self):
+        body = 'SMSC\0' + tlv.encode({'sc_interface_version': 0x34})
+        f = codec.decode('bind_transmitter_resp', body)
+        self.assertEqual(f.system_id, 'SMSC')
+        self.assertEqual(f.optional['sc_interface_version'], 0x34)
+
+    def test_errors(self):
+        self.assertRaises(PDUError, codec.encode, 'submit_sm',
+                          {'short_message': 'x' * 255})
+        self.assertRaises(PDUError, codec.encode, 'submit_multi',
+                          {'dest_address': [(codec.DEST_DL, 'x')] * 255})
+        self.assertRaises(PDUError, codec.encode, 'no_such_command', {})
+        self.assertRaises(PDUError, codec.decode, 0x12345678, '')
+        body = codec.encode('submit_sm', {'short_message': 'Hello'})
+        self.assertRaises(PDUError, codec.decode, 'submit_sm', body[:-2])
+        self.assertRaises(PDUError, codec.decode, 'submit_sm', body[:3])
+        self.assertRaises(PDUError, codec.decode, 'submit_sm', 'abc\0\x01')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+import os, sys, socket, struct, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import pdu, codec, receipt, dedup, smpp
+
+def make(command, fields, seq=1):
+    p = pdu.PDU()
+    p.command_id = pdu.COMMAND_ID[command]
+    p.sequence_number = seq
+    p.body = codec.encode(command, dict(fields, source_addr='123',
+                                        destination_addr='456'))
+    return pdu.PDU(str(p))
+
+def data_sm_receipt(state, seq=1):
+    return make('data_sm', {'esm_class': receipt.ESM_RECEIPT, 'optional': {
+        'receipted_message_id': 'abc', 'message_state': state}}, seq)
+
+def answered(d, p, now=None):
+    """seen() and, for a new one, remember() it: answered with ESME_ROK"""
+    if d.seen(p, now):
+        return True
+    d.remember(p, now)
+    return False
+
+class DedupTest(unittest.TestCase):
+    def test_deliver_sm_copy(self):
+        d = dedup.Dedup()
+        self.assertFalse(answered(d, make('deliver_sm', {'short_message': 'hi'}, 1)))
+        self.assertTrue(answered(d, make('deliver_sm', {'short_message': 'hi'}, 2)))
+        self.assertFalse(answered(d, make('deliver_sm', {'short_message': 'ho'}, 3)))
+        self.assertEqual(d.stats()['hits'], 1)
+
+    def test_not_remembered(self):
+        # answered with an error: the copy is handled again
+        d = dedup.Dedup()
+        p = make('deliver_sm', {'short_message': 'hi'})
+        self.assertFalse(d.seen(p))
+        self.assertFalse(d.seen(p))
+        d.remember(p)
+        self.assertTrue(d.seen(p))
+
+    def test_data_sm_receipt(self):
+        d = dedup.Dedup()
+        self.assertFalse(answered(d, data_sm_receipt(1)))
+        self.assertFalse(answered(d, data_sm_receipt(2)))     # another state
+        self.assertTrue(answered(d, data_sm_receipt(2, 2)))
+
+    def test_broken_receipt(self):
+        # flagged as a receipt, but with nothing to read the id from
+        p = make('deliver_sm', {'esm_class': receipt.ESM_RECEIPT,
+                                'short_message': 'not a receipt'})
+        d = dedup.Dedup()
+        self.assertFalse(answered(d, p))
+        self.assertTrue(answered(d, p))
+
+    def test_ttl(self):
+        d = dedup.Dedup(ttl=60)
+        p = make('deliver_sm', {'short_message': 'YES'})
+        self.assertFalse(answered(d, p, now=1000))
+        self.assertTrue(answered(d, p, now=1030))
+        self.assertFalse(answered(d, p, now=1100))
+
+    def test_bloom(self):
+        d = dedup.Dedup(max_entries=1, bloom=dedup.BloomFilter(100))
+        p = make('deliver_sm', {'short_message': 'hi'})
+        self.assertFalse(answered(d, p))
+        answered(d, make('deliver_sm', {'short_message': 'ho'}))  # evicts p
+        self.assertEqual(len(d), 1)
+        self.assertTrue(answered(d, p))
+        self.assertEqual(d.stats()['bloom_hits'], 1)
+
+
+class Session(smpp.SMPP):
+    """Answers the deliver_sm with the statuses in answers."""
+    def __init__(self, answers):
+        smpp.SMPP.__init__(self)
+        self.answers = answers
+        self.handled = []
+
+    def deliver_sm(self, p):
+        self.handled.append(p.sequence_number)
+        return p.response(body="\0", status=self.answers.pop(0))
+
+class SessionTest(unittest.TestCase):
+    def setUp(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        self.sm = Session([pdu.COMMAND_STATUS['ESME_RX_T_APPN'], 0])
+        self.sm.dedup = dedup.Dedup()
+        self.sm.connect(*server.getsockname())
+        self.smsc, peer = server.accept()
+        server.close()
+
+    def tearDown(self):
+        self.sm.abort()
+        self.smsc.close()
+
+    def deliver(self, seq):
+        self.smsc.sendall(str(make('deliver_sm', {'short_message': 'hi'}, seq)))
+        self.sm.process(1)
+        data = self.smsc.recv(4)
+        (length,) = struct.unpack('>I', data)
+        while len(data) < length:
+            data += self.smsc.recv(length - len(data))
+        return pdu.PDU(data).command_status
+
+    def test_redelivered_after_error(self):
+        self.assertEqual(self.deliver(1), pdu.COMMAND_STATUS['ESME_RX_T_APPN'])
+        self.assertEqual(self.deliver(2), 0)
+        self.assertEqual(self.deliver(3), 0)
+        # the third is a copy of the second, answered OK
+        self.assertEqual(self.sm.handled, [1, 2])
+
+if __name__ == '__main__':
+    unittest.main()
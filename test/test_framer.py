@@ -0,0 +1,108 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, socket, struct, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import pdu
+from pySMPP.framer import Framer
+
+def raw(seq, body=''):
+    """an enquire_link-like PDU of 16 + len(body) octets"""
+    return struct.pack('>IIII', 16 + len(body), 0x15, 0, seq) + body
+
+def pdus(f):
+    return [data.tobytes() for data in f.pdus()]
+
+class FramerTest(unittest.TestCase):
+    def test_coalesced(self):
+        f = Framer()
+        f.feed(raw(1) + raw(2, 'abc') + raw(3))
+        self.assertTrue(f.ready())
+        self.assertEqual(pdus(f), [raw(1), raw(2, 'abc'), raw(3)])
+        self.assertFalse(f.ready())
+        self.assertEqual(f.buffered(), 0)
+
+    def test_split(self):
+        f = Framer()
+        data = raw(1, 'hello') + raw(2)
+        for i in range(len(data)):
+            f.feed(data[i])
+            if i < 20:
+                self.assertEqual(f.next(), None)
+            elif i == 20:
+                self.assertEqual(f.next().tobytes(), raw(1, 'hello'))
+        self.assertEqual(pdus(f), [raw(2)])
+
+    def test_length_split(self):
+        # the command_length itself comes in two parts
+        f = Framer()
+        f.feed(raw(1)[:2])
+        self.assertFalse(f.ready())
+        self.assertEqual(f.next(), None)
+        f.feed(raw(1)[2:] + raw(2)[:7])
+        self.assertEqual(pdus(f), [raw(1)])
+        self.assertEqual(f.buffered(), 7)
+        f.feed(raw(2)[7:])
+        self.assertEqual(pdus(f), [raw(2)])
+
+    def test_grows(self):
+        f = Framer(bufsize=32)
+        big = raw(1, 'x' * 1000)
+        f.feed(raw(2)[:10])
+        f.feed(raw(2)[10:] + big[:100])
+        self.assertEqual(pdus(f), [raw(2)])
+        f.feed(big[100:] + raw(3))
+        self.assertEqual(pdus(f), [big, raw(3)])
+
+    def test_wraps(self):
+        # a small buffer, reused again and again
+        f = Framer(bufsize=40)
+        got = []
+        data = ''.join([raw(n, 'x' * (n % 7)) for n in range(100)])
+        for i in range(0, len(data), 13):
+            f.feed(data[i:i+13])
+            got.extend(pdus(f))
+        self.assertEqual(''.join(got), data)
+
+    def test_bad_length(self):
+        f = Framer(max_length=100)
+        f.feed(raw(1, 'x' * 100))
+        self.assertRaises(pdu.PDUError, f.next)
+        f = Framer()
+        f.feed(struct.pack('>I', 8) + '\0' * 12)
+        self.assertRaises(pdu.PDUError, f.next)
+
+    def test_fill(self):
+        a, b = socket.socketpair()
+        try:
+            f = Framer()
+            a.sendall(raw(1) + raw(2)[:5])
+            self.assertEqual(f.fill(b), 21)
+            self.assertEqual(pdus(f), [raw(1)])
+            a.sendall(raw(2)[5:])
+            f.fill(b)
+            self.assertEqual(pdus(f), [raw(2)])
+            a.close()
+            self.assertEqual(f.fill(b), 0)
+        finally:
+            a.close()
+            b.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import gsm
+
+class GSMTest(unittest.TestCase):
+    def test_round_trip(self):
+        text = gsm.ALPHABET.replace(u'\x1b', u'') + \
+               u''.join(gsm.EXTENSION.values())
+        data = gsm.encode(text)
+        self.assertEqual(len(data), gsm.septets(text))
+        self.assertEqual(gsm.decode(data), text)
+
+    def test_extension(self):
+        data = gsm.encode(u'{\u20ac}')
+        self.assertEqual(data, '\x1b\x28\x1b\x65\x1b\x29')
+        self.assertEqual(gsm.decode(data), u'{\u20ac}')
+        self.assertEqual(gsm.septets(u'a[b]'), 6)
+
+    def test_decode_odd_input(self):
+        # unknown escapes fall back to the basic character, a lone one
+        # at the end is dropped, octets over 0x7f are not septets
+        self.assertEqual(gsm.decode('\x1bA\x1b'), u'A')
+        self.assertEqual(gsm.decode('\x1b\x1bA'), u'?A')
+        self.assertEqual(gsm.decode('a\x80'), u'a?')
+
+    def test_not_gsm(self):
+        self.assertFalse(gsm.is_gsm(u'\u0417'))
+        self.assertRaises(UnicodeError, gsm.encode, u'a\u0417')
+
+    def test_encode_auto(self):
+        self.assertEqual(gsm.encode_auto(u'Hi'), (gsm.DCS_DEFAULT, 'Hi'))
+        self.assertEqual(gsm.encode_auto(u'\u0417a'),
+                         (gsm.DCS_UCS2, '\x04\x17\x00a'))
+
+    def test_encode_many(self):
+        texts = [u'Hi', u'\u0417a', u'', u'{x}', u'\U0001f600']
+        expected = [gsm.encode_auto(t) for t in texts]
+        self.assertEqual(gsm.encode_many(texts, use_numpy=False), expected)
+        if gsm.numpy is not None:
+            self.assertEqual(gsm.encode_many(texts), expected)
+
+    def test_pack7(self):
+        # the classic example of GSM 03.38
+        self.assertEqual(gsm.pack7('hellohello'),
+                         '\xe8\x32\x9b\xfd\x46\x97\xd9\xec\x37')
+        for n in range(20):
+            septets = ''.join([chr((i * 37) & 0x7f) for i in range(n)])
+            self.assertEqual(gsm.unpack7(gsm.pack7(septets), n), septets)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, threading, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import metrics, pdu, trace
+from pySMPP.pdu import COMMAND_ID
+
+class Session(object):
+    """Enough of a session to attach a Metrics to."""
+    def __init__(self):
+        self.tracer = trace.Tracer()
+
+    def pending(self):
+        return 0
+
+def submit(seq):
+    p = pdu.PDU()
+    p.command_id = COMMAND_ID['submit_sm']
+    p.sequence_number = seq
+    p.body = 'x' * 20
+    return p
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.session = Session()
+        self.m = metrics.Metrics(labels={'account': 'a'})
+        self.m.attach(self.session)
+
+    def test_counts(self):
+        tracer = self.session.tracer
+        req = submit(1)
+        tracer.pdu_out(req, str(req))
+        resp = req.response(status=0x58)
+        tracer.pdu_in(resp, str(resp))
+        tracer.error('timeout')
+        s = self.m.snapshot()
+        self.assertEqual(s['pdus_out'], {'submit_sm': 1})
+        self.assertEqual(s['pdus_in'], {'submit_sm_resp': 1})
+        self.assertEqual(s['bytes_out'], 36)
+        self.assertEqual(s['errors'], 1)
+        self.assertEqual(s['latency']['submit_sm']['count'], 1)
+        self.assertEqual(len(s['command_status']), 1)
+        self.m.reset()
+        self.assertEqual(self.m.snapshot()['pdus_out'], {})
+
+    def test_threads(self):
+        # sessions of a HandlerPool send from several threads at once
+        tracer = self.session.tracer
+        interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+        try:
+            def send(first):
+                for seq in xrange(first, first + 5000):
+                    req = submit(seq)
+                    tracer.pdu_out(req, 'x' * 36)
+                    tracer.pdu_in(req.response(), 'x' * 16)
+            threads = [threading.Thread(target=send, args=(n * 10000 + 1,))
+                       for n in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setcheckinterval(interval)
+        s = self.m.snapshot()
+        self.assertEqual(s['pdus_out']['submit_sm'], 20000)
+        self.assertEqual(s['pdus_in']['submit_sm_resp'], 20000)
+        self.assertEqual(s['bytes_out'], 20000 * 36)
+        self.assertEqual(s['latency']['submit_sm']['count'], 20000)
+
+    def test_render(self):
+        req = submit(1)
+        self.session.tracer.pdu_out(req, str(req))
+        text = self.m.render()
+        self.assertTrue('# TYPE smpp_pdus_total counter\n' in text)
+        self.assertTrue('smpp_pdus_total{account="a",direction="out",'
+                        'command="submit_sm"} 1\n' in text)
+        self.assertTrue('smpp_response_seconds_bucket{account="a",'
+                        'command="submit_sm",le="+Inf"} 0\n' in text)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_detach(self):
+        self.m.detach(self.session)
+        req = submit(1)
+        self.session.tracer.pdu_out(req, str(req))
+        self.assertEqual(self.m.snapshot()['pdus_out'], {})
+
+if __name__ == '__main__':
+    unittest.main()
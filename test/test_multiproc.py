@@ -0,0 +1,98 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, time, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import multiproc, simulator, smpp, sms
+
+def _sms():
+    m = sms.SMS('test')
+    m.src_addr = '1'
+    m.dest_addr = '2'
+    return m
+
+class FlakySMPP(smpp.SMPP):
+    """Finds its link dead (as the keepalive would) once in a while."""
+    def __init__(self, **args):
+        smpp.SMPP.__init__(self, **args)
+        self.calls = 0
+
+    def process(self, timeout=None):
+        self.calls += 1
+        if self.calls % 10 == 0 and self.pending():
+            self.abort()
+            raise smpp.SMPPError("No answer to the enquire_link")
+        smpp.SMPP.process(self, timeout)
+
+class RingTest(unittest.TestCase):
+    def test_wraps_around(self):
+        ring = multiproc.Ring(64)
+        got = []
+        for i in range(20):
+            self.assertEqual(ring.put_many(['%02d' % i + 'x' * 10]), 1)
+            got.extend(ring.get_many())
+        self.assertEqual(got, ['%02d' % i + 'x' * 10 for i in range(20)])
+        self.assertTrue(ring.empty())
+
+    def test_full(self):
+        ring = multiproc.Ring(64)
+        self.assertEqual(ring.put_many(['x' * 12] * 10), 4)
+        self.assertEqual(len(ring.get_many(3)), 3)
+        self.assertEqual(ring.put_many(['x' * 12] * 10), 3)
+
+class ProcessSenderTest(unittest.TestCase):
+    def setUp(self):
+        self.smsc = simulator.SMSC()
+        self.smsc.start()
+
+    def tearDown(self):
+        self.smsc.stop()
+
+    def send(self, count, **args):
+        sender = multiproc.ProcessSender(self.smsc.address[0],
+            self.smsc.address[1], 'user', 'pass', workers=2, **args)
+        sender.start()
+        results = []
+        try:
+            sender.submit_many([_sms() for i in range(count)])
+            end = time.time() + 10
+            while len(results) < count and time.time() < end:
+                results.extend(sender.results(0.5))
+        finally:
+            sender.close(5)
+        return results
+
+    def test_throughput(self):
+        # the responses read ahead into the framers must not wait for
+        # the select() timeout
+        start = time.time()
+        results = self.send(4000, window_size=50)
+        self.assertEqual(len(results), 4000)
+        self.assertEqual([r for r in results if r[1] != 0], [])
+        self.assertTrue(time.time() - start < 3,
+                        "%.1fs for 4000 submits" % (time.time() - start))
+
+    def test_link_failure(self):
+        # a worker outlives a session failing with SMPPError
+        results = self.send(500, window_size=10, session_factory=FlakySMPP)
+        self.assertEqual(len(results), 500)
+        self.assertTrue([r for r in results if r[1] == 0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+import os, sys, time, threading, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import pool, simulator, sms
+
+def _sms():
+    m = sms.SMS('test')
+    m.src_addr = '1'
+    m.dest_addr = '2'
+    return m
+
+class SessionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.smsc = simulator.SMSC()
+        self.smsc.start()
+        self.pool = pool.SessionPool(self.smsc.address[0], self.smsc.address[1],
+                                     'user', 'pass', size=1, rebind_interval=0.1,
+                                     response_timeout=5)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.close()
+        self.smsc.stop()
+
+    def test_resubmit_from_callback(self):
+        done = threading.Event()
+        results = []
+        def second(req):
+            results.append(req.error)
+            done.set()
+        def first(req):
+            results.append(req.error)
+            self.pool.submit_sm(_sms(), second)
+        self.pool.submit_sm(_sms(), first)
+        done.wait(5)
+        self.assertTrue(done.isSet(), "the callback's submit never completed")
+        self.assertEqual(results, [None, None])
+
+    def test_resubmit_from_added_callback(self):
+        done = threading.Event()
+        def second(req):
+            done.set()
+        def first(req):
+            self.pool.submit_sm(_sms()).add_callback(second)
+        self.pool.submit_sm(_sms()).add_callback(first)
+        done.wait(5)
+        self.assertTrue(done.isSet(), "the callback's submit never completed")
+
+    def test_callback_added_when_done(self):
+        req = self.pool.submit_sm(_sms())
+        req.result(5)
+        called = []
+        req.add_callback(called.append)
+        self.assertEqual(called, [req])
+
+    def test_close_stops_rebinding(self):
+        m = self.pool.members[0]
+        m.fail(RuntimeError("test"))
+        self.pool.close()
+        time.sleep(0.3)
+        self.assertFalse(m.healthy)
+        self.assertEqual([t for t in threading.enumerate()
+                          if t.getName() == "SMPP rebinder"], [])
+
+class ThroughputTest(unittest.TestCase):
+    def setUp(self):
+        self.smsc = simulator.SMSC()
+        self.smsc.start()
+
+    def tearDown(self):
+        self.smsc.stop()
+
+    def test_more_sessions_not_slower(self):
+        # the reader threads must not wait for select() on responses
+        # their framers read already
+        count = 5000
+        for size in (1, 4):
+            p = pool.SessionPool(self.smsc.address[0], self.smsc.address[1],
+                                 'user', 'pass', size=size, window_size=50)
+            p.start()
+            done = threading.Event()
+            lock = threading.Lock()
+            answered = [0]
+            def callback(req):
+                lock.acquire()
+                answered[0] += 1
+                if answered[0] == count:
+                    done.set()
+                lock.release()
+            start = time.time()
+            try:
+                for i in xrange(count):
+                    p.submit_sm(_sms(), callback)
+                done.wait(10)
+            finally:
+                p.close()
+            elapsed = time.time() - start
+            self.assertEqual(answered[0], count)
+            self.assertTrue(elapsed < 3, "size %d: %.1fs for %d submits" %
+                            (size, elapsed, count))
+
+if __name__ == '__main__':
+    unittest.main()
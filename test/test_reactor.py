@@ -0,0 +1,80 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, time, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import reactor, asyncsmpp, simulator, sms
+
+def _sms():
+    m = sms.SMS('test')
+    m.src_addr = '1'
+    m.dest_addr = '2'
+    return m
+
+class TimerTest(unittest.TestCase):
+    def test_order_and_cancel(self):
+        r = reactor.Reactor()
+        calls = []
+        now = time.time()
+        r.call_at(now + 0.03, calls.append, 3)
+        r.call_at(now + 0.01, calls.append, 1)
+        r.cancel(r.call_at(now + 0.02, calls.append, 2))
+        r.run(1)
+        self.assertEqual(calls, [1, 3])
+        self.assertTrue(time.time() - now < 0.5)
+
+class SessionTest(unittest.TestCase):
+    def setUp(self):
+        self.smsc = simulator.SMSC()
+        self.smsc.start()
+        self.reactor = reactor.Reactor()
+        self.sm = asyncsmpp.AsyncSMPP(map=self.reactor.map, response_timeout=5)
+        self.sm.connect(*self.smsc.address)
+        self.reactor.add(self.sm)
+        self.sm.bind_transmitter('user', 'pass').result(2)
+
+    def tearDown(self):
+        self.sm.close()
+        self.smsc.stop()
+
+    def test_submits(self):
+        reqs = [self.sm.submit_sm(_sms()) for i in range(100)]
+        while self.sm.pending():
+            self.sm.process(1)
+        self.assertEqual([r.error for r in reqs if r.error], [])
+        self.assertEqual(len(set([r.message_id for r in reqs])), 100)
+
+    def test_answered_leaves_no_timer(self):
+        # the response timeout timer goes with the last pending request
+        self.sm.submit_sm(_sms(), lambda req: self.sm.close())
+        start = time.time()
+        self.reactor.run(2)
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(len(self.reactor), 0)
+
+    def test_closed_by_user(self):
+        self.reactor.call_later(0.01, self.sm.close)
+        start = time.time()
+        self.reactor.run(2)
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(len(self.reactor), 0)
+        self.assertEqual(self.sm.reactor, None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+import os, sys, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import pdu, codec, receipt
+
+TEXT = ('id:1f2e3d sub:001 dlvrd:001 submit date:0610191018 '
+        'done date:0610191019 stat:DELIVRD err:000 text:hello')
+
+def make(command, fields):
+    p = pdu.PDU()
+    p.command_id = pdu.COMMAND_ID[command]
+    p.sequence_number = 1
+    p.body = codec.encode(command, dict(fields, source_addr='123',
+        destination_addr='456', esm_class=receipt.ESM_RECEIPT))
+    return pdu.PDU(str(p))
+
+class FromPduTest(unittest.TestCase):
+    def test_deliver_sm(self):
+        r = receipt.from_pdu(make('deliver_sm', {'short_message': TEXT}))
+        self.assertEqual(r.message_id, '1f2e3d')
+        self.assertEqual(r.stat, 'DELIVRD')
+
+    def test_data_sm_payload(self):
+        r = receipt.from_pdu(make('data_sm',
+                                  {'optional': {'message_payload': TEXT}}))
+        self.assertEqual(r.message_id, '1f2e3d')
+        self.assertEqual(r.stat, 'DELIVRD')
+
+    def test_data_sm_tlvs(self):
+        r = receipt.from_pdu(make('data_sm', {'optional': {
+            'receipted_message_id': 'abc', 'message_state': 5}}))
+        self.assertEqual(r.message_id, 'abc')
+        self.assertEqual(r.stat, 'UNDELIV')
+        self.assertTrue(r.final())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, time, socket, struct, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import smpp, simulator, sms, pdu
+
+def _sms():
+    m = sms.SMS('test')
+    m.src_addr = '1'
+    m.dest_addr = '2'
+    return m
+
+class TimeoutTest(unittest.TestCase):
+    def setUp(self):
+        self.smsc = simulator.SMSC(latency=0.5)
+        self.smsc.start()
+        self.sm = smpp.SMPP(window_size=10, response_timeout=5)
+        self.sm.connect(*self.smsc.address)
+        self.sm.bind_transmitter('user', 'pass')
+
+    def tearDown(self):
+        self.sm.abort()
+        self.smsc.stop()
+
+    def test_timeouts_in_deadline_order(self):
+        done = []
+        start = time.time()
+        # the later deadline sent first
+        for timeout in (0.2, 0.1, 5):
+            self.sm.submit_sm_async(_sms(), lambda req, t=timeout:
+                done.append((t, req.error is not None, time.time() - start)),
+                timeout)
+        self.assertTrue(self.sm.drain(2))
+        self.assertEqual([d[:2] for d in done],
+                         [(0.1, True), (0.2, True), (5, False)])
+        self.assertTrue(0.1 <= done[0][2] < 0.2)
+        self.assertTrue(0.2 <= done[1][2] < 0.3)
+
+class Session(smpp.SMPP):
+    def __init__(self):
+        smpp.SMPP.__init__(self)
+        self.handled = []
+
+    def deliver_sm(self, p):
+        self.handled.append(p.sequence_number)
+        return p.response(body="\0")
+
+def _deliver_sm(seq):
+    p = pdu.PDU()
+    p.command_id = pdu.COMMAND_ID['deliver_sm']
+    p.sequence_number = seq
+    p.body = '\0' * 17
+    return str(p)
+
+class BufferedInputTest(unittest.TestCase):
+    def setUp(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        self.sm = Session()
+        self.sm.connect(*server.getsockname())
+        self.smsc, peer = server.accept()
+        server.close()
+
+    def tearDown(self):
+        self.sm.abort()
+        self.smsc.close()
+
+    def test_two_pdus_in_one_write(self):
+        self.smsc.sendall(_deliver_sm(1) + _deliver_sm(2))
+        time.sleep(0.05)
+        start = time.time()
+        self.sm.process(0)
+        self.assertEqual(self.sm.handled, [1, 2])
+        self.assertFalse(self.sm.pending_input())
+        self.assertTrue(time.time() - start < 0.05)
+
+    def test_responses_in_one_write(self):
+        reqs = [self.sm.enquire_link_async() for i in range(3)]
+        data = ''
+        while len(data) < 3 * 16:
+            data += self.smsc.recv(1024)
+        resps = ''
+        for i in range(3):
+            p = pdu.PDU(data[i*16:(i+1)*16])
+            resps += str(p.response())
+        self.smsc.sendall(resps)
+        time.sleep(0.05)
+        self.sm.process(0)
+        self.assertEqual([r.done() for r in reqs], [True, True, True])
+        self.assertEqual(self.sm.pending(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
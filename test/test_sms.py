@@ -0,0 +1,109 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import pdu, sms, tlv, gsm
+
+def _sms(text):
+    m = sms.SMS(text)
+    m.src_addr = '1'
+    m.dest_addr = '2'
+    return m
+
+def sent(m):
+    """the fields of m as the SMSC reads them"""
+    m.sequence_number = 1
+    return pdu.PDU(str(m)).fields()
+
+class SegmentsTest(unittest.TestCase):
+    def test_fits(self):
+        m = _sms(u'x' * 160)
+        self.assertEqual(m.segments(), [m])
+
+    def test_udh(self):
+        parts = _sms(u'x' * 200).segments()
+        self.assertEqual(len(parts), 2)
+        f = sent(parts[0])
+        self.assertTrue(f.esm_class & sms.ESM_UDHI)
+        udh = f.short_message[:6]
+        self.assertEqual(udh[:3], '\x05\x00\x03')
+        self.assertEqual(udh[4:], '\x02\x01')
+        self.assertEqual(''.join([p.message[6:] for p in parts]),
+                         gsm.encode(u'x' * 200))
+
+    def test_udh_keeps_escapes_whole(self):
+        # 152 septets a part: the escape of the 153rd doesn't split
+        parts = _sms(u'x' * 152 + u'{' * 10).segments()
+        self.assertEqual(parts[0].message[-1], 'x')
+        self.assertEqual(''.join([p.message[6:] for p in parts]),
+                         gsm.encode(u'x' * 152 + u'{' * 10))
+
+    def test_ucs2(self):
+        parts = _sms(u'\u0417' * 100).segments()
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(parts[0].dcs & 0x0C, gsm.DCS_UCS2)
+
+    def test_sar(self):
+        parts = _sms(u'x' * 200).segments('sar')
+        self.assertEqual(len(parts), 2)
+        for n, p in enumerate(parts):
+            optional = sent(p).optional
+            self.assertEqual(optional['sar_total_segments'], 2)
+            self.assertEqual(optional['sar_segment_seqnum'], n + 1)
+        self.assertEqual(sent(parts[0]).optional['sar_msg_ref_num'],
+                         sent(parts[1]).optional['sar_msg_ref_num'])
+
+    def test_sar_encoded_optional(self):
+        m = _sms(u'x' * 200)
+        m.optional = tlv.encode({'user_message_reference': 7})
+        parts = m.segments('sar')
+        optional = sent(parts[1]).optional
+        self.assertEqual(optional['user_message_reference'], 7)
+        self.assertEqual(optional['sar_segment_seqnum'], 2)
+        self.assertEqual(m.optional, tlv.encode({'user_message_reference': 7}))
+
+    def test_payload(self):
+        m = _sms(u'x' * 200)
+        m.optional = {'user_message_reference': 7}
+        parts = m.segments('payload')
+        self.assertEqual(len(parts), 1)
+        f = sent(parts[0])
+        self.assertEqual(f.short_message, '')
+        self.assertEqual(f.optional['message_payload'], gsm.encode(u'x' * 200))
+        self.assertEqual(f.optional['user_message_reference'], 7)
+        self.assertEqual(m.optional, {'user_message_reference': 7})
+
+class TLVTest(unittest.TestCase):
+    def test_round_trip(self):
+        buf = tlv.encode([('sar_msg_ref_num', 513), ('receipted_message_id', 'abc'),
+                          ('message_state', 2), (0x1400, 'vendor')])
+        t = tlv.TLVs(buf)
+        self.assertEqual(t['sar_msg_ref_num'], 513)
+        self.assertEqual(t['receipted_message_id'], 'abc')
+        self.assertEqual(t.get('message_state'), 2)
+        self.assertEqual(t.raw(0x1400), 'vendor')
+        self.assertEqual(t.get('sar_total_segments'), None)
+
+    def test_truncated(self):
+        t = tlv.TLVs(tlv.encode({'receipted_message_id': 'abc'})[:-1])
+        self.assertRaises(pdu.PDUError, t.get, 'receipted_message_id')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, shutil, tempfile, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import spool
+
+class SpoolTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def open(self):
+        return spool.Spool(self.dir, segment_size=256, sync_interval=0)
+
+    def segments(self):
+        return sorted([n for n in os.listdir(self.dir) if n.endswith('.seg')])
+
+    def test_recovers_unacknowledged(self):
+        q = self.open()
+        rids = q.put_many(['body%d' % i for i in range(20)])
+        q.ack_many(rids[:15])
+        q.close()
+        q = self.open()
+        self.assertEqual(len(q), 5)
+        self.assertEqual(q.get_many(100),
+                         [(rid, 'body%d' % i) for i, rid in
+                          zip(range(15, 20), rids[15:])])
+        q.close()
+
+    def test_torn_record(self):
+        q = self.open()
+        q.put_many(['first', 'second'])
+        q.close()
+        name = os.path.join(self.dir, self.segments()[-1])
+        f = open(name, 'r+b')
+        # the crc of the second record
+        f.seek(len(spool.MAGIC) + spool._record.size + len('first') + 4)
+        f.write('\0\0\0\0')
+        f.close()
+        q = self.open()
+        self.assertEqual([body for rid, body in q.get_many(10)], ['first'])
+        q.close()
+
+    def test_empty_newest_segment(self):
+        # crashed after starting a segment, before its first record
+        # was written: the old one was deleted already
+        q = self.open()
+        q.ack_many(q.put_many(['x' * 50] * 3))      # a full segment
+        base = q.put('x' * 50)      # a new one, the full one deleted
+        q.close()
+        self.assertEqual(self.segments(), ['%016x.seg' % base])
+        f = open(os.path.join(self.dir, self.segments()[0]), 'r+b')
+        f.seek(len(spool.MAGIC))
+        f.write('\0' * spool._record.size)
+        f.close()
+
+        q = self.open()
+        self.assertEqual(len(q), 0)
+        rid = q.put('again')
+        self.assertTrue(rid >= base)
+        q.ack(rid)
+        q.close()
+        q = self.open()
+        self.assertEqual(len(q), 0)
+        q.close()
+
+if __name__ == '__main__':
+    unittest.main()
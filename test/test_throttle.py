@@ -0,0 +1,97 @@
+# This file is part of pySMPP
+# Copyright (C) 2003 Damjan Georgievski
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307 USA
+
+
+import os, sys, time, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pySMPP import throttle
+
+def later(bucket, seconds):
+    """as if seconds had gone by since the bucket was last used"""
+    bucket.last -= seconds
+    if isinstance(bucket, throttle.Throttle):
+        bucket.last_change -= seconds
+        bucket.paused_until -= seconds
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst(self):
+        b = throttle.TokenBucket(10, burst=5)
+        for i in range(5):
+            self.assertEqual(b.take(), 0)
+        wait = b.take()
+        self.assertTrue(0.05 < wait <= 0.1, wait)
+        self.assertTrue(b.take(3) > 0.2)
+
+    def test_refill(self):
+        b = throttle.TokenBucket(10, burst=5)
+        for i in range(5):
+            b.take()
+        later(b, 0.3)
+        self.assertEqual(b.take(3), 0)
+        self.assertTrue(b.take() > 0)
+        later(b, 60)                    # no more than burst
+        self.assertEqual(b.take(5), 0)
+        self.assertTrue(b.take() > 0)
+
+    def test_acquire(self):
+        b = throttle.TokenBucket(100, burst=1)
+        start = time.time()
+        for i in range(6):
+            b.acquire()
+        self.assertTrue(time.time() - start >= 0.045)
+
+class ThrottleTest(unittest.TestCase):
+    def test_backoff_and_ramp(self):
+        t = throttle.Throttle(100, min_rate=10, backoff=0.5, ramp=2,
+                              ramp_interval=1.0, pause=1.0)
+        t.throttled()
+        self.assertEqual(t.rate, 50)
+        self.assertTrue(0.9 < t.take() <= 1.0)
+        t.throttled()                   # the same burst of rejections
+        self.assertEqual(t.rate, 50)
+        later(t, 1.0)
+        t.throttled()
+        self.assertEqual(t.rate, 25)
+        later(t, 1.0)
+        t.throttled()
+        t.throttled()
+        later(t, 1.0)
+        t.throttled()
+        self.assertEqual(t.rate, 10)   # min_rate
+        later(t, 1.0)
+        t.accepted()
+        self.assertEqual(t.rate, 20)
+        t.accepted()                    # not before ramp_interval
+        self.assertEqual(t.rate, 20)
+        for i in range(5):
+            later(t, 1.0)
+            t.accepted()
+        self.assertEqual(t.rate, 100)   # back to the configured rate
+
+class BackoffTest(unittest.TestCase):
+    def test_delay(self):
+        b = throttle.Backoff(initial=1, maximum=10, factor=2, jitter=0.5)
+        for attempt, base in enumerate([1, 2, 4, 8, 10, 10]):
+            for i in range(20):
+                d = b.delay(attempt)
+                self.assertTrue(base * 0.5 <= d <= base, (attempt, d))
+        b.jitter = 0
+        self.assertEqual(b.delay(2), 4)
+
+if __name__ == '__main__':
+    unittest.main()